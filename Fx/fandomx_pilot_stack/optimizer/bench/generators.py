@@ -0,0 +1,113 @@
+"""Seeded synthetic portfolios for allocator / bandit benchmarks."""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+import random
+
+from fx_engine import DecisionUnit, UnitSignals, Constraints
+from keys import make_key
+
+MOMENTS = ["team_success", "team_failure", "turning_point", "player_success", "player_failure"]
+
+
+@dataclass
+class Portfolio:
+    units: List[DecisionUnit]
+    keys: List[str]
+    signals: Dict[DecisionUnit, UnitSignals]
+    constraints: Constraints
+    moment_multipliers: Dict[str, float]
+    previous_allocations: Dict[DecisionUnit, float]
+    bandit_state: Dict[str, Tuple[float, float]]
+
+
+def make_units(n_units: int, n_channels: int, n_campaigns: int, seed: int = 7) -> List[DecisionUnit]:
+    rng = random.Random(seed)
+    units = []
+    for i in range(n_units):
+        units.append(
+            DecisionUnit(
+                channel=f"ch_{rng.randrange(n_channels)}",
+                campaign_id=f"camp_{rng.randrange(n_campaigns)}",
+                segment_id=f"seg_{rng.randrange(32)}",
+                moment=MOMENTS[rng.randrange(len(MOMENTS))],
+                creative_id=f"cr_{i}",
+                offer_id=f"off_{rng.randrange(16)}",
+                inventory_id=f"inv_{rng.randrange(64)}",
+            )
+        )
+    return units
+
+
+def make_signals(units: List[DecisionUnit], total_budget: float, seed: int = 7) -> Dict[DecisionUnit, UnitSignals]:
+    rng = random.Random(seed + 1)
+    # Cap per unit so that roughly a third of the units can absorb the whole budget.
+    max_spend = max(1.0, 3.0 * total_budget / max(1, len(units)))
+    out = {}
+    for u in units:
+        out[u] = UnitSignals(
+            p_action=rng.uniform(0.005, 0.12),
+            ltv_uplift=rng.uniform(100.0, 3000.0),
+            margin_rate=rng.uniform(0.2, 0.6),
+            expected_cost_per_action=rng.uniform(10.0, 80.0),
+            max_spend=max_spend * rng.uniform(0.5, 1.5),
+            fatigue_score=rng.uniform(0.0, 0.6),
+            brand_safe=rng.random() > 0.01,
+            incrementality=rng.uniform(0.6, 1.4),
+        )
+    return out
+
+
+def make_constraints(
+    total_budget: float,
+    n_constraints: int,
+    n_channels: int,
+    n_campaigns: int,
+    exploration_ratio: float,
+    seed: int = 7,
+) -> Constraints:
+    """n_constraints are split evenly over channel_min/channel_max/campaign_min/campaign_max."""
+    rng = random.Random(seed + 2)
+    per = n_constraints // 4
+    channels = rng.sample(range(n_channels), min(n_channels, 2 * per))
+    campaigns = rng.sample(range(n_campaigns), min(n_campaigns, 2 * per))
+    ch_share = total_budget / max(1, n_channels)
+    cp_share = total_budget / max(1, n_campaigns)
+    return Constraints(
+        total_budget=total_budget,
+        exploration_ratio=exploration_ratio,
+        channel_min={f"ch_{c}": 0.5 * ch_share for c in channels[:per]},
+        channel_max={f"ch_{c}": 1.5 * ch_share for c in channels[per:2 * per]},
+        campaign_min={f"camp_{c}": 0.5 * cp_share for c in campaigns[:per]},
+        campaign_max={f"camp_{c}": 1.5 * cp_share for c in campaigns[per:2 * per]},
+    )
+
+
+def make_bandit_state(keys: List[str], seed: int = 7, coverage: float = 0.8) -> Dict[str, Tuple[float, float]]:
+    rng = random.Random(seed + 3)
+    return {k: (1.0 + rng.random() * 50.0, 1.0 + rng.random() * 50.0) for k in keys if rng.random() < coverage}
+
+
+def make_portfolio(
+    n_units: int,
+    n_constraints: int = 0,
+    exploration_ratio: float = 0.08,
+    total_budget: float = 1_000_000.0,
+    seed: int = 7,
+) -> Portfolio:
+    n_channels = max(8, n_constraints)
+    n_campaigns = max(64, n_constraints)
+    units = make_units(n_units, n_channels, n_campaigns, seed)
+    keys = [make_key(u.channel, u.campaign_id, u.segment_id, u.moment, u.creative_id, u.offer_id, u.inventory_id) for u in units]
+    signals = make_signals(units, total_budget, seed)
+    rng = random.Random(seed + 4)
+    per_unit = total_budget / max(1, n_units)
+    return Portfolio(
+        units=units,
+        keys=keys,
+        signals=signals,
+        constraints=make_constraints(total_budget, n_constraints, n_channels, n_campaigns, exploration_ratio, seed),
+        moment_multipliers={m: 1.0 + 0.15 * i for i, m in enumerate(MOMENTS)},
+        previous_allocations={u: per_unit * rng.uniform(0.0, 2.0) for u in units},
+        bandit_state=make_bandit_state(keys, seed),
+    )
@@ -0,0 +1,190 @@
+"""Allocator / bandit benchmark sweep with per-phase wall time, peak memory and allocation counts."""
+from __future__ import annotations
+import argparse
+import gc
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from bandit import ThompsonBandit
+from fx_engine import allocate_budget
+
+from .generators import make_portfolio
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+
+class PhaseRecorder:
+    """Collects per-phase metrics between successive mark() calls.
+
+    With memory=False only wall time is taken (tracemalloc skews timings); with memory=True
+    peak traced bytes and net allocated blocks are recorded per phase.
+    """
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.phases: Dict[str, dict] = {}
+        self._prefix = ""
+
+    def start(self, prefix: str = "") -> None:
+        self._prefix = prefix
+        self._t = time.perf_counter()
+        if self.memory:
+            tracemalloc.reset_peak()
+            self._cur, _ = tracemalloc.get_traced_memory()
+            self._blocks = sys.getallocatedblocks()
+
+    def mark(self, name: str) -> None:
+        now = time.perf_counter()
+        row = {"wall_ms": (now - self._t) * 1000.0}
+        if self.memory:
+            cur, peak = tracemalloc.get_traced_memory()
+            blocks = sys.getallocatedblocks()
+            row["peak_kb"] = max(0, peak - self._cur) / 1024.0
+            row["net_blocks"] = blocks - self._blocks
+            tracemalloc.reset_peak()
+            self._cur, self._blocks = cur, blocks
+        self.phases[self._prefix + name] = row
+        self._t = time.perf_counter()
+
+
+def _run_case(p, rec: PhaseRecorder, seed: int) -> None:
+    rec.start("bandit.")
+    bandit = ThompsonBandit(seed=seed)
+    bandit.import_state(p.bandit_state)
+    rec.mark("import")
+    for k in p.keys:
+        bandit.sample_multiplier(k)
+    rec.mark("sample")
+    for i, k in enumerate(p.keys):
+        bandit.update(k, success=bool(i & 1), weight=1.0)
+    rec.mark("update")
+    bandit.export_state()
+    rec.mark("export")
+
+    t0 = time.perf_counter()
+    rec.start("allocate.")
+    allocate_budget(
+        units=p.units,
+        signals=p.signals,
+        constraints=p.constraints,
+        moment_multipliers=p.moment_multipliers,
+        previous_allocations=p.previous_allocations,
+        bandit_state_in=p.bandit_state,
+        seed=seed,
+        on_phase=rec.mark,
+    )
+    total = {"wall_ms": (time.perf_counter() - t0) * 1000.0}
+    if rec.memory:
+        parts = [v for k, v in rec.phases.items() if k.startswith("allocate.")]
+        total["peak_kb"] = max(v["peak_kb"] for v in parts)
+        total["net_blocks"] = sum(v["net_blocks"] for v in parts)
+    rec.phases["allocate.total"] = total
+
+
+def measure(n_units: int, n_constraints: int, exploration_ratio: float, repeat: int = 3, seed: int = 7) -> Dict[str, dict]:
+    t0 = time.perf_counter()
+    p = make_portfolio(n_units, n_constraints, exploration_ratio, seed=seed)
+    generate_ms = (time.perf_counter() - t0) * 1000.0
+
+    # wall time: best of `repeat`, untraced
+    best: Dict[str, dict] = {}
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        rec = PhaseRecorder(memory=False)
+        _run_case(p, rec, seed)
+        for k, v in rec.phases.items():
+            if k not in best or v["wall_ms"] < best[k]["wall_ms"]:
+                best[k] = v
+
+    # memory: one traced pass
+    gc.collect()
+    tracemalloc.start()
+    try:
+        rec = PhaseRecorder(memory=True)
+        _run_case(p, rec, seed)
+    finally:
+        tracemalloc.stop()
+
+    out = {"generate": {"wall_ms": generate_ms}}
+    for k, v in best.items():
+        out[k] = {"wall_ms": v["wall_ms"], **{m: rec.phases[k][m] for m in ("peak_kb", "net_blocks")}}
+    return out
+
+
+def case_id(n_units: int, n_constraints: int, exploration_ratio: float) -> str:
+    return f"units={n_units},constraints={n_constraints},explore={exploration_ratio:g}"
+
+
+def compare(results: Dict[str, Dict[str, dict]], baseline: Dict[str, Dict[str, dict]], max_regression: float, min_delta_ms: float) -> List[str]:
+    """Returns human-readable regressions of wall_ms beyond max_regression (ratio) and min_delta_ms (noise floor)."""
+    failures = []
+    for cid, phases in results.items():
+        for phase, row in phases.items():
+            if phase == "generate":
+                continue
+            base = baseline.get(cid, {}).get(phase)
+            if not base:
+                continue
+            cur, ref = row["wall_ms"], base["wall_ms"]
+            if cur > ref * (1.0 + max_regression) and cur - ref > min_delta_ms:
+                failures.append(f"{cid} {phase}: {cur:.2f}ms vs baseline {ref:.2f}ms (+{(cur / ref - 1.0) * 100:.0f}%)")
+    return failures
+
+
+def _csv(conv: Callable[[str], object], s: str) -> list:
+    return [conv(x) for x in s.split(",") if x.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m bench", description=__doc__)
+    ap.add_argument("--units", default="1000,10000,100000,1000000")
+    ap.add_argument("--constraints", default="0,8,32", help="channel+campaign min/max constraint counts")
+    ap.add_argument("--exploration", default="0.0,0.08,0.25")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="merge this run into the baseline file")
+    ap.add_argument("--max-regression", type=float, default=None, help="fail if wall time exceeds baseline by this ratio, e.g. 0.2")
+    ap.add_argument("--min-delta-ms", type=float, default=1.0)
+    ap.add_argument("--json", default=None, help="write full results to this path")
+    args = ap.parse_args(argv)
+
+    results: Dict[str, Dict[str, dict]] = {}
+    for n, c, e in itertools.product(_csv(int, args.units), _csv(int, args.constraints), _csv(float, args.exploration)):
+        cid = case_id(n, c, e)
+        results[cid] = measure(n, c, e, repeat=args.repeat, seed=args.seed)
+        print(cid)
+        for phase, row in results[cid].items():
+            mem = ""
+            if "peak_kb" in row:
+                mem = f"  peak={row['peak_kb']:10.1f}KB  blocks={row['net_blocks']:+d}"
+            print(f"  {phase:24s} {row['wall_ms']:10.2f}ms{mem}")
+        sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    status = 0
+    if args.max_regression is not None:
+        failures = compare(results, baseline, args.max_regression, args.min_delta_ms)
+        for line in failures:
+            print("REGRESSION", line)
+        status = 1 if failures else 0
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print("baseline saved:", args.baseline)
+
+    return status
@@ -0,0 +1,110 @@
+"""Nightly-training feature benchmark: hashing, fitting and scoring at production key counts.
+
+    python -m bench.train_features --keys 1000000 --rows 2000000
+"""
+from __future__ import annotations
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import LogisticRegression
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "jobs"))
+from features import hash_keys, hash_rows, score  # noqa: E402
+
+from .generators import MOMENTS  # noqa: E402
+from .runner import PhaseRecorder  # noqa: E402
+
+
+def make_keys(n: int, seed: int) -> pd.Series:
+    """n distinct 7-part keys with realistic per-field cardinalities."""
+    rng = random.Random(seed)
+    channels = ["meta", "google", "tiktok", "dv360", "ctv"]
+    n_campaigns = max(1, n // 2000)
+    n_segments = max(1, min(500, n // 200))
+    n_inventory = max(1, min(5000, n // 100))
+    out = []
+    for i in range(n):
+        ch = rng.choice(channels)
+        out.append(
+            f"{ch}|camp_{rng.randrange(n_campaigns)}|seg_{rng.randrange(n_segments)}|{rng.choice(MOMENTS)}"
+            f"|cr_{i}|off_{rng.randrange(200)}|inv_{ch}_{rng.randrange(n_inventory)}"
+        )
+    return pd.Series(out, dtype=object)
+
+
+def run(n_keys: int, n_rows: int, seed: int, memory: bool) -> dict:
+    keys = make_keys(n_keys, seed)
+    rng = np.random.default_rng(seed)
+    rows = keys.iloc[rng.integers(0, n_keys, size=n_rows)].reset_index(drop=True)
+    y = (rng.random(n_rows) < 0.3).astype(int)
+
+    gc.collect()
+    rec = PhaseRecorder(memory=memory)
+    rec.start("train.")
+    X, _, _ = hash_rows(rows)
+    rec.mark("hash_rows")
+    model = LogisticRegression(max_iter=100)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ConvergenceWarning)  # random labels; only the cost matters here
+        model.fit(X, y)
+    rec.mark("fit")
+    del X
+    gc.collect()
+
+    rec.start("publish.")
+    unique_keys = pd.Series(pd.unique(keys), dtype=object)
+    rec.mark("unique")
+    H = hash_keys(unique_keys)
+    rec.mark("hash_keys")
+    p = score(model, H)
+    rec.mark("score")
+    return {
+        "keys": n_keys,
+        "rows": n_rows,
+        "nnz_per_key": H.nnz / max(1, H.shape[0]),
+        "matrix_mb": (H.data.nbytes + H.indices.nbytes + H.indptr.nbytes) / 1e6,
+        "p_mean": float(p.mean()),
+        "phases": rec.phases,
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--keys", type=int, default=1_000_000)
+    ap.add_argument("--rows", type=int, default=0, help="training rows sampled from the keys (default: 2x keys)")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    n_rows = args.rows or 2 * args.keys
+    timed = run(args.keys, n_rows, args.seed, memory=False)
+    tracemalloc.start()
+    try:
+        traced = run(args.keys, n_rows, args.seed, memory=True)
+    finally:
+        tracemalloc.stop()
+    for name, row in traced["phases"].items():
+        timed["phases"][name].update(peak_kb=row["peak_kb"], net_blocks=row["net_blocks"])
+
+    if args.json:
+        print(json.dumps(timed, indent=2))
+        return 0
+    print(f"keys={timed['keys']} rows={timed['rows']} nnz/key={timed['nnz_per_key']:.1f} "
+          f"key_matrix={timed['matrix_mb']:.1f}MB")
+    print(f"{'phase':<20} {'wall_ms':>10} {'peak_mb':>10}")
+    for name, row in timed["phases"].items():
+        print(f"{name:<20} {row['wall_ms']:>10.1f} {row['peak_kb'] / 1024.0:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Feature definition shared by nightly training and the online learner.
+
+Decision keys are `channel|campaign|segment|moment|creative|offer[|inventory]` (see service/keys.py).
+Every field, plus a few crosses, is hashed into a fixed-width sparse vector, so new segments, creatives
+or inventory never change the matrix width and never require column realignment.
+"""
+from typing import Iterable, List
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction import FeatureHasher
+
+KEY_FIELDS = ["channel", "campaign", "segment", "moment", "creative", "offer", "inventory"]
+CROSSES = [("channel", "moment"), ("segment", "moment"), ("channel", "inventory")]
+N_FEATURES = 2 ** 20
+# token lists are Python strings (~10 per key); hashing in chunks keeps them from dominating peak memory
+HASH_CHUNK_ROWS = 100_000
+
+FEATURE_SPEC = {
+    "kind": "hashed",
+    "fields": KEY_FIELDS,
+    "crosses": [list(c) for c in CROSSES],
+    "n_features": N_FEATURES,
+}
+
+_hasher = FeatureHasher(n_features=N_FEATURES, input_type="string", alternate_sign=False)
+
+
+def split_keys(keys: pd.Series) -> pd.DataFrame:
+    """Splits decision keys into KEY_FIELDS; 6-part keys (no inventory) get an empty inventory."""
+    parts = keys.str.split("|", n=len(KEY_FIELDS) - 1, expand=True)
+    for i in range(parts.shape[1], len(KEY_FIELDS)):
+        parts[i] = None
+    parts = parts.iloc[:, : len(KEY_FIELDS)]
+    parts.columns = KEY_FIELDS
+    return parts.fillna("")
+
+
+def _tokens(parts: pd.DataFrame) -> List[List[str]]:
+    cols = [(f + "=") + parts[f] for f in KEY_FIELDS]
+    cols += [(f"{a}^{b}=") + parts[a] + "^" + parts[b] for a, b in CROSSES]
+    return [list(t) for t in zip(*(c.tolist() for c in cols))]
+
+
+def key_tokens(key: str) -> List[str]:
+    """Token list for a single key; same tokens as hash_keys produces for that key."""
+    return _tokens(split_keys(pd.Series([key])))[0]
+
+
+def hash_keys(keys: Iterable[str]) -> sparse.csr_matrix:
+    """One CSR row per key."""
+    keys = keys if isinstance(keys, pd.Series) else pd.Series(list(keys), dtype=object)
+    keys = keys.reset_index(drop=True)
+    if keys.empty:
+        return sparse.csr_matrix((0, N_FEATURES))
+    blocks = [
+        _hasher.transform(_tokens(split_keys(keys.iloc[i: i + HASH_CHUNK_ROWS]))).tocsr()
+        for i in range(0, len(keys), HASH_CHUNK_ROWS)
+    ]
+    return blocks[0] if len(blocks) == 1 else sparse.vstack(blocks, format="csr")
+
+
+def hash_rows(keys: pd.Series):
+    """Hashes each unique key once and expands to one row per input; returns (X_rows, unique_keys, X_unique)."""
+    codes, uniques = pd.factorize(keys)
+    X_unique = hash_keys(pd.Series(uniques, dtype=object))
+    return X_unique[codes], pd.Series(uniques, dtype=object), X_unique
+
+
+def score(model, X: sparse.csr_matrix) -> np.ndarray:
+    """P(success) for each row in one sparse pass."""
+    return model.predict_proba(X)[:, 1]
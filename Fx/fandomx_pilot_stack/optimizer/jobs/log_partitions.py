@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "service"))
+
+from db import drop_expired_log_partitions, ensure_log_partitions
+
+LOG_PARTITION_DAYS_AHEAD = int(os.getenv("LOG_PARTITION_DAYS_AHEAD", "7"))
+# whole-day partitions older than this are dropped; 0 keeps everything
+OUTCOMES_RETENTION_DAYS = int(os.getenv("OUTCOMES_RETENTION_DAYS", "400"))
+ALLOCATIONS_RETENTION_DAYS = int(os.getenv("ALLOCATIONS_RETENTION_DAYS", "90"))
+
+
+def main():
+    created = ensure_log_partitions(days_back=1, days_ahead=LOG_PARTITION_DAYS_AHEAD)
+    dropped = drop_expired_log_partitions({
+        "outcomes_log": OUTCOMES_RETENTION_DAYS,
+        "allocations_log": ALLOCATIONS_RETENTION_DAYS,
+    })
+    print(f"log_partitions_complete created={len(created)} dropped={len(dropped)} {' '.join(dropped)}".rstrip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Online p_action learner fed by stream_consumer.py.
+
+Uses the hashed features from features.py (same as nightly_train.py) and SGD logistic regression, so memory is
+fixed by N_FEATURES plus a capped set of keys touched since the last publish. Refreshed p_action for those keys
+is published every ONLINE_PUBLISH_SEC as a newer as_of in model_predictions; the next nightly run supersedes it.
+
+Because a publish overrides the nightly model for the keys it covers, it only goes out when it has been shown to do
+better. Each batch is scored by the model before the model learns from it (progressive validation), and those scores
+are kept for the last ONLINE_VALIDATION_ROWS outcomes. At publish time the same rows are scored by the latest nightly
+p_action for their keys. The online model publishes only when its weighted log-loss is lower on at least
+ONLINE_MIN_VALIDATION_ROWS of them. Keys with no nightly prediction have nothing to override, so rows for them are
+not compared, and if no row has a nightly prediction the publish goes ahead.
+"""
+import json
+import os
+import pickle
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+
+from features import FEATURE_SPEC, hash_keys
+from nightly_train import EXPECTED_CPA, INCREMENTALITY, MARGIN_RATE, MODEL_NAME
+
+ONLINE_BATCH_SIZE = int(os.getenv("ONLINE_BATCH_SIZE", "256"))
+ONLINE_PUBLISH_SEC = float(os.getenv("ONLINE_PUBLISH_SEC", "300"))
+ONLINE_MAX_KEYS = int(os.getenv("ONLINE_MAX_KEYS", "200000"))
+# don't publish from a cold model
+ONLINE_MIN_UPDATES = int(os.getenv("ONLINE_MIN_UPDATES", "1000"))
+# constant step size so the model keeps tracking in-match drift instead of annealing to a standstill
+ONLINE_ETA0 = float(os.getenv("ONLINE_ETA0", "0.01"))
+ONLINE_ALPHA = float(os.getenv("ONLINE_ALPHA", "1e-6"))
+ONLINE_STATE_PATH = os.getenv("ONLINE_STATE_PATH", "")
+# recent outcomes scored before the model trained on them, compared against the nightly model at publish
+ONLINE_VALIDATION_ROWS = int(os.getenv("ONLINE_VALIDATION_ROWS", "50000"))
+ONLINE_MIN_VALIDATION_ROWS = int(os.getenv("ONLINE_MIN_VALIDATION_ROWS", "500"))
+
+
+class OnlineLearner:
+    def __init__(self):
+        self.model = SGDClassifier(loss="log_loss", penalty="l2", alpha=ONLINE_ALPHA, learning_rate="constant", eta0=ONLINE_ETA0)
+        self.updates = 0
+        self.fitted = False
+        self.last_publish = time.time()
+        self._keys: List[str] = []
+        self._y: List[int] = []
+        self._w: List[float] = []
+        self._touched: "OrderedDict[str, None]" = OrderedDict()
+        # (key, label, weight, online p_action before training on the row)
+        self._scored: Deque[Tuple[str, int, float, float]] = deque(maxlen=ONLINE_VALIDATION_ROWS)
+
+    @classmethod
+    def load_or_new(cls, path: str = ONLINE_STATE_PATH) -> "OnlineLearner":
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                learner = pickle.load(f)
+            learner.last_publish = time.time()
+            # state saved before validation existed
+            learner.__dict__.setdefault("_scored", deque(maxlen=ONLINE_VALIDATION_ROWS))
+            print(f"online learner resumed from {path}: updates={learner.updates}")
+            return learner
+        return cls()
+
+    def save(self, path: str = ONLINE_STATE_PATH) -> None:
+        if not path:
+            return
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f)
+        os.replace(tmp, path)
+
+    def observe(self, key: str, spend: float, realized_profit: float, predicted_ev: float, weight: float = 1.0) -> None:
+        """Buffers one outcome, labelled exactly as nightly_train does; partial_fit runs once per ONLINE_BATCH_SIZE."""
+        if spend <= 0:
+            return
+        realized_ev = realized_profit / max(spend, 1e-6)
+        self._keys.append(key)
+        self._y.append(int(realized_ev >= predicted_ev * 1.05))
+        self._w.append(weight)
+        self._touched[key] = None
+        self._touched.move_to_end(key)
+        if len(self._touched) > ONLINE_MAX_KEYS:
+            self._touched.popitem(last=False)
+        if len(self._keys) >= ONLINE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._keys:
+            return
+        X = hash_keys(self._keys)
+        if self.fitted:
+            p = np.clip(self.model.predict_proba(X)[:, 1], 0.001, 0.99)
+            self._scored.extend(zip(self._keys, self._y, self._w, p.tolist()))
+        self.model.partial_fit(X, np.asarray(self._y), classes=[0, 1], sample_weight=np.asarray(self._w))
+        self.updates += len(self._keys)
+        self.fitted = True
+        self._keys, self._y, self._w = [], [], []
+
+    def validate(self, conn) -> Optional[Dict[str, float]]:
+        """Log-loss of the online scores and of the latest nightly p_action on the same recent outcomes.
+
+        None when no scored outcome has a nightly prediction for its key."""
+        keys = list({k for k, _, _, _ in self._scored})
+        if not keys:
+            return None
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT DISTINCT ON (key) key, p_action
+                FROM model_predictions
+                WHERE key = ANY(%s) AND model_version NOT LIKE 'p_action_online_%%'
+                ORDER BY key, as_of DESC
+                """,
+                (keys,),
+            )
+            nightly = dict(cur.fetchall())
+        rows = [(y, w, p, nightly[k]) for k, y, w, p in self._scored if k in nightly]
+        if not rows:
+            return None
+        y, w, p_online, p_nightly = (np.asarray(c, dtype=float) for c in zip(*rows))
+        p_nightly = np.clip(p_nightly, 0.001, 0.99)
+
+        def log_loss(p: np.ndarray) -> float:
+            return float(-(w * (y * np.log(p) + (1 - y) * np.log(1 - p))).sum() / max(w.sum(), 1e-12))
+
+        return {"rows": len(rows), "logloss": log_loss(p_online), "nightly_logloss": log_loss(p_nightly)}
+
+    def due(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) - self.last_publish >= ONLINE_PUBLISH_SEC
+
+    def publish(self, conn) -> Optional[str]:
+        """Writes p_action for keys touched since the last publish; ltv/margin/cpa priors carry over from each key's latest row."""
+        self.flush()
+        self.last_publish = time.time()
+        if not self.fitted or self.updates < ONLINE_MIN_UPDATES or not self._touched:
+            return None
+        validation = self.validate(conn)
+        conn.rollback()
+        if validation is not None and (
+            validation["rows"] < ONLINE_MIN_VALIDATION_ROWS or validation["logloss"] >= validation["nightly_logloss"]
+        ):
+            print(
+                f"online publish held: logloss={validation['logloss']:.4f} nightly_logloss={validation['nightly_logloss']:.4f} "
+                f"rows={validation['rows']}"
+            )
+            return None
+
+        keys = list(self._touched)
+        p_action = np.clip(self.model.predict_proba(hash_keys(keys))[:, 1], 0.001, 0.99)
+        as_of = datetime.now(timezone.utc)
+        model_version = f"p_action_online_{as_of.strftime('%Y%m%d%H%M%S')}"
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO model_registry (model_name, version, metadata) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
+                    (MODEL_NAME, model_version, json.dumps({"mode": "online", "features": FEATURE_SPEC, "updates": self.updates, "keys": len(keys), "validation": validation})),
+                )
+                cur.execute(
+                    "CREATE TEMP TABLE online_predictions_stage (key TEXT NOT NULL, p_action DOUBLE PRECISION NOT NULL) ON COMMIT DROP"
+                )
+                with cur.copy("COPY online_predictions_stage (key, p_action) FROM STDIN") as copy:
+                    for k, p in zip(keys, p_action.tolist()):
+                        copy.write_row((k, p))
+                # keys without a nightly row get the nightly defaults (EV prior 1.0, ltv back-calculated and clipped)
+                cur.execute(
+                    """
+                    INSERT INTO model_predictions
+                    (key, as_of, model_version, p_action, ltv_uplift, margin_rate, expected_cpa, incrementality)
+                    SELECT s.key, %s, %s, s.p_action,
+                           COALESCE(lp.ltv_uplift, LEAST(5000.0, GREATEST(50.0, %s / (s.p_action * %s)))),
+                           COALESCE(lp.margin_rate, %s), COALESCE(lp.expected_cpa, %s), COALESCE(lp.incrementality, %s)
+                    FROM online_predictions_stage s
+                    LEFT JOIN LATERAL (
+                      SELECT ltv_uplift, margin_rate, expected_cpa, incrementality
+                      FROM model_predictions mp
+                      WHERE mp.key = s.key
+                      ORDER BY mp.as_of DESC
+                      LIMIT 1
+                    ) lp ON TRUE
+                    ORDER BY s.key
+                    ON CONFLICT (key, as_of) DO NOTHING
+                    """,
+                    (as_of, model_version, EXPECTED_CPA, MARGIN_RATE, MARGIN_RATE, EXPECTED_CPA, INCREMENTALITY),
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        self._touched.clear()
+        self.save()
+        print(f"online publish: {model_version} keys={len(keys)} updates={self.updates}")
+        return model_version
+
@@ -0,0 +1,117 @@
+"""Per-partition model fits in a process pool over one shared-memory CSR matrix.
+
+Rows are sorted by partition label so every partition is a contiguous row range; workers attach to the
+shared buffers and slice their range without copying the inputs through pickling.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from features import score
+
+# fallback model fit on every row; serves keys whose partition is unlabelled or too thin to fit
+GLOBAL = "*"
+MIN_WEIGHT = 50.0
+
+_ARRAYS = ("data", "indices", "indptr", "y", "w")
+_thread_limits = None
+
+
+@dataclass
+class PartitionedModel:
+    models: Dict[str, Any]
+    key_partition: pd.Series  # key -> partition label
+
+    def score_keys(self, unique_keys: pd.Series, X: sparse.csr_matrix) -> np.ndarray:
+        labels = unique_keys.map(self.key_partition).fillna(GLOBAL).to_numpy(dtype=object)
+        labels = np.where(pd.Series(labels).isin(list(self.models)).to_numpy(), labels, GLOBAL)
+        p = np.empty(len(unique_keys), dtype=float)
+        for label in pd.unique(labels):
+            idx = np.flatnonzero(labels == label)
+            p[idx] = score(self.models[label], X[idx])
+        return p
+
+
+def _fit(X, y, w, holdout: bool) -> Optional[dict]:
+    if w.sum() < MIN_WEIGHT or w[y == 1].sum() <= 0 or w[y == 0].sum() <= 0:
+        return None
+    model = LogisticRegression(max_iter=300)
+    if holdout:
+        if np.bincount(y, minlength=2).min() < 2:
+            return None
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=7, stratify=y)
+        model.fit(X_train, y_train)
+        auc = roc_auc_score(y_test, model.predict_proba(X_test)[:, 1])
+    else:
+        model.fit(X, y, sample_weight=w)
+        auc = roc_auc_score(y, model.predict_proba(X)[:, 1], sample_weight=w)
+    return {"model": model, "auc": float(auc), "rows": int(len(y))}
+
+
+def _fit_range(start: int, end: int, shms: dict, layout: dict, n_features: int, holdout: bool) -> Optional[dict]:
+    a = {name: np.ndarray(shape, dtype=dtype, buffer=shms[name].buf) for name, (shape, dtype) in layout.items()}
+    lo, hi = int(a["indptr"][start]), int(a["indptr"][end])
+    X = sparse.csr_matrix(
+        (a["data"][lo:hi], a["indices"][lo:hi], a["indptr"][start:end + 1] - lo),
+        shape=(end - start, n_features),
+    )
+    return _fit(X, a["y"][start:end], a["w"][start:end], holdout)
+
+
+def _worker_init() -> None:
+    # one BLAS/OpenMP thread per worker; the pool supplies the parallelism
+    global _thread_limits
+    from threadpoolctl import threadpool_limits
+    _thread_limits = threadpool_limits(1)
+
+
+def _run_task(task: Tuple[str, int, int, dict, int, bool]) -> Tuple[str, Optional[dict]]:
+    label, start, end, spec, n_features, holdout = task
+    shms = {name: shared_memory.SharedMemory(name=spec["names"][name]) for name in _ARRAYS}
+    try:
+        # views into shms must be gone before close(), so the fit runs in its own frame
+        return label, _fit_range(start, end, shms, spec["layout"], n_features, holdout)
+    finally:
+        for s in shms.values():
+            s.close()
+
+
+def fit_partitions(X: sparse.csr_matrix, y: np.ndarray, w: np.ndarray, labels: np.ndarray, holdout: bool, workers: int) -> Dict[str, dict]:
+    """Fits GLOBAL plus one model per non-empty label. Returns {label: {"model", "auc", "rows"}} for fits that succeeded."""
+    order = np.argsort(labels, kind="stable")
+    X, y, w, labels = X[order].tocsr(), np.ascontiguousarray(y[order]), np.ascontiguousarray(w[order], dtype=float), labels[order]
+    X.sort_indices()
+    uniq, starts = np.unique(labels, return_index=True)
+    bounds = list(zip(uniq.tolist(), starts.tolist(), starts[1:].tolist() + [len(labels)]))
+
+    arrays = {"data": X.data, "indices": X.indices, "indptr": X.indptr, "y": y, "w": w}
+    shms: Dict[str, shared_memory.SharedMemory] = {}
+    try:
+        for name, arr in arrays.items():
+            shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            shms[name] = shm
+        spec = {
+            "names": {name: s.name for name, s in shms.items()},
+            "layout": {name: (arr.shape, arr.dtype.str) for name, arr in arrays.items()},
+        }
+        tasks: List[tuple] = [(GLOBAL, 0, len(labels), spec, X.shape[1], holdout)]
+        tasks += [(str(label), s, e, spec, X.shape[1], holdout) for label, s, e in bounds if label not in ("", GLOBAL)]
+        # largest first so a big partition doesn't start last
+        tasks.sort(key=lambda t: t[2] - t[1], reverse=True)
+
+        with ProcessPoolExecutor(max_workers=max(1, workers), initializer=_worker_init) as ex:
+            results = dict(ex.map(_run_task, tasks))
+    finally:
+        for s in shms.values():
+            s.close()
+            s.unlink()
+    return {label: r for label, r in results.items() if r is not None}
@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "service"))
+
+from db import archive_idle_policy_state, fold_archived_policy_state, policy_state_sizes
+
+# arms not updated (optimized or rewarded) for this long leave the hot policy_state table
+POLICY_IDLE_DAYS = float(os.getenv("POLICY_IDLE_DAYS", "30"))
+# archived arms not looked up again for this long are folded into their parent's prior and dropped
+POLICY_ARCHIVE_DAYS = float(os.getenv("POLICY_ARCHIVE_DAYS", "90"))
+POLICY_COMPACT_BATCH = int(os.getenv("POLICY_COMPACT_BATCH", "10000"))
+
+
+def main():
+    archived = archive_idle_policy_state(POLICY_IDLE_DAYS, POLICY_COMPACT_BATCH)
+    folded = fold_archived_policy_state(POLICY_ARCHIVE_DAYS, POLICY_COMPACT_BATCH)
+    sizes = policy_state_sizes()
+    print(
+        f"policy_compaction_complete archived={archived} folded={folded} "
+        f"hot={sizes['hot']} archive={sizes['archived']} priors={sizes['priors']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
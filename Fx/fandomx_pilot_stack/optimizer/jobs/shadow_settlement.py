@@ -1,22 +1,128 @@
+import json
 import os
-from datetime import datetime, timezone, timedelta
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timezone, timedelta
 import sys
+from typing import List, Set
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", "service"))
 
-from db import run_shadow_settlement, settlement_summary
+from db import (
+    finalize_shadow_settlement,
+    load_revenue_rule_snapshot,
+    revenue_rules_version,
+    run_shadow_settlement,
+    settlement_summary,
+)
+from revenue_rules import RevenueRuleIndex
+
+# finalize: reconcile the intraday ledger and re-price it; recompute: rebuild the day from outcomes_log
+SETTLEMENT_MODE = os.getenv("SETTLEMENT_MODE", "finalize")
+# backfill: settle every day in [SETTLEMENT_FROM, SETTLEMENT_TO]; each worker holds at most one connection
+SETTLEMENT_FROM = os.getenv("SETTLEMENT_FROM", "")
+SETTLEMENT_TO = os.getenv("SETTLEMENT_TO", "")
+SETTLEMENT_WORKERS = int(os.getenv("SETTLEMENT_WORKERS", "4"))
+SETTLEMENT_CHECKPOINT = os.getenv("SETTLEMENT_CHECKPOINT", "")
+# index: price ledger rows from one in-memory load of revenue_rules; sql: LATERAL rule lookup per ledger row
+SETTLEMENT_RULES = os.getenv("SETTLEMENT_RULES", "index")
+
+# loaded once per job run; rules edited mid-run apply from the next run
+_rules = RevenueRuleIndex(load_revenue_rule_snapshot, revenue_rules_version, refresh_sec=float("inf"))
+
+
+def settle_day(run_date: str) -> dict:
+    """Settles one day in a single transaction, so re-running a day (or a killed run) is safe."""
+    rules = _rules if SETTLEMENT_RULES == "index" else None
+    if SETTLEMENT_MODE == "recompute":
+        rows = run_shadow_settlement(run_date, rules=rules)
+        return {"settlement_date": run_date, "mode": "recomputed", "rows": rows, "outcomes": None}
+    return finalize_shadow_settlement(run_date, rules=rules)
+
+
+def _days(start: date, end: date) -> List[str]:
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def _load_checkpoint(path: str, key: dict) -> Set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        state = json.load(f)
+    if state.get("key") != key:
+        raise SystemExit(f"checkpoint {path} is for {state.get('key')}, not {key}; remove it or set SETTLEMENT_CHECKPOINT")
+    return set(state["done"])
+
+
+def _save_checkpoint(path: str, key: dict, done: Set[str]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"key": key, "done": sorted(done)}, f)
+    os.replace(tmp, path)
+
+
+def backfill(start: date, end: date, workers: int, checkpoint: str) -> int:
+    """Settles every day in [start, end] over `workers` threads. Finished days are checkpointed as they complete,
+    so a rerun with the same range and mode skips them; the checkpoint is removed once the whole range is done."""
+    key = {"from": start.isoformat(), "to": end.isoformat(), "mode": SETTLEMENT_MODE}
+    done = _load_checkpoint(checkpoint, key)
+    todo = [d for d in _days(start, end) if d not in done]
+    total = len(todo) + len(done)
+    print(f"shadow_settlement_backfill from={start} to={end} mode={SETTLEMENT_MODE} workers={workers} "
+          f"days={total} resumed={len(done)} checkpoint={checkpoint}")
+
+    failed: List[str] = []
+    processed = rows = outcomes = 0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        futures = {ex.submit(settle_day, d): d for d in todo}
+        for fut in as_completed(futures):
+            d = futures[fut]
+            processed += 1
+            try:
+                r = fut.result()
+            except Exception as e:
+                failed.append(d)
+                print(f"  {d} FAILED: {e}")
+                continue
+            done.add(d)
+            _save_checkpoint(checkpoint, key, done)
+            rows += r["rows"]
+            outcomes += r["outcomes"] or 0
+            print(f"  [{len(done) + len(failed)}/{total}] {d} {r['mode']} rows={r['rows']} "
+                  f"{processed / (time.perf_counter() - t0):.2f} days/s")
+
+    elapsed = time.perf_counter() - t0
+    rate = f" outcomes/s={outcomes / elapsed:.0f}" if SETTLEMENT_MODE != "recompute" and elapsed > 0 else ""
+    print(f"shadow_settlement_backfill_complete days={len(todo) - len(failed)} failed={len(failed)} "
+          f"ledger_rows={rows} elapsed={elapsed:.1f}s{rate}")
+    if failed:
+        print(f"failed days (rerun to retry): {','.join(sorted(failed))}")
+        return 1
+    os.remove(checkpoint)
+    return 0
 
 
 def main():
+    if SETTLEMENT_FROM or SETTLEMENT_TO:
+        start = date.fromisoformat(SETTLEMENT_FROM or SETTLEMENT_TO)
+        end = date.fromisoformat(SETTLEMENT_TO or SETTLEMENT_FROM)
+        if end < start:
+            raise SystemExit(f"SETTLEMENT_TO {end} is before SETTLEMENT_FROM {start}")
+        if SETTLEMENT_MODE != "recompute" and end >= datetime.now(timezone.utc).date():
+            raise SystemExit(f"SETTLEMENT_TO {end} is still open; finalize only closes past days")
+        checkpoint = SETTLEMENT_CHECKPOINT or f"settlement_backfill_{start}_{end}_{SETTLEMENT_MODE}.json"
+        sys.exit(backfill(start, end, SETTLEMENT_WORKERS, checkpoint))
+
     run_date = os.getenv("SETTLEMENT_DATE")
     if not run_date:
         # default: previous UTC day for stable nightly closure
         run_date = (datetime.now(timezone.utc).date() - timedelta(days=1)).isoformat()
 
-    run_shadow_settlement(run_date)
+    mode = settle_day(run_date)["mode"]
     rows = settlement_summary(run_date)
     gross = sum(r["gross_spend"] for r in rows)
-    print(f"shadow_settlement_complete date={run_date} rows={len(rows)} gross_spend={gross:.2f}")
+    print(f"shadow_settlement_complete date={run_date} mode={mode} rows={len(rows)} gross_spend={gross:.2f}")
 
 
 if __name__ == "__main__":
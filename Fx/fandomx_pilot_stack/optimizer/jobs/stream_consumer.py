@@ -8,7 +8,8 @@ import requests
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", "service"))
 
-from db import upsert_outcomes_agg
+from db import get_conn, upsert_outcomes_agg
+from online_learner import OnlineLearner
 
 KAFKA_BOOTSTRAP = os.getenv("KAFKA_BOOTSTRAP", "localhost:9092")
 TOPIC = os.getenv("KAFKA_TOPIC", "fx_outcomes")
@@ -27,8 +28,16 @@ def main():
         "enable.auto.commit": True,
     })
     c.subscribe([TOPIC])
+    learner = OnlineLearner.load_or_new()
 
     while True:
+        if learner.due():
+            try:
+                with get_conn() as conn:
+                    learner.publish(conn)
+            except Exception as e:  # keep consuming; touched keys are retried next interval
+                print("online publish failed:", e)
+
         msg = c.poll(1.0)
         if msg is None:
             continue
@@ -69,7 +78,10 @@ def main():
             profit_proxy=profit_proxy,
         )
 
-        # 2) update bandit immediately
+        # 2) update the online p_action model (in-memory; published every ONLINE_PUBLISH_SEC)
+        learner.observe(key, spend, profit_proxy, predicted_ev)
+
+        # 3) update bandit immediately
         if spend > 0:
             req = {
                 "outcomes": [{
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Same import convention as optimizer/jobs: service modules are top-level.
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "service"))
@@ -0,0 +1,150 @@
+"""Local stand-ins for load tests: a throwaway Postgres cluster and the optimizer app under uvicorn."""
+from __future__ import annotations
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import psycopg
+import requests
+
+HERE = os.path.dirname(__file__)
+SERVICE_DIR = os.path.abspath(os.path.join(HERE, "..", "service"))
+SCHEMA_SQL = os.path.abspath(os.path.join(HERE, "..", "sql", "schema.sql"))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pg_bin(name: str) -> str:
+    path = shutil.which(name)
+    if path:
+        return path
+    pg_config = shutil.which("pg_config")
+    if pg_config:
+        bindir = subprocess.check_output([pg_config, "--bindir"], text=True).strip()
+        cand = os.path.join(bindir, name)
+        if os.path.exists(cand):
+            return cand
+    raise RuntimeError(f"{name} not found; install Postgres server binaries or pass --database-url")
+
+
+class DisposablePostgres:
+    """initdb + pg_ctl in a temp dir with pg_stat_statements preloaded; removed on stop()."""
+    def __init__(self, user: str = "fx", dbname: str = "fxdb"):
+        self.user = user
+        self.dbname = dbname
+        self.port = free_port()
+        self.datadir = tempfile.mkdtemp(prefix="fx_loadtest_pg_")
+        self.url = f"postgresql://{user}@127.0.0.1:{self.port}/{dbname}"
+
+    def start(self) -> "DisposablePostgres":
+        subprocess.run(
+            [_pg_bin("initdb"), "-D", self.datadir, "-U", self.user, "--auth=trust", "-E", "UTF8"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        opts = f"-p {self.port} -k {self.datadir} -c listen_addresses=127.0.0.1 -c max_connections=300 -c fsync=off"
+        # Builds without contrib can't preload pg_stat_statements; query counts are then omitted from the report.
+        self.stat_statements = self._pg_ctl_start(opts + " -c shared_preload_libraries=pg_stat_statements")
+        if not self.stat_statements:
+            if not self._pg_ctl_start(opts):
+                raise RuntimeError(f"postgres failed to start; see {self.datadir}/server.log")
+        with psycopg.connect(f"postgresql://{self.user}@127.0.0.1:{self.port}/postgres", autocommit=True) as conn:
+            conn.execute(f'CREATE DATABASE "{self.dbname}"')
+        with psycopg.connect(self.url, autocommit=True) as conn:
+            if self.stat_statements:
+                conn.execute("CREATE EXTENSION IF NOT EXISTS pg_stat_statements")
+            with open(SCHEMA_SQL) as f:
+                conn.execute(f.read())
+        return self
+
+    def _pg_ctl_start(self, opts: str) -> bool:
+        proc = subprocess.run(
+            [_pg_bin("pg_ctl"), "-D", self.datadir, "-o", opts, "-l", os.path.join(self.datadir, "server.log"), "-w", "start"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        return proc.returncode == 0
+
+    def stop(self) -> None:
+        subprocess.run([_pg_bin("pg_ctl"), "-D", self.datadir, "-m", "fast", "-w", "stop"], stdout=subprocess.DEVNULL)
+        shutil.rmtree(self.datadir, ignore_errors=True)
+
+
+class DisposableReplica:
+    """Streaming standby of a running DisposablePostgres (pg_basebackup -R); removed on stop()."""
+    def __init__(self, primary: DisposablePostgres):
+        self.primary = primary
+        self.port = free_port()
+        self.datadir = tempfile.mkdtemp(prefix="fx_loadtest_replica_")
+        self.url = f"postgresql://{primary.user}@127.0.0.1:{self.port}/{primary.dbname}"
+
+    def start(self, timeout: float = 30.0) -> "DisposableReplica":
+        subprocess.run(
+            [_pg_bin("pg_basebackup"), "-h", "127.0.0.1", "-p", str(self.primary.port), "-U", self.primary.user,
+             "-D", self.datadir, "-R", "-X", "stream", "--checkpoint=fast"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        # a standby refuses to start with max_connections below the primary's
+        opts = f"-p {self.port} -k {self.datadir} -c listen_addresses=127.0.0.1 -c max_connections=300 -c fsync=off"
+        proc = subprocess.run(
+            [_pg_bin("pg_ctl"), "-D", self.datadir, "-o", opts, "-l", os.path.join(self.datadir, "server.log"), "-w", "start"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"replica failed to start; see {self.datadir}/server.log")
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with psycopg.connect(self.url, autocommit=True) as conn:
+                if conn.execute("SELECT status FROM pg_stat_wal_receiver").fetchone() == ("streaming",):
+                    return self
+            time.sleep(0.2)
+        raise RuntimeError("replica did not start streaming in time")
+
+    def stop(self) -> None:
+        subprocess.run([_pg_bin("pg_ctl"), "-D", self.datadir, "-m", "fast", "-w", "stop"], stdout=subprocess.DEVNULL)
+        shutil.rmtree(self.datadir, ignore_errors=True)
+
+
+class OptimizerApp:
+    """Runs optimizer/service/app.py under uvicorn against the given DATABASE_URL."""
+    def __init__(self, database_url: str, port: Optional[int] = None, workers: int = 1, extra_env: Optional[dict] = None):
+        self.database_url = database_url
+        self.port = port or free_port()
+        self.workers = workers
+        self.extra_env = extra_env or {}
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.proc: Optional[subprocess.Popen] = None
+
+    def start(self, timeout: float = 30.0) -> "OptimizerApp":
+        env = {**os.environ, "DATABASE_URL": self.database_url, **self.extra_env}
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=SERVICE_DIR, env=env,
+        )
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"optimizer exited with code {self.proc.returncode}")
+            try:
+                if requests.get(f"{self.url}/health", timeout=1).ok:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.25)
+        raise RuntimeError("optimizer did not become healthy in time")
+
+    def stop(self) -> None:
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
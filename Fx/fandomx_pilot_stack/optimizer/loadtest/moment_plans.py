@@ -0,0 +1,90 @@
+"""Moment-plan precompute check with the orchestrator's own template.
+
+    python -m loadtest.moment_plans
+
+Loads the body the orchestrator POSTs to /moment-plans (services/orchestrator/src/demo.js, via node), registers it
+with an optimizer on a disposable Postgres, and waits for the background refresher to build every moment type. Each
+type must then be served by /moments/detected instead of a 404. Exits non-zero if any type never builds.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import time
+from typing import List, Optional
+
+import requests
+
+from .harness import SERVICE_DIR, DisposablePostgres, OptimizerApp
+
+ORCHESTRATOR_DIR = os.path.join(SERVICE_DIR, "..", "..", "services", "orchestrator")
+
+
+def orchestrator_template() -> dict:
+    out = subprocess.check_output(
+        ["node", "--input-type=module", "-e",
+         'import { momentPlanTemplate } from "./src/demo.js"; console.log(JSON.stringify(momentPlanTemplate()));'],
+        cwd=ORCHESTRATOR_DIR, text=True,
+    )
+    return json.loads(out)
+
+
+def run_checks(app_url: str, template: dict, timeout: float) -> List[dict]:
+    r = requests.post(f"{app_url}/moment-plans", json=template, timeout=10)
+    r.raise_for_status()
+    results = []
+    deadline = time.time() + timeout
+    for moment_type in template["moment_types"]:
+        t0 = time.perf_counter()
+        while True:
+            r = requests.post(
+                f"{app_url}/moments/detected",
+                json={"moment_type": moment_type, "operator_id": template["operator_id"]},
+                timeout=10,
+            )
+            if r.status_code != 404 or time.time() > deadline:
+                break
+            time.sleep(0.25)
+        body = r.json() if r.ok else {}
+        results.append({
+            "moment_type": moment_type,
+            "status": r.status_code,
+            "allocations": len(body.get("allocations", {})),
+            "wait_ms": (time.perf_counter() - t0) * 1000.0,
+        })
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m loadtest.moment_plans", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--app-url", default=None, help="use a running optimizer instead of starting one")
+    ap.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for every plan to build")
+    args = ap.parse_args(argv)
+
+    template = orchestrator_template()
+    pg = app = None
+    try:
+        app_url = args.app_url
+        if not app_url:
+            pg = DisposablePostgres().start()
+            app = OptimizerApp(pg.url, extra_env={"MOMENT_PLAN_REFRESH_SEC": "0.5"}).start()
+            app_url = app.url
+        results = run_checks(app_url, template, args.timeout)
+    finally:
+        if app:
+            app.stop()
+        if pg:
+            pg.stop()
+
+    failed = 0
+    print(f"{'moment_type':<16} {'status':>6} {'allocations':>11} {'wait_ms':>9}")
+    for r in results:
+        ok = r["status"] == 200 and r["allocations"] > 0
+        failed += not ok
+        print(f"{r['moment_type']:<16} {r['status']:>6} {r['allocations']:>11} {r['wait_ms']:>9.1f}{'' if ok else '  FAIL'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,149 @@
+"""outcomes_log query times, unpartitioned vs day-partitioned, on the same synthetic rows.
+
+    python -m loadtest.partitions --rows 100000000 --days 120
+
+Builds `bench_outcomes_plain` (the pre-partitioning layout: PK on id, btree on key) and `bench_outcomes_part`
+(day partitions, PK (id, created_at), btree on key, BRIN on created_at), then times the queries the jobs run.
+"""
+from __future__ import annotations
+import argparse
+import json
+import time
+from datetime import date, timedelta
+from typing import Callable, List, Optional
+
+import psycopg
+
+from .harness import DisposablePostgres
+
+_COLUMNS = """
+    id BIGINT NOT NULL,
+    key TEXT NOT NULL,
+    operator_id TEXT,
+    channel TEXT,
+    spend DOUBLE PRECISION NOT NULL,
+    impressions BIGINT NOT NULL DEFAULT 0,
+    conversions BIGINT NOT NULL DEFAULT 0,
+    realized_profit DOUBLE PRECISION NOT NULL,
+    predicted_ev DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMP NOT NULL
+"""
+
+
+def build(conn, rows: int, days: int, keys: int, start: date) -> None:
+    conn.execute("DROP TABLE IF EXISTS bench_outcomes_plain, bench_outcomes_part")
+    conn.execute(f"CREATE TABLE bench_outcomes_plain ({_COLUMNS}, PRIMARY KEY (id))")
+    conn.execute(f"CREATE TABLE bench_outcomes_part ({_COLUMNS}, PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)")
+    for i in range(days):
+        d = start + timedelta(days=i)
+        conn.execute(
+            f"CREATE TABLE bench_outcomes_part_p{d.strftime('%Y%m%d')} PARTITION OF bench_outcomes_part "
+            f"FOR VALUES FROM ('{d.isoformat()}') TO ('{(d + timedelta(days=1)).isoformat()}')"
+        )
+    # append-ordered like the real log: created_at increases with id
+    conn.execute(
+        """
+        INSERT INTO bench_outcomes_plain (id, key, operator_id, channel, spend, impressions, conversions, realized_profit, predicted_ev, created_at)
+        SELECT g,
+               'ch_' || mod(k, 5) || '|camp_' || mod(k, 97) || '|seg|team_success|cr_' || k || '|off',
+               'op_' || mod(k, 13), 'ch_' || mod(k, 5),
+               10.0 + mod(g, 50), mod(g, 1000), mod(g, 7), 5.0 + mod(g, 40), 1.0,
+               %(start)s::timestamp + (g - 1) * (%(days)s * INTERVAL '1 day') / %(rows)s
+        FROM (SELECT g, mod(g * 7919, %(keys)s) AS k FROM generate_series(1::bigint, %(rows)s) g) s
+        """,
+        {"rows": rows, "days": days, "keys": keys, "start": start},
+    )
+    conn.execute("INSERT INTO bench_outcomes_part SELECT * FROM bench_outcomes_plain")
+    conn.execute("CREATE INDEX ON bench_outcomes_plain (key)")
+    conn.execute("CREATE INDEX ON bench_outcomes_part (key)")
+    conn.execute("CREATE INDEX ON bench_outcomes_part USING brin (created_at)")
+    conn.execute("VACUUM ANALYZE bench_outcomes_plain")
+    conn.execute("VACUUM ANALYZE bench_outcomes_part")
+
+
+def _timed(conn, fn: Callable[[], None], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+        conn.rollback()
+    return best * 1000.0
+
+
+def run_queries(conn, days: int, start: date, repeat: int) -> List[dict]:
+    day = start + timedelta(days=days // 2)
+    last = start + timedelta(days=days)
+    settle = """
+        SELECT operator_id, channel, SUM(spend), SUM(impressions), SUM(conversions)
+        FROM {t} WHERE {pred} GROUP BY 1, 2
+    """
+    old_pred = "DATE(created_at) = %(d)s"
+    new_pred = "created_at >= %(d)s::date AND created_at < %(d)s::date + 1"
+    # nightly full mode reads every row in the window; aggregate so row transfer doesn't dominate
+    train = "SELECT COUNT(*), SUM(realized_profit) FROM {t} WHERE created_at >= %(lo)s"
+
+    def q(sql: str, params: dict) -> Callable[[], None]:
+        def run() -> None:
+            cur = conn.execute(sql, params)
+            if cur.description is not None:
+                cur.fetchall()
+        return run
+
+    cases = [
+        ("settlement day, DATE() predicate", "plain", q(settle.format(t="bench_outcomes_plain", pred=old_pred), {"d": day})),
+        ("settlement day, half-open range", "plain", q(settle.format(t="bench_outcomes_plain", pred=new_pred), {"d": day})),
+        ("settlement day, half-open range", "partitioned", q(settle.format(t="bench_outcomes_part", pred=new_pred), {"d": day})),
+        ("training window, last 30 days", "plain", q(train.format(t="bench_outcomes_plain"), {"lo": last - timedelta(days=30)})),
+        ("training window, last 30 days", "partitioned", q(train.format(t="bench_outcomes_part"), {"lo": last - timedelta(days=30)})),
+        ("retention: oldest day", "plain (DELETE)", q("DELETE FROM bench_outcomes_plain WHERE created_at < %(d)s", {"d": start + timedelta(days=1)})),
+        ("retention: oldest day", "partitioned (DROP)", q(f"DROP TABLE bench_outcomes_part_p{start.strftime('%Y%m%d')}", {})),
+    ]
+    # retention cases run inside a transaction that _timed rolls back, so they are repeatable
+    return [{"query": name, "layout": layout, "ms": round(_timed(conn, fn, repeat), 2)} for name, layout, fn in cases]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m loadtest.partitions", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--database-url", default=None, help="use an existing database instead of a disposable cluster")
+    ap.add_argument("--rows", type=int, default=5_000_000)
+    ap.add_argument("--days", type=int, default=60)
+    ap.add_argument("--keys", type=int, default=50_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--keep", action="store_true", help="leave the bench tables in place")
+    ap.add_argument("--reuse", action="store_true", help="time tables left by an earlier --keep run instead of rebuilding")
+    ap.add_argument("--json", default=None, help="write the report to this path")
+    args = ap.parse_args(argv)
+
+    pg = None
+    database_url = args.database_url
+    if database_url is None:
+        pg = DisposablePostgres().start()
+        database_url = pg.url
+    start = date(2026, 1, 1)
+    try:
+        with psycopg.connect(database_url, autocommit=True) as conn:
+            if not args.reuse:
+                t0 = time.perf_counter()
+                build(conn, args.rows, args.days, args.keys, start)
+                print(f"built {args.rows} rows over {args.days} days in {time.perf_counter() - t0:.1f}s")
+        with psycopg.connect(database_url) as conn:
+            report = run_queries(conn, args.days, start, args.repeat)
+            if not args.keep:
+                conn.execute("DROP TABLE IF EXISTS bench_outcomes_plain, bench_outcomes_part")
+                conn.commit()
+    finally:
+        if pg is not None:
+            pg.stop()
+
+    print(f"{'query':<36} {'layout':<20} {'ms':>10}")
+    for r in report:
+        print(f"{r['query']:<36} {r['layout']:<20} {r['ms']:>10.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": args.rows, "days": args.days, "results": report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,124 @@
+"""Read-replica routing checks for db.get_read_conn against a disposable primary and streaming standby.
+
+    python -m loadtest.replica
+
+Starts a primary and a `pg_basebackup -R` standby, then checks which server the read helper picks:
+caught up, replay paused, WAL receiver disconnected, and an unreachable replica. The last check also times how long
+a read takes to fall back.
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import time
+from typing import Callable, List, Optional
+
+import psycopg
+from psycopg import sql
+
+from .harness import SERVICE_DIR, DisposablePostgres, DisposableReplica
+
+# an address that drops packets, so connects hang until the timeout instead of being refused
+BLACKHOLE_URL = "postgresql://fx@10.255.255.1:5432/fxdb"
+
+
+def _write(primary_url: str) -> None:
+    with psycopg.connect(primary_url, autocommit=True) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS replica_check (id BIGSERIAL PRIMARY KEY, at TIMESTAMPTZ DEFAULT now())")
+        conn.execute("INSERT INTO replica_check DEFAULT VALUES")
+
+
+def _replica_sql(replica_url: str, query: str) -> None:
+    with psycopg.connect(replica_url, autocommit=True) as conn:
+        conn.execute(query)
+
+
+def run_checks(db, primary: DisposablePostgres, replica: DisposableReplica, max_lag: float) -> List[dict]:
+    def served_by(**kwargs) -> str:
+        db._replica_lag.update(checked_at=float("-inf"), error_at=float("-inf"))
+        with db.get_read_conn(**kwargs) as conn:
+            return "replica" if conn.info.port == replica.port else "primary"
+
+    def wait_caught_up() -> None:
+        deadline = time.time() + 30
+        while served_by(max_lag_sec=0.0) != "replica":
+            if time.time() > deadline:
+                raise RuntimeError("replica did not catch up")
+            time.sleep(0.2)
+
+    results = []
+
+    def check(name: str, expect: str, fn: Callable[[], str]) -> None:
+        t0 = time.perf_counter()
+        got = fn()
+        results.append({"check": name, "expect": expect, "got": got, "ms": (time.perf_counter() - t0) * 1000.0})
+
+    _write(primary.url)
+    wait_caught_up()
+    check("caught up, lag bound", "replica", lambda: served_by(max_lag_sec=max_lag))
+    check("caught up, no bound", "replica", lambda: served_by())
+
+    _replica_sql(replica.url, "SELECT pg_wal_replay_pause()")
+    _write(primary.url)
+    time.sleep(max_lag + 0.5)
+    check("replay paused, lag bound", "primary", lambda: served_by(max_lag_sec=max_lag))
+    check("replay paused, no bound", "replica", lambda: served_by())
+    _replica_sql(replica.url, "SELECT pg_wal_replay_resume()")
+    wait_caught_up()
+
+    # received == replayed here, which the old probe took as 0 lag
+    with psycopg.connect(replica.url, autocommit=True) as conn:
+        conninfo = conn.execute("SHOW primary_conninfo").fetchone()[0]
+    _replica_sql(replica.url, "ALTER SYSTEM SET primary_conninfo = ''")
+    _replica_sql(replica.url, "SELECT pg_reload_conf()")
+    time.sleep(1.0)
+    _write(primary.url)
+    time.sleep(max_lag + 0.5)
+    check("receiver disconnected, lag bound", "primary", lambda: served_by(max_lag_sec=max_lag))
+    with psycopg.connect(replica.url, autocommit=True) as conn:
+        conn.execute(sql.SQL("ALTER SYSTEM SET primary_conninfo = {}").format(sql.Literal(conninfo)))
+    _replica_sql(replica.url, "SELECT pg_reload_conf()")
+    wait_caught_up()
+    check("receiver reconnected, lag bound", "replica", lambda: served_by(max_lag_sec=max_lag))
+
+    db.DB_READ_URL = BLACKHOLE_URL
+    check("unreachable, first read", "primary", lambda: served_by())
+
+    def cached_error() -> str:
+        with db.get_read_conn() as conn:
+            return "replica" if conn.info.port == replica.port else "primary"
+
+    check("unreachable, next read (cached)", "primary", cached_error)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m loadtest.replica", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--max-lag", type=float, default=1.0, help="DATABASE_READ_MAX_LAG_SEC for the bounded checks")
+    args = ap.parse_args(argv)
+
+    primary = DisposablePostgres().start()
+    replica = None
+    try:
+        replica = DisposableReplica(primary).start()
+        os.environ.update(DATABASE_URL=primary.url, DATABASE_READ_URL=replica.url, DATABASE_READ_CONNECT_TIMEOUT_SEC="1")
+        sys.path.insert(0, SERVICE_DIR)
+        import db
+
+        results = run_checks(db, primary, replica, args.max_lag)
+    finally:
+        if replica is not None:
+            replica.stop()
+        primary.stop()
+
+    failed = 0
+    print(f"{'check':<36} {'expect':<8} {'got':<8} {'ms':>9}")
+    for r in results:
+        ok = r["got"] == r["expect"]
+        failed += not ok
+        print(f"{r['check']:<36} {r['expect']:<8} {r['got']:<8} {r['ms']:>9.1f}{'' if ok else '  FAIL'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
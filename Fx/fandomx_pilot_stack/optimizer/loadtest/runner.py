@@ -0,0 +1,228 @@
+"""Mixed /optimize + /update load against a local optimizer, reporting latency percentiles and DB usage."""
+from __future__ import annotations
+import argparse
+import json
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+import psycopg
+import requests
+
+from .harness import DisposablePostgres, OptimizerApp
+from .workload import db_counters, db_delta, make_catalog, optimize_requests, seed_database, update_requests
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile over an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.late: Dict[str, int] = {}
+
+    def add(self, name: str, latency_ms: float, ok: bool) -> None:
+        with self.lock:
+            self.latencies.setdefault(name, []).append(latency_ms)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, elapsed_sec: float) -> dict:
+        out = {}
+        for name, lat in self.latencies.items():
+            s = sorted(lat)
+            out[name] = {
+                "requests": len(s),
+                "errors": self.errors.get(name, 0),
+                "late_dispatches": self.late.get(name, 0),
+                "throughput_rps": len(s) / elapsed_sec if elapsed_sec > 0 else 0.0,
+                "p50_ms": percentile(s, 50),
+                "p95_ms": percentile(s, 95),
+                "p99_ms": percentile(s, 99),
+                "max_ms": s[-1] if s else 0.0,
+            }
+        return out
+
+
+def _fire(rec: Recorder, url: str, name: str, body: dict, timeout: float) -> None:
+    t0 = time.perf_counter()
+    ok = False
+    try:
+        ok = _session().post(url, json=body, timeout=timeout).ok
+    except requests.RequestException:
+        ok = False
+    rec.add(name, (time.perf_counter() - t0) * 1000.0, ok)
+
+
+def _pace(pool: ThreadPoolExecutor, rec: Recorder, url: str, name: str, bodies: Iterator[dict], rps: float, stop_at: float, timeout: float) -> None:
+    """Open-loop dispatcher: requests are issued on schedule regardless of how slow earlier ones are."""
+    if rps <= 0:
+        return
+    interval = 1.0 / rps
+    next_at = time.perf_counter()
+    while next_at < stop_at:
+        now = time.perf_counter()
+        if next_at > now:
+            time.sleep(next_at - now)
+        elif now - next_at > interval:
+            rec.late[name] = rec.late.get(name, 0) + 1
+        pool.submit(_fire, rec, url, name, next(bodies), timeout)
+        next_at += interval
+
+
+_STAGE_RE = re.compile(r'^fx_optimizer_stage_seconds_(sum|count)\{endpoint="([^"]*)",stage="([^"]*)"\} (\S+)$')
+
+
+def stage_totals(app_url: str) -> Dict[tuple, List[float]]:
+    """(endpoint, stage) -> [seconds, count] from the app's /metrics; with several workers, one worker's share."""
+    out: Dict[tuple, List[float]] = {}
+    try:
+        text = _session().get(f"{app_url}/metrics", timeout=5).text
+    except requests.RequestException:
+        return out
+    for line in text.splitlines():
+        m = _STAGE_RE.match(line)
+        if m:
+            out.setdefault((m.group(2), m.group(3)), [0.0, 0.0])[m.group(1) == "count"] = float(m.group(4))
+    return out
+
+
+def stage_means(before: Dict[tuple, List[float]], after: Dict[tuple, List[float]]) -> Dict[str, Dict[str, float]]:
+    """Mean ms per sampled call of each stage during the run."""
+    out: Dict[str, Dict[str, float]] = {}
+    for (endpoint, stage), (total, n) in after.items():
+        t0, n0 = before.get((endpoint, stage), (0.0, 0.0))
+        if n > n0:
+            out.setdefault(endpoint, {})[stage] = (total - t0) / (n - n0) * 1000.0
+    return out
+
+
+def _sample_backends(database_url: str, stop: threading.Event, out: dict) -> None:
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        while not stop.is_set():
+            n = conn.execute("SELECT numbackends FROM pg_stat_database WHERE datname = current_database()").fetchone()[0]
+            out["peak_backends"] = max(out.get("peak_backends", 0), int(n or 0))
+            stop.wait(0.25)
+
+
+def run_load(app_url: str, database_url: str, args) -> dict:
+    catalog = make_catalog(args.operators, args.units_per_operator, seed=args.seed)
+    if args.seed_data:
+        seed_database(database_url, catalog, seed=args.seed)
+
+    rec = Recorder()
+    before = db_counters(database_url)
+    stages_before = stage_totals(app_url)
+    sampler_out: dict = {}
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_backends, args=(database_url, stop, sampler_out), daemon=True)
+    sampler.start()
+
+    t0 = time.perf_counter()
+    stop_at = t0 + args.duration
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        drivers = [
+            threading.Thread(target=_pace, args=(pool, rec, f"{app_url}/optimize", "optimize",
+                                                 optimize_requests(catalog, args.units_per_request, args.seed),
+                                                 args.optimize_rps, stop_at, args.timeout)),
+            threading.Thread(target=_pace, args=(pool, rec, f"{app_url}/update", "update",
+                                                 update_requests(catalog, args.outcomes_per_request, args.seed),
+                                                 args.update_rps, stop_at, args.timeout)),
+        ]
+        for d in drivers:
+            d.start()
+        for d in drivers:
+            d.join()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    sampler.join(timeout=2)
+    after = db_counters(database_url)
+    stages = stage_means(stages_before, stage_totals(app_url))
+
+    db = db_delta(before, after)
+    db["peak_backends"] = sampler_out.get("peak_backends", 0)
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json",)},
+        "elapsed_sec": elapsed,
+        "endpoints": rec.report(elapsed),
+        "db": db,
+        "stages": stages,
+    }
+
+
+def _print(report: dict) -> None:
+    print(f"elapsed={report['elapsed_sec']:.1f}s")
+    for name, r in report["endpoints"].items():
+        print(
+            f"{name:9s} n={r['requests']:6d} err={r['errors']:4d} late={r['late_dispatches']:4d} "
+            f"rps={r['throughput_rps']:8.1f} p50={r['p50_ms']:8.1f}ms p95={r['p95_ms']:8.1f}ms p99={r['p99_ms']:8.1f}ms"
+        )
+    for name, stages in report.get("stages", {}).items():
+        print(f"{name:9s} stages " + " ".join(f"{k}={v:.1f}ms" for k, v in sorted(stages.items(), key=lambda kv: -kv[1])))
+    db = report["db"]
+    print(f"db connections_opened={db.get('connections_opened', 'n/a')} transactions={db['transactions']} "
+          f"queries={db.get('queries', 'n/a')} peak_backends={db['peak_backends']}")
+    for q in db.get("top_queries", []):
+        print(f"  {q['calls']:8d}  {q['query']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m loadtest", description=__doc__)
+    ap.add_argument("--database-url", default=None, help="use an existing database instead of a disposable cluster")
+    ap.add_argument("--app-url", default=None, help="use a running optimizer instead of starting one")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting the app")
+    ap.add_argument("--duration", type=float, default=30.0)
+    ap.add_argument("--optimize-rps", type=float, default=5.0)
+    ap.add_argument("--update-rps", type=float, default=20.0)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--timeout", type=float, default=10.0)
+    ap.add_argument("--operators", type=int, default=4)
+    ap.add_argument("--units-per-operator", type=int, default=500)
+    ap.add_argument("--units-per-request", type=int, default=200)
+    ap.add_argument("--outcomes-per-request", type=int, default=5)
+    ap.add_argument("--no-seed", dest="seed_data", action="store_false", help="skip loading synthetic data")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", default=None, help="write the report to this path")
+    args = ap.parse_args(argv)
+
+    pg = app = None
+    try:
+        database_url = args.database_url
+        if not database_url:
+            pg = DisposablePostgres().start()
+            database_url = pg.url
+        app_url = args.app_url
+        if not app_url:
+            app = OptimizerApp(database_url, workers=args.workers).start()
+            app_url = app.url
+
+        report = run_load(app_url, database_url, args)
+    finally:
+        if app:
+            app.stop()
+        if pg:
+            pg.stop()
+
+    _print(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
@@ -0,0 +1,179 @@
+"""Synthetic match-day data and request streams for the load harness."""
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List
+import json
+import random
+
+import psycopg
+
+from keys import make_key
+
+CHANNELS = ["meta", "google", "youtube", "dsp", "inapp", "ott"]
+MOMENTS = ["team_success", "team_failure", "turning_point", "player_success", "player_failure"]
+
+
+@dataclass
+class Catalog:
+    """Decision units per operator; every unit's key has seeded policy_state and model_predictions rows."""
+    units: Dict[str, List[dict]]
+
+    def keys(self) -> List[str]:
+        return [u["key"] for us in self.units.values() for u in us]
+
+
+def make_catalog(n_operators: int = 4, units_per_operator: int = 500, n_inventory: int = 8, seed: int = 7) -> Catalog:
+    rng = random.Random(seed)
+    out: Dict[str, List[dict]] = {}
+    for o in range(n_operators):
+        op = f"lt_operator_{o}"
+        units = []
+        for i in range(units_per_operator):
+            inv = f"lt_inv_{o}_{i % n_inventory}"
+            u = {
+                "channel": CHANNELS[rng.randrange(len(CHANNELS))],
+                "campaign_id": f"lt_camp_{o}_{rng.randrange(8)}",
+                "segment_id": f"lt_seg_{rng.randrange(16)}",
+                "moment": MOMENTS[rng.randrange(len(MOMENTS))],
+                "creative_id": f"lt_cr_{i}",
+                "offer_id": f"lt_off_{rng.randrange(4)}",
+                "inventory_id": inv,
+                "inventory_type": "gam" if i % 2 else "owned",
+                "operator_id": op,
+                "inventory_owner_id": op,
+                "rights_type": "licensed" if i % 2 else "owned",
+                "placement_ref": f"lt_slot_{i % 32}",
+            }
+            u["key"] = make_key(u["channel"], u["campaign_id"], u["segment_id"], u["moment"], u["creative_id"], u["offer_id"], u["inventory_id"])
+            units.append(u)
+        out[op] = units
+    return Catalog(units=out)
+
+
+def seed_database(database_url: str, catalog: Catalog, seed: int = 7) -> None:
+    """Loads tenants, inventory_access, policy_state and model_predictions for the catalog via COPY."""
+    rng = random.Random(seed + 1)
+    as_of = datetime.now(timezone.utc).replace(tzinfo=None)
+    with psycopg.connect(database_url) as conn, conn.cursor() as cur:
+        for op, units in catalog.units.items():
+            cur.execute(
+                "INSERT INTO tenants (tenant_id, name, metadata) VALUES (%s, %s, %s) ON CONFLICT (tenant_id) DO NOTHING",
+                (op, op.upper(), json.dumps({"type": "broadcaster"})),
+            )
+            inventory = {(u["inventory_id"], u["inventory_type"], u["rights_type"]) for u in units}
+            for inv, inv_type, rights in sorted(inventory):
+                cur.execute(
+                    """INSERT INTO inventory_access
+                       (operator_id, inventory_id, inventory_owner_id, inventory_type, rights_type, allowed_channels, active)
+                       VALUES (%s, %s, %s, %s, %s, %s, TRUE)
+                       ON CONFLICT (operator_id, inventory_id) DO NOTHING""",
+                    (op, inv, op, inv_type, rights, CHANNELS),
+                )
+
+        with cur.copy("COPY policy_state (key, alpha, beta) FROM STDIN") as copy:
+            for k in catalog.keys():
+                copy.write_row((k, 1.0 + rng.random() * 20.0, 1.0 + rng.random() * 20.0))
+
+        with cur.copy(
+            "COPY model_predictions (key, as_of, model_version, p_action, ltv_uplift, margin_rate, expected_cpa, incrementality) FROM STDIN"
+        ) as copy:
+            for k in catalog.keys():
+                copy.write_row((k, as_of, "loadtest", rng.uniform(0.005, 0.1), rng.uniform(100, 3000), 0.4, rng.uniform(15, 70), 1.0))
+        conn.commit()
+
+
+def optimize_requests(catalog: Catalog, units_per_request: int, seed: int = 7) -> Iterator[dict]:
+    rng = random.Random(seed + 2)
+    ops = list(catalog.units)
+    while True:
+        op = ops[rng.randrange(len(ops))]
+        pool = catalog.units[op]
+        picked = rng.sample(pool, min(units_per_request, len(pool)))
+        yield {
+            "total_budget": 100000.0,
+            "exploration_ratio": 0.08,
+            "operator_id": op,
+            "units": [{k: v for k, v in u.items() if k != "key"} for u in picked],
+            "moment_multipliers": {m: 1.0 + 0.1 * i for i, m in enumerate(MOMENTS)},
+            "moment_spike_active": rng.random() < 0.3,
+        }
+
+
+def outcome_stream(catalog: Catalog, seed: int = 7) -> Iterator[dict]:
+    """Endless fake outcome events shaped like OutcomePayload."""
+    rng = random.Random(seed + 3)
+    units = [u for us in catalog.units.values() for u in us]
+    while True:
+        u = units[rng.randrange(len(units))]
+        spend = rng.uniform(5.0, 400.0)
+        predicted_ev = rng.uniform(0.5, 2.0)
+        yield {
+            "key": u["key"],
+            "spend": spend,
+            "realized_profit": spend * predicted_ev * rng.uniform(0.6, 1.4),
+            "predicted_ev": predicted_ev,
+            "weight": max(1.0, spend / 100.0),
+            "impressions": rng.randrange(100, 5000),
+            "conversions": rng.randrange(0, 20),
+            "operator_id": u["operator_id"],
+            "inventory_owner_id": u["inventory_owner_id"],
+            "inventory_id": u["inventory_id"],
+            "inventory_type": u["inventory_type"],
+            "rights_type": u["rights_type"],
+            "campaign_id": u["campaign_id"],
+            "channel": u["channel"],
+            "placement_ref": u["placement_ref"],
+        }
+
+
+def update_requests(catalog: Catalog, outcomes_per_request: int, seed: int = 7) -> Iterator[dict]:
+    stream = outcome_stream(catalog, seed)
+    while True:
+        yield {"outcomes": [next(stream) for _ in range(outcomes_per_request)]}
+
+
+def db_counters(database_url: str) -> dict:
+    """Cumulative session / transaction / statement counters for the target database."""
+    with psycopg.connect(database_url, autocommit=True) as conn, conn.cursor() as cur:
+        # pg_stat_database.sessions is Postgres 14+; on older servers the connection count is omitted from the report
+        sessions_col = "sessions" if conn.info.server_version >= 140000 else "NULL"
+        cur.execute(
+            f"SELECT {sessions_col}, xact_commit, xact_rollback, numbackends FROM pg_stat_database WHERE datname = current_database()"
+        )
+        sessions, commits, rollbacks, backends = cur.fetchone()
+        statements = {}
+        try:
+            cur.execute(
+                """SELECT s.query, s.calls FROM pg_stat_statements s
+                   JOIN pg_database d ON d.oid = s.dbid WHERE d.datname = current_database()"""
+            )
+            for q, calls in cur.fetchall():
+                statements[q] = statements.get(q, 0) + int(calls)
+        except psycopg.Error:
+            statements = None
+    return {
+        "sessions": None if sessions is None else int(sessions),
+        "xact_commit": int(commits or 0),
+        "xact_rollback": int(rollbacks or 0),
+        "numbackends": int(backends or 0),
+        "statements": statements,
+    }
+
+
+def db_delta(before: dict, after: dict, top: int = 10) -> dict:
+    # Postgres flushes these counters lazily, and the harness's own counter/sampler sessions are included.
+    out = {
+        "transactions": (after["xact_commit"] - before["xact_commit"]) + (after["xact_rollback"] - before["xact_rollback"]),
+    }
+    if before["sessions"] is not None and after["sessions"] is not None:
+        out["connections_opened"] = after["sessions"] - before["sessions"]
+    if before["statements"] is not None and after["statements"] is not None:
+        calls = {q: c - before["statements"].get(q, 0) for q, c in after["statements"].items()}
+        calls = {q: c for q, c in calls.items() if c > 0 and "pg_stat" not in q}
+        out["queries"] = sum(calls.values())
+        out["top_queries"] = [
+            {"calls": c, "query": " ".join(q.split())[:160]}
+            for q, c in sorted(calls.items(), key=lambda kv: kv[1], reverse=True)[:top]
+        ]
+    return out
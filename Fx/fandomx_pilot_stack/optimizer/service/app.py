@@ -1,15 +1,23 @@
-from datetime import datetime, timezone
-from fastapi import FastAPI, Header, HTTPException
-from fastapi.responses import PlainTextResponse
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import BackgroundTasks, FastAPI, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import threading
+import time
 import uuid
 import os
 
-from fx_engine import DecisionUnit, UnitSignals, Constraints, allocate_budget
-from keys import make_key
+from fx_engine import DecisionUnit, UnitSignals, Constraints, AllocationResult, allocate_budget
+from keys import make_key, unit_identity
 from bandit import ThompsonBandit
+from moment_plans import MOMENT_TYPES, MomentPlan, MomentPlanStore
+from metrics import Timings, count_units, render_prometheus, start_timings
+from profiling import Profiler
+from revenue_rules import RevenueRuleIndex
+from settlement_export import FORMATS as EXPORT_FORMATS, encode as encode_settlement
 from db import (
     load_policy_state,
     upsert_policy_state,
@@ -33,15 +41,32 @@ from db import (
     get_inventory_access_map,
     create_revenue_rule,
     list_revenue_rules,
+    load_revenue_rule_snapshot,
+    revenue_rules_version,
+    run_allocation_rows,
     run_shadow_settlement,
+    finalize_shadow_settlement,
+    fold_settlement_deltas,
+    settlement_day_status,
     settlement_summary,
+    settlement_ledger_version,
+    iter_settlement_rows,
+    SETTLEMENT_COLUMNS,
     list_runs,
     allocations_for_run,
+    diff_runs,
     list_policy_state,
+    ensure_log_partitions,
 )
 
 APP_VERSION = "1.2.0-rights-settlement"
 ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "").strip()
+MOMENT_PLAN_REFRESH_SEC = float(os.getenv("MOMENT_PLAN_REFRESH_SEC", "5"))
+MOMENT_PLAN_MAX_AGE_SEC = float(os.getenv("MOMENT_PLAN_MAX_AGE_SEC", "60"))
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+REVENUE_RULES_REFRESH_SEC = float(os.getenv("REVENUE_RULES_REFRESH_SEC", "30"))
+# how often /update's queued settlement deltas are accrued into the intraday ledger
+SETTLEMENT_FOLD_SEC = float(os.getenv("SETTLEMENT_FOLD_SEC", "2"))
 
 app = FastAPI(title="FandomX Fx Optimizer", version=APP_VERSION)
 app.mount("/ui", StaticFiles(directory=os.path.join(os.path.dirname(__file__), "static"), html=True), name="ui")
@@ -52,6 +77,19 @@ def require_admin(x_admin_token: Optional[str]):
         raise HTTPException(status_code=401, detail="Invalid admin token")
 
 
+# admin list endpoints return at most this many items per request; clients follow next_cursor for the rest
+MAX_PAGE_LIMIT = 500
+
+
+def _paged(list_fn, limit: int, **kwargs) -> dict:
+    """One keyset page from a db list helper as {"items", "next_cursor"}; a bad sort or cursor is a 400."""
+    try:
+        items, next_cursor = list_fn(limit=max(1, min(limit, MAX_PAGE_LIMIT)), **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
 class DecisionUnitPayload(BaseModel):
     channel: str
     campaign_id: str
@@ -98,6 +136,27 @@ class OptimizeRequest(BaseModel):
     moment_spike_active: bool = False
 
 
+class MomentPlanTemplatePayload(OptimizeRequest):
+    moment_types: List[str] = list(MOMENT_TYPES)
+
+
+class MomentDetectedRequest(BaseModel):
+    moment_type: str
+    operator_id: Optional[str] = None
+    previous_allocations: Optional[Dict[str, float]] = None
+    moment_spike_active: bool = True
+
+
+class ProfilingRequest(BaseModel):
+    requests: Optional[int] = None
+    seconds: Optional[float] = None
+    endpoints: List[str] = ["optimize", "update"]
+    interval_ms: float = 5.0
+    top_n: int = 50
+    # run tracked requests one at a time so their allocation diffs don't overlap
+    serialize: bool = False
+
+
 class OutcomePayload(BaseModel):
     run_id: Optional[str] = None
     key: str
@@ -225,6 +284,16 @@ def _passes_rights_gate(req_operator_id: str, unit: DecisionUnitPayload, access_
     return True
 
 
+@app.on_event("startup")
+def startup_log_partitions():
+    # jobs/log_partitions.py keeps the window rolling; this only covers a fresh database, and a failure here is not
+    # fatal because rows without a day partition land in the DEFAULT partition
+    try:
+        ensure_log_partitions(days_back=0, days_ahead=1)
+    except Exception as e:
+        print("log partition setup failed:", e)
+
+
 @app.on_event("startup")
 def startup_seed():
     create_tenant("club_demo", "CLUB_A", {"type": "club", "sport": "football", "geo": "AU"})
@@ -276,52 +345,48 @@ def health():
     return {"ok": True, "version": APP_VERSION}
 
 
-@app.post("/optimize")
-def optimize(req: OptimizeRequest):
-    now_utc = datetime.now(timezone.utc)
-    req_operator_id = (req.operator_id or "").strip()
+def _unit_key(d) -> str:
+    return make_key(d.channel, d.campaign_id, d.segment_id, d.moment, d.creative_id, d.offer_id, d.inventory_id)
+
 
-    access_map = {}
-    inventory_ids = [u.inventory_id for u in req.units if u.inventory_id]
-    if req_operator_id and inventory_ids:
-        access_map = get_inventory_access_map(req_operator_id, list(set(inventory_ids)))
+def _solve(req: OptimizeRequest, now_utc: datetime, timings: Timings) -> Tuple[Optional[AllocationResult], int]:
+    """Rights gating + signal resolution + allocate_budget. Returns (result or None if nothing eligible, skipped)."""
+    req_operator_id = (req.operator_id or "").strip()
 
     units: List[DecisionUnit] = []
     keys: List[str] = []
     skipped = 0
-    for u in req.units:
-        if req_operator_id:
-            if not _passes_rights_gate(req_operator_id, u, access_map, now_utc):
-                skipped += 1
-                continue
-        du = DecisionUnit(**u.dict())
-        units.append(du)
-        keys.append(make_key(u.channel, u.campaign_id, u.segment_id, u.moment, u.creative_id, u.offer_id, u.inventory_id))
+    with timings.span("rights_gating"):
+        access_map = {}
+        inventory_ids = [u.inventory_id for u in req.units if u.inventory_id]
+        if req_operator_id and inventory_ids:
+            access_map = get_inventory_access_map(req_operator_id, list(set(inventory_ids)))
+
+        for u in req.units:
+            if req_operator_id:
+                if not _passes_rights_gate(req_operator_id, u, access_map, now_utc):
+                    skipped += 1
+                    continue
+            du = DecisionUnit(**u.dict())
+            units.append(du)
+            keys.append(_unit_key(u))
 
     if not units:
-        return {
-            "run_id": str(uuid.uuid4()),
-            "allocations": {},
-            "channel_spend": {},
-            "campaign_spend": {},
-            "debug": {"scores": {}, "base_ev": {}, "moment_mult": {}},
-            "timestamp": int(now_utc.timestamp()),
-            "skipped_by_eligibility": skipped,
-        }
+        return None, skipped
 
-    bandit_state_in = load_policy_state(keys)
+    with timings.span("load_policy_state"):
+        bandit_state_in = load_policy_state(keys)
 
     signals: Dict[DecisionUnit, UnitSignals] = {}
     if req.signals:
         for u in units:
-            k = make_key(u.channel, u.campaign_id, u.segment_id, u.moment, u.creative_id, u.offer_id, u.inventory_id)
-            sig = req.signals[k]
+            sig = req.signals[_unit_key(u)]
             signals[u] = UnitSignals(**sig.dict())
     else:
-        preds = latest_model_predictions(keys)
+        with timings.span("latest_model_predictions"):
+            preds = latest_model_predictions(keys)
         for u in units:
-            k = make_key(u.channel, u.campaign_id, u.segment_id, u.moment, u.creative_id, u.offer_id, u.inventory_id)
-            p = preds.get(k)
+            p = preds.get(_unit_key(u))
             if not p:
                 signals[u] = UnitSignals(
                     p_action=0.01,
@@ -344,10 +409,7 @@ def optimize(req: OptimizeRequest):
 
     prev = {}
     if req.previous_allocations:
-        key_to_du = {
-            make_key(d.channel, d.campaign_id, d.segment_id, d.moment, d.creative_id, d.offer_id, d.inventory_id): d
-            for d in units
-        }
+        key_to_du = {_unit_key(d): d for d in units}
         for k, amt in req.previous_allocations.items():
             du = key_to_du.get(k)
             if du:
@@ -372,17 +434,17 @@ def optimize(req: OptimizeRequest):
         previous_allocations=prev,
         bandit_state_in=bandit_state_in,
         seed=7,
+        on_phase=timings.phase_marker("solve."),
     )
+    return result, skipped
 
-    upsert_policy_state(result.bandit_state)
 
-    run_id = uuid.uuid4()
+def _allocation_records(result: AllocationResult) -> List[dict]:
     records = []
     for du, amt in result.allocations.items():
-        k = make_key(du.channel, du.campaign_id, du.segment_id, du.moment, du.creative_id, du.offer_id, du.inventory_id)
         records.append(
             {
-                "key": k,
+                "key": _unit_key(du),
                 "operator_id": du.operator_id,
                 "inventory_owner_id": du.inventory_owner_id,
                 "inventory_id": du.inventory_id,
@@ -397,41 +459,226 @@ def optimize(req: OptimizeRequest):
                 "moment_multiplier": float(result.moment_mult_map[du]),
             }
         )
-    log_allocations(run_id, records)
+    return records
+
 
-    allocations_out = {
-        make_key(d.channel, d.campaign_id, d.segment_id, d.moment, d.creative_id, d.offer_id, d.inventory_id): float(a)
-        for d, a in result.allocations.items()
+def _build_moment_plan(template: MomentPlanTemplatePayload, moment_type: str) -> Optional[MomentPlan]:
+    """Solves the operator's template as if `moment_type` fired now, with no previous allocation to clip against.
+
+    The template's signals are keyed by the moment it was written for, so they are re-keyed to `moment_type` by
+    unit_identity()."""
+    units = [u.copy(update={"moment": moment_type}) for u in template.units]
+    signals = None
+    if template.signals:
+        by_unit = {unit_identity(k): v for k, v in template.signals.items()}
+        signals = {}
+        for u in units:
+            key = _unit_key(u)
+            sig = by_unit.get(unit_identity(key))
+            if sig is not None:
+                signals[key] = sig
+    req = template.copy(update={"units": units, "signals": signals, "previous_allocations": {}, "moment_spike_active": True})
+    timings = start_timings("moment_plan")
+    result, skipped = _solve(req, datetime.now(timezone.utc), timings)
+    timings.finish()
+    if result is None:
+        return None
+
+    records = _allocation_records(result)
+    return MomentPlan(
+        operator_id=(template.operator_id or "").strip(),
+        moment_type=moment_type,
+        total_budget=float(template.total_budget),
+        keys=[r["key"] for r in records],
+        channels=[r["channel"] for r in records],
+        campaigns=[r["campaign_id"] for r in records],
+        amounts=[r["allocated_budget"] for r in records],
+        channel_spend=dict(result.channel_spend),
+        campaign_spend=dict(result.campaign_spend),
+        debug={
+            "scores": {r["key"]: r["score"] for r in records},
+            "base_ev": {r["key"]: r["base_ev"] for r in records},
+            "moment_mult": {r["key"]: r["moment_multiplier"] for r in records},
+        },
+        records=records,
+        skipped_by_eligibility=skipped,
+    )
+
+
+def _log_plan_allocations(run_id, plan: MomentPlan, allocations: Dict[str, float], lookup_ms: float):
+    run = {
+        "source": "moment",
+        "operator_id": plan.operator_id or None,
+        "moment_type": plan.moment_type,
+        "total_budget": plan.total_budget,
+        "allocated": float(sum(allocations.values())),
+        "units": len(plan.keys),
+        "allocated_units": sum(1 for a in allocations.values() if a > 0),
+        "skipped_units": plan.skipped_by_eligibility,
+        "latency_ms": lookup_ms,
     }
+    log_allocations(run_id, [{**r, "allocated_budget": float(allocations[r["key"]])} for r in plan.records], run=run)
 
-    return {
+
+moment_plans = MomentPlanStore(_build_moment_plan, max_age_sec=MOMENT_PLAN_MAX_AGE_SEC)
+revenue_rule_index = RevenueRuleIndex(load_revenue_rule_snapshot, revenue_rules_version, refresh_sec=REVENUE_RULES_REFRESH_SEC)
+profiler = Profiler()
+
+
+@app.on_event("startup")
+def startup_moment_plans():
+    moment_plans.start(interval_sec=MOMENT_PLAN_REFRESH_SEC)
+
+
+@app.on_event("startup")
+def startup_settlement_fold():
+    def loop():
+        while True:
+            try:
+                fold_settlement_deltas()
+            except Exception as e:  # deltas stay queued for the next pass
+                print("settlement fold failed:", e)
+            time.sleep(SETTLEMENT_FOLD_SEC)
+
+    threading.Thread(target=loop, name="settlement-folder", daemon=True).start()
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(content=render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/optimize")
+def optimize(req: OptimizeRequest, timings: bool = False):
+    """Pass ?timings=true to force-sample this request and get per-stage ms back in `timings`."""
+    with profiler.track("optimize"):
+        return _optimize(req, timings)
+
+
+def _optimize(req: OptimizeRequest, timings: bool):
+    t = start_timings("optimize", force=timings)
+    t_start = time.perf_counter()
+    now_utc = datetime.now(timezone.utc)
+    result, skipped = _solve(req, now_utc, t)
+    solve_ms = (time.perf_counter() - t_start) * 1000.0
+    count_units(len(req.units), skipped, result.eligible_count if result else 0)
+
+    if result is None:
+        out = {
+            "run_id": str(uuid.uuid4()),
+            "allocations": {},
+            "channel_spend": {},
+            "campaign_spend": {},
+            "debug": {"scores": {}, "base_ev": {}, "moment_mult": {}},
+            "timestamp": int(now_utc.timestamp()),
+            "skipped_by_eligibility": skipped,
+        }
+        stage_ms = t.finish()
+        if timings:
+            out["timings"] = stage_ms
+        return out
+
+    with t.span("upsert_policy_state"):
+        upsert_policy_state(result.bandit_state)
+
+    run_id = uuid.uuid4()
+    run = {
+        "source": "optimize",
+        "operator_id": (req.operator_id or "").strip() or None,
+        "total_budget": float(req.total_budget),
+        "allocated": float(sum(result.allocations.values())),
+        "units": len(req.units),
+        "eligible_units": result.eligible_count,
+        "allocated_units": sum(1 for a in result.allocations.values() if a > 0),
+        "skipped_units": skipped,
+        "solve_ms": solve_ms,
+        "latency_ms": (time.perf_counter() - t_start) * 1000.0,
+    }
+    with t.span("log_allocations"):
+        log_allocations(run_id, _allocation_records(result), run=run)
+
+    allocations_out = {_unit_key(d): float(a) for d, a in result.allocations.items()}
+    moment_plans.note_served((req.operator_id or "").strip(), allocations_out)
+
+    out = {
         "run_id": str(run_id),
         "allocations": allocations_out,
         "channel_spend": result.channel_spend,
         "campaign_spend": result.campaign_spend,
         "debug": {
-            "scores": {
-                make_key(d.channel, d.campaign_id, d.segment_id, d.moment, d.creative_id, d.offer_id, d.inventory_id): float(s)
-                for d, s in result.score_map.items()
-            },
-            "base_ev": {
-                make_key(d.channel, d.campaign_id, d.segment_id, d.moment, d.creative_id, d.offer_id, d.inventory_id): float(s)
-                for d, s in result.base_ev_map.items()
-            },
-            "moment_mult": {
-                make_key(d.channel, d.campaign_id, d.segment_id, d.moment, d.creative_id, d.offer_id, d.inventory_id): float(s)
-                for d, s in result.moment_mult_map.items()
-            },
+            "scores": {_unit_key(d): float(s) for d, s in result.score_map.items()},
+            "base_ev": {_unit_key(d): float(s) for d, s in result.base_ev_map.items()},
+            "moment_mult": {_unit_key(d): float(s) for d, s in result.moment_mult_map.items()},
         },
         "timestamp": result.created_at_unix,
         "skipped_by_eligibility": skipped,
     }
+    stage_ms = t.finish()
+    if timings:
+        out["timings"] = stage_ms
+    return out
+
+
+@app.post("/moment-plans")
+def register_moment_plans(req: MomentPlanTemplatePayload):
+    operator_id = (req.operator_id or "").strip()
+    moment_plans.register(operator_id, req, req.moment_types)
+    moment_plans.mark_stale(operator_id)
+    return {"operator_id": operator_id, "items": [p for p in moment_plans.summary() if p["operator_id"] == operator_id]}
+
+
+@app.get("/moment-plans")
+def get_moment_plans():
+    return {"items": moment_plans.summary()}
+
+
+@app.post("/moments/detected")
+def moment_detected(req: MomentDetectedRequest, background_tasks: BackgroundTasks):
+    t = start_timings("moment")
+    t0 = time.perf_counter()
+    operator_id = (req.operator_id or "").strip()
+    plan = moment_plans.get(operator_id, req.moment_type)
+    if plan is None:
+        raise HTTPException(status_code=404, detail="No moment plan for operator/moment type; call /optimize")
+
+    served = moment_plans.serve(plan, req.previous_allocations, 0.55 if req.moment_spike_active else 0.35)
+    lookup_ms = (time.perf_counter() - t0) * 1000.0
+    if t.sampled:
+        t.record("plan_lookup", lookup_ms / 1000.0)
+    t.finish()
+
+    run_id = uuid.uuid4()
+    background_tasks.add_task(_log_plan_allocations, run_id, plan, served["allocations"], lookup_ms)
+
+    return {
+        "run_id": str(run_id),
+        "allocations": served["allocations"],
+        "channel_spend": served["channel_spend"],
+        "campaign_spend": served["campaign_spend"],
+        "debug": plan.debug,
+        "timestamp": int(time.time()),
+        "skipped_by_eligibility": plan.skipped_by_eligibility,
+        "plan": {
+            "moment_type": plan.moment_type,
+            "age_sec": round(time.time() - plan.built_at_unix, 3),
+            "stale": moment_plans.is_stale(operator_id),
+            "clipped": served["clipped"],
+            "lookup_ms": round(lookup_ms, 4),
+        },
+    }
 
 
 @app.post("/update")
-def update(req: UpdateRequest):
+def update(req: UpdateRequest, timings: bool = False):
+    with profiler.track("update"):
+        return _update(req, timings)
+
+
+def _update(req: UpdateRequest, timings: bool):
+    t = start_timings("update", force=timings)
     keys = [o.key for o in req.outcomes if o.key]
-    state = load_policy_state(keys)
+    with t.span("load_policy_state"):
+        state = load_policy_state(keys)
 
     bandit = ThompsonBandit(seed=7)
     bandit.import_state(state)
@@ -463,22 +710,38 @@ def update(req: UpdateRequest):
             }
         )
 
-    upsert_policy_state(bandit.export_state())
-    log_outcomes(None, rows)
+    with t.span("upsert_policy_state"):
+        upsert_policy_state(bandit.export_state())
+    with t.span("log_outcomes"):
+        log_outcomes(None, rows)
+    moment_plans.mark_stale()
 
-    return {"updated": len(rows)}
+    out = {"updated": len(rows)}
+    stage_ms = t.finish()
+    if timings:
+        out["timings"] = stage_ms
+    return out
 
 
 @app.get("/admin/tenants")
-def admin_list_tenants(x_admin_token: Optional[str] = Header(default=None)):
+def admin_list_tenants(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "-created_at",
+    tenant_id: Optional[str] = None,
+    tenant_type: Optional[str] = Query(default=None, alias="type"),
+    x_admin_token: Optional[str] = Header(default=None),
+):
     require_admin(x_admin_token)
-    return {"items": list_tenants()}
+    return _paged(list_tenants, limit, cursor=cursor, sort=sort, tenant_id=tenant_id, tenant_type=tenant_type)
 
 
 @app.post("/admin/tenants")
 def admin_create_tenant(payload: TenantPayload, x_admin_token: Optional[str] = Header(default=None)):
     require_admin(x_admin_token)
-    return create_tenant(payload.tenant_id, payload.name, payload.metadata)
+    out = create_tenant(payload.tenant_id, payload.name, payload.metadata)
+    revenue_rule_index.invalidate()
+    return out
 
 
 @app.post("/admin/campaigns")
@@ -488,9 +751,17 @@ def admin_create_campaign(payload: CampaignPayload, x_admin_token: Optional[str]
 
 
 @app.get("/admin/campaigns")
-def admin_list_campaigns(tenant_id: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
+def admin_list_campaigns(
+    tenant_id: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "-created_at",
+    channel: Optional[str] = None,
+    status: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(default=None),
+):
     require_admin(x_admin_token)
-    return {"items": list_campaigns(tenant_id=tenant_id)}
+    return _paged(list_campaigns, limit, tenant_id=tenant_id, cursor=cursor, sort=sort, channel=channel, status=status)
 
 
 @app.post("/admin/segments")
@@ -500,9 +771,15 @@ def admin_create_segment(payload: SegmentPayload, x_admin_token: Optional[str] =
 
 
 @app.get("/admin/segments")
-def admin_list_segments(tenant_id: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
+def admin_list_segments(
+    tenant_id: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "-created_at",
+    x_admin_token: Optional[str] = Header(default=None),
+):
     require_admin(x_admin_token)
-    return {"items": list_segments(tenant_id=tenant_id)}
+    return _paged(list_segments, limit, tenant_id=tenant_id, cursor=cursor, sort=sort)
 
 
 @app.post("/admin/creatives")
@@ -512,9 +789,15 @@ def admin_create_creative(payload: CreativePayload, x_admin_token: Optional[str]
 
 
 @app.get("/admin/creatives")
-def admin_list_creatives(tenant_id: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
+def admin_list_creatives(
+    tenant_id: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "-created_at",
+    x_admin_token: Optional[str] = Header(default=None),
+):
     require_admin(x_admin_token)
-    return {"items": list_creatives(tenant_id=tenant_id)}
+    return _paged(list_creatives, limit, tenant_id=tenant_id, cursor=cursor, sort=sort)
 
 
 @app.post("/admin/offers")
@@ -524,9 +807,15 @@ def admin_create_offer(payload: OfferPayload, x_admin_token: Optional[str] = Hea
 
 
 @app.get("/admin/offers")
-def admin_list_offers(tenant_id: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
+def admin_list_offers(
+    tenant_id: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "-created_at",
+    x_admin_token: Optional[str] = Header(default=None),
+):
     require_admin(x_admin_token)
-    return {"items": list_offers(tenant_id=tenant_id)}
+    return _paged(list_offers, limit, tenant_id=tenant_id, cursor=cursor, sort=sort)
 
 
 @app.post("/admin/integrations")
@@ -536,9 +825,15 @@ def admin_upsert_integration(payload: IntegrationPayload, x_admin_token: Optiona
 
 
 @app.get("/admin/integrations")
-def admin_list_integrations(tenant_id: str, x_admin_token: Optional[str] = Header(default=None)):
+def admin_list_integrations(
+    tenant_id: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "kind",
+    x_admin_token: Optional[str] = Header(default=None),
+):
     require_admin(x_admin_token)
-    return {"items": list_integrations(tenant_id)}
+    return _paged(list_integrations, limit, tenant_id=tenant_id, cursor=cursor, sort=sort)
 
 
 @app.post("/admin/inventory-access")
@@ -559,15 +854,27 @@ def admin_upsert_inventory_access(payload: InventoryAccessPayload, x_admin_token
 
 
 @app.get("/admin/inventory-access")
-def admin_list_inventory_access(operator_id: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
+def admin_list_inventory_access(
+    operator_id: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "-updated_at",
+    inventory_owner_id: Optional[str] = None,
+    channel: Optional[str] = None,
+    active: Optional[bool] = None,
+    x_admin_token: Optional[str] = Header(default=None),
+):
     require_admin(x_admin_token)
-    return {"items": list_inventory_access(operator_id)}
+    return _paged(
+        list_inventory_access, limit, operator_id=operator_id, cursor=cursor, sort=sort,
+        inventory_owner_id=inventory_owner_id, channel=channel, active=active,
+    )
 
 
 @app.post("/admin/revenue-rules")
 def admin_create_revenue_rule(payload: RevenueRulePayload, x_admin_token: Optional[str] = Header(default=None)):
     require_admin(x_admin_token)
-    return create_revenue_rule(
+    out = create_revenue_rule(
         payload.rule_id,
         payload.operator_type,
         payload.inventory_type,
@@ -578,56 +885,264 @@ def admin_create_revenue_rule(payload: RevenueRulePayload, x_admin_token: Option
         payload.effective_to,
         payload.metadata,
     )
+    revenue_rule_index.invalidate()
+    return out
 
 
 @app.get("/admin/revenue-rules")
-def admin_list_revenue_rules(x_admin_token: Optional[str] = Header(default=None)):
+def admin_list_revenue_rules(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "-created_at",
+    operator_type: Optional[str] = None,
+    inventory_type: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(default=None),
+):
     require_admin(x_admin_token)
-    return {"items": list_revenue_rules()}
+    return _paged(list_revenue_rules, limit, cursor=cursor, sort=sort, operator_type=operator_type, inventory_type=inventory_type)
+
+
+def _settlement_day(settlement_date: Optional[str], default: date) -> date:
+    """The requested settlement day, or `default` when none was given; anything but YYYY-MM-DD is a 400."""
+    if not settlement_date:
+        return default
+    try:
+        return date.fromisoformat(settlement_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="settlement_date must be YYYY-MM-DD")
 
 
 @app.post("/admin/settlement/run")
 def admin_run_settlement(settlement_date: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
     require_admin(x_admin_token)
-    date_to_run = settlement_date or datetime.now(timezone.utc).date().isoformat()
+    date_to_run = _settlement_day(settlement_date, datetime.now(timezone.utc).date()).isoformat()
     run_shadow_settlement(date_to_run)
     return {"status": "ok", "settlement_date": date_to_run}
 
 
-@app.get("/admin/settlement/summary")
-def admin_settlement_summary(settlement_date: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
+@app.post("/admin/settlement/finalize")
+def admin_finalize_settlement(settlement_date: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
     require_admin(x_admin_token)
-    date_to_run = settlement_date or datetime.now(timezone.utc).date().isoformat()
-    return {"items": settlement_summary(date_to_run)}
+    date_to_run = _settlement_day(settlement_date, datetime.now(timezone.utc).date() - timedelta(days=1)).isoformat()
+    try:
+        return finalize_shadow_settlement(date_to_run)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 
-@app.get("/admin/settlement/export", response_class=PlainTextResponse)
-def admin_settlement_export_csv(settlement_date: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
+@app.get("/admin/settlement/projection/{run_id}")
+def admin_settlement_projection(run_id: str, settlement_date: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
+    """Operator / owner / platform split of an /optimize run's allocations under the rules in force on settlement_date
+    (default today), before any of it is spent."""
     require_admin(x_admin_token)
-    date_to_run = settlement_date or datetime.now(timezone.utc).date().isoformat()
-    rows = settlement_summary(date_to_run)
-    header = "settlement_date,operator_id,inventory_owner_id,inventory_id,channel,gross_spend,impressions,conversions,operator_share,owner_share,platform_share,rule_id"
-    lines = [header]
-    for r in rows:
-        lines.append(
-            f"{r['settlement_date']},{r['operator_id']},{r['inventory_owner_id']},{r['inventory_id']},{r['channel']},{r['gross_spend']},{r['impressions']},{r['conversions']},{r['operator_share']},{r['owner_share']},{r['platform_share']},{r['rule_id'] or ''}"
+    try:
+        uuid.UUID(run_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Unknown run_id")
+    day = _settlement_day(settlement_date, datetime.now(timezone.utc).date())
+    rows = run_allocation_rows(run_id)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Unknown run_id")
+
+    t0 = time.perf_counter()
+    priced = revenue_rule_index.price([(r[2], r[3], r[5], r[6]) for r in rows], day)
+    pricing_ms = (time.perf_counter() - t0) * 1000.0
+
+    items = []
+    totals = {"gross_spend": 0.0, "operator_share": 0.0, "owner_share": 0.0, "platform_share": 0.0}
+    for (key, channel, operator_id, owner_id, inventory_id, inventory_type, budget), (op, owner, platform, rule_id) in zip(rows, priced):
+        items.append(
+            {
+                "key": key,
+                "channel": channel,
+                "operator_id": operator_id,
+                "inventory_owner_id": owner_id,
+                "inventory_id": inventory_id,
+                "inventory_type": inventory_type,
+                "allocated_budget": float(budget),
+                "operator_share": op,
+                "owner_share": owner,
+                "platform_share": platform,
+                "rule_id": rule_id,
+            }
         )
-    return "\n".join(lines)
+        totals["gross_spend"] += float(budget)
+        totals["operator_share"] += op
+        totals["owner_share"] += owner
+        totals["platform_share"] += platform
+    return {
+        "run_id": run_id,
+        "settlement_date": day.isoformat(),
+        "rules_version": revenue_rule_index.version,
+        "totals": totals,
+        "items": items,
+        "pricing_ms": round(pricing_ms, 3),
+    }
+
+
+@app.get("/admin/settlement/summary")
+def admin_settlement_summary(settlement_date: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
+    require_admin(x_admin_token)
+    date_to_run = _settlement_day(settlement_date, datetime.now(timezone.utc).date()).isoformat()
+    return {"items": settlement_summary(date_to_run), **settlement_day_status(date_to_run)}
+
+
+@app.get("/admin/settlement/export")
+def admin_settlement_export(
+    settlement_date: Optional[str] = None,
+    format: str = "csv",
+    x_admin_token: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+    if_modified_since: Optional[str] = Header(default=None),
+):
+    require_admin(x_admin_token)
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(EXPORT_FORMATS)}")
+    date_to_run = _settlement_day(settlement_date, datetime.now(timezone.utc).date()).isoformat()
+    media_type, ext = EXPORT_FORMATS[format]
+
+    # the version is read before the rows, so a write in between only makes the next request miss the cache
+    count, last = settlement_ledger_version(date_to_run)
+    # ledger timestamps are UTC; HTTP dates have one-second resolution
+    last_utc = last.replace(tzinfo=timezone.utc) if last else None
+    stamp = int(last_utc.timestamp() * 1e6) if last_utc else 0
+    headers = {"ETag": f'"{date_to_run}-{count}-{stamp}-{format}"', "Cache-Control": "private, no-cache"}
+    if last_utc:
+        last_utc = last_utc.replace(microsecond=0)
+        headers["Last-Modified"] = format_datetime(last_utc, usegmt=True)
+
+    if if_none_match is not None:
+        not_modified = headers["ETag"] in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*"
+    else:
+        try:
+            since = parsedate_to_datetime(if_modified_since) if if_modified_since else None
+        except (TypeError, ValueError):
+            since = None
+        not_modified = since is not None and last_utc is not None and last_utc <= since
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = f'attachment; filename="settlement_{date_to_run}.{ext}"'
+    return StreamingResponse(
+        encode_settlement(format, SETTLEMENT_COLUMNS, iter_settlement_rows(date_to_run, EXPORT_CHUNK_ROWS)),
+        media_type=media_type,
+        headers=headers,
+    )
 
 
 @app.get("/admin/runs")
-def admin_runs(limit: int = 10, x_admin_token: Optional[str] = Header(default=None)):
+def admin_runs(
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    operator_id: Optional[str] = None,
+    sort: str = "-created_at",
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """Newest first by default; pass the returned next_cursor to get the following page."""
+    require_admin(x_admin_token)
+    return _paged(list_runs, limit, cursor=cursor, operator_id=operator_id, sort=sort)
+
+
+@app.get("/admin/runs/{run_id}/diff")
+def admin_run_diff(run_id: str, base: str, top: int = 20, x_admin_token: Optional[str] = Header(default=None)):
+    """What changed from run `base` to `run_id`: top movers, per-channel and per-campaign deltas, reallocation ratio."""
     require_admin(x_admin_token)
-    return {"items": list_runs(limit=limit)}
+    try:
+        uuid.UUID(run_id)
+        uuid.UUID(base)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Unknown run_id")
+    out = diff_runs(base, run_id, top=max(1, min(top, MAX_PAGE_LIMIT)))
+    if out is None:
+        raise HTTPException(status_code=404, detail="Unknown run_id")
+    return out
 
 
 @app.get("/admin/allocations/{run_id}")
-def admin_allocations(run_id: str, limit: int = 200, x_admin_token: Optional[str] = Header(default=None)):
+def admin_allocations(
+    run_id: str,
+    limit: int = 200,
+    cursor: Optional[str] = None,
+    sort: str = "-allocated_budget",
+    channel: Optional[str] = None,
+    campaign_id: Optional[str] = None,
+    operator_id: Optional[str] = None,
+    key_prefix: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(default=None),
+):
     require_admin(x_admin_token)
-    return {"items": allocations_for_run(run_id, limit=limit)}
+    try:
+        uuid.UUID(run_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Unknown run_id")
+    return _paged(
+        allocations_for_run, limit, run_id=run_id, cursor=cursor, sort=sort,
+        channel=channel, campaign_id=campaign_id, operator_id=operator_id, key_prefix=key_prefix,
+    )
 
 
 @app.get("/admin/policy_state")
-def admin_policy_state(limit: int = 25, x_admin_token: Optional[str] = Header(default=None)):
+def admin_policy_state(
+    limit: int = 25,
+    cursor: Optional[str] = None,
+    sort: str = "-updated_at",
+    key_prefix: Optional[str] = None,
+    channel: Optional[str] = None,
+    campaign_id: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    require_admin(x_admin_token)
+    return _paged(
+        list_policy_state, limit, cursor=cursor, sort=sort, key_prefix=key_prefix, channel=channel, campaign_id=campaign_id,
+    )
+
+
+@app.post("/admin/profiling")
+def admin_start_profiling(payload: ProfilingRequest, x_admin_token: Optional[str] = Header(default=None)):
+    require_admin(x_admin_token)
+    max_requests = payload.requests
+    if max_requests is None and not payload.seconds:
+        max_requests = 20
+    try:
+        session = profiler.arm(
+            payload.endpoints, max_requests, payload.seconds, payload.interval_ms, payload.top_n, payload.serialize
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return session.summary()
+
+
+@app.delete("/admin/profiling")
+def admin_stop_profiling(x_admin_token: Optional[str] = Header(default=None)):
+    require_admin(x_admin_token)
+    session = profiler.stop()
+    return session.summary() if session else {"active": False}
+
+
+@app.get("/admin/profiling")
+def admin_list_profiles(x_admin_token: Optional[str] = Header(default=None)):
+    require_admin(x_admin_token)
+    return {"active": profiler.active, "items": [s.summary() for s in profiler.history]}
+
+
+def _profile_or_404(profile_id: str):
+    session = profiler.get(profile_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown profile_id")
+    return session
+
+
+@app.get("/admin/profiling/{profile_id}/collapsed", response_class=PlainTextResponse)
+def admin_profile_collapsed(profile_id: str, x_admin_token: Optional[str] = Header(default=None)):
+    require_admin(x_admin_token)
+    return PlainTextResponse(
+        _profile_or_404(profile_id).collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="fx_profile_{profile_id}.collapsed"'},
+    )
+
+
+@app.get("/admin/profiling/{profile_id}/allocations")
+def admin_profile_allocations(profile_id: str, x_admin_token: Optional[str] = Header(default=None)):
     require_admin(x_admin_token)
-    return {"items": list_policy_state(limit=limit)}
+    session = _profile_or_404(profile_id)
+    return {**session.summary(), "items": session.top_allocations}
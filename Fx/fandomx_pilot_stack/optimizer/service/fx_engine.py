@@ -1,6 +1,6 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import time
 import random
 
@@ -64,6 +64,7 @@ class AllocationResult:
     moment_mult_map: Dict[DecisionUnit, float]
     bandit_state: Dict[str, tuple]
     created_at_unix: int
+    eligible_count: int = 0
 
 def clamp(x: float, lo: float, hi: float) -> float:
     return max(lo, min(hi, x))
@@ -85,6 +86,21 @@ def unit_base_ev_per_rupee(s: UnitSignals, moment_multiplier: float, fatigue_str
 
     return base_ev * penalty * max(0.0, moment_multiplier)
 
+def stability_clip(alloc: Dict, previous_allocations: Dict, total: float, max_realloc_ratio: float) -> bool:
+    """Scales alloc (in place) toward previous_allocations so the per-tick move stays within the cap.
+
+    Works on any hashable key (DecisionUnit or decision key string). Returns True if alloc was changed.
+    """
+    max_change = total * clamp(max_realloc_ratio, 0.0, 1.0)
+    abs_change = sum(abs(amt - previous_allocations.get(k, 0.0)) for k, amt in alloc.items())
+    if abs_change <= max_change or abs_change <= 1e-9:
+        return False
+    ratio = max_change / abs_change
+    for k, amt in alloc.items():
+        prev = previous_allocations.get(k, 0.0)
+        alloc[k] = prev + (amt - prev) * ratio
+    return True
+
 def allocate_budget(
     units: List[DecisionUnit],
     signals: Dict[DecisionUnit, UnitSignals],
@@ -93,9 +109,15 @@ def allocate_budget(
     previous_allocations: Optional[Dict[DecisionUnit, float]] = None,
     bandit_state_in: Optional[Dict[str, tuple]] = None,
     seed: int = 7,
+    on_phase: Optional[Callable[[str], None]] = None,
 ) -> AllocationResult:
-    """Constrained allocator: base EV (predictive) * bandit multiplier, with exploration + stability."""
+    """Constrained allocator: base EV (predictive) * bandit multiplier, with exploration + stability.
+
+    on_phase, if given, is called with the phase name as each phase finishes:
+    score, min_fill, exploration, exploitation, stability.
+    """
     random.seed(seed)
+    on_phase = on_phase or (lambda _name: None)
     moment_multipliers = moment_multipliers or {}
     previous_allocations = previous_allocations or {}
 
@@ -123,6 +145,8 @@ def allocate_budget(
         else:
             score_map[u] = base
 
+    on_phase("score")
+
     total = float(constraints.total_budget)
     exp_budget = total * clamp(constraints.exploration_ratio, 0.0, 0.5)
 
@@ -184,6 +208,8 @@ def allocate_budget(
                 need -= spent
                 remaining -= spent
 
+    on_phase("min_fill")
+
     # 3) exploration: spread across top 40% eligible to learn safely
     if eligible and remaining > 0 and exp_budget > 0:
         ranked = sorted(eligible, key=lambda x: score_map[x], reverse=True)
@@ -197,6 +223,8 @@ def allocate_budget(
                 spent = add(u, step)
                 remaining -= spent
 
+    on_phase("exploration")
+
     # 4) exploitation: best-first
     ranked_all = sorted(eligible, key=lambda x: score_map[x], reverse=True)
     for u in ranked_all:
@@ -214,16 +242,11 @@ def allocate_budget(
             spent = add(u, step)
             remaining -= spent
 
+    on_phase("exploitation")
+
     # 5) stability: limit per-tick reallocation magnitude
     if previous_allocations:
-        max_change = total * clamp(constraints.max_realloc_per_tick_ratio, 0.0, 1.0)
-        abs_change = sum(abs(alloc.get(u, 0.0) - previous_allocations.get(u, 0.0)) for u in units)
-        if abs_change > max_change and abs_change > 1e-9:
-            ratio = max_change / abs_change
-            for u in units:
-                prev = previous_allocations.get(u, 0.0)
-                alloc[u] = prev + (alloc[u] - prev) * ratio
-
+        if stability_clip(alloc, previous_allocations, total, constraints.max_realloc_per_tick_ratio):
             # recompute spends
             channel_spend, campaign_spend = {}, {}
             for u, amt in alloc.items():
@@ -232,6 +255,8 @@ def allocate_budget(
                 channel_spend[u.channel] = channel_spend.get(u.channel, 0.0) + amt
                 campaign_spend[u.campaign_id] = campaign_spend.get(u.campaign_id, 0.0) + amt
 
+    on_phase("stability")
+
     return AllocationResult(
         allocations=alloc,
         channel_spend=channel_spend,
@@ -241,4 +266,5 @@ def allocate_budget(
         moment_mult_map=moment_mult_map,
         bandit_state=bandit.export_state(),
         created_at_unix=int(time.time()),
+        eligible_count=len(eligible),
     )
@@ -11,3 +11,14 @@ def make_key(
     if inventory_id:
         return f"{channel}|{campaign_id}|{segment_id}|{moment}|{creative_id}|{offer_id}|{inventory_id}"
     return f"{channel}|{campaign_id}|{segment_id}|{moment}|{creative_id}|{offer_id}"
+
+
+def parent_key(key: str) -> str:
+    """channel|campaign|segment|moment prefix shared by every creative/offer/inventory arm under it."""
+    return "|".join(key.split("|")[:4])
+
+
+def unit_identity(key: str) -> str:
+    """The key without its moment segment: the same unit under any moment type."""
+    parts = key.split("|")
+    return "|".join(parts[:3] + parts[4:])
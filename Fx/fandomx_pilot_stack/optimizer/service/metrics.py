@@ -0,0 +1,175 @@
+from __future__ import annotations
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+import os
+import random
+import threading
+import time
+
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1.0"))
+
+# allocate_budget reseeds the global `random`, so sampling uses its own generator
+_sampler = random.Random()
+
+# seconds; tuned for a tick that should finish well inside 250ms
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by label values."""
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                # per-bucket counts, then +Inf count, then sum
+                s = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+                    break
+            else:
+                s[len(self.buckets)] += 1
+            s[-1] += value
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for labels, s in sorted(series.items()):
+            cum = 0.0
+            for b, c in zip(self.buckets, s):
+                cum += c
+                le = 'le="%g"' % b
+                out.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cum:g}")
+            cum += s[len(self.buckets)]
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cum:g}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, labels)} {s[-1]:.6f}")
+            out.append(f"{self.name}_count{_labels(self.label_names, labels)} {cum:g}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...], value: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, v in sorted(values.items()):
+            out.append(f"{self.name}{_labels(self.label_names, labels)} {v:g}")
+        return out
+
+
+STAGE_SECONDS = Histogram("fx_optimizer_stage_seconds", "Wall time per hot-path stage.", ("endpoint", "stage"))
+REQUEST_SECONDS = Histogram("fx_optimizer_request_seconds", "Wall time per sampled request.", ("endpoint",))
+UNITS_TOTAL = Counter("fx_optimizer_units_total", "Decision units seen by /optimize, by disposition.", ("kind",))
+REQUESTS_TOTAL = Counter("fx_optimizer_requests_total", "Requests handled, sampled or not.", ("endpoint",))
+DB_READS_TOTAL = Counter(
+    "fx_optimizer_db_reads_total",
+    "Read-helper connections by target: replica, primary (no read DSN), fallback_lag, fallback_error.",
+    ("target",),
+)
+
+REGISTRY = [REQUESTS_TOTAL, UNITS_TOTAL, REQUEST_SECONDS, STAGE_SECONDS, DB_READS_TOTAL]
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+class _Span:
+    __slots__ = ("timings", "stage", "t0")
+
+    def __init__(self, timings: "Timings", stage: str):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.record(self.stage, time.perf_counter() - self.t0)
+        return False
+
+
+_NOOP_SPAN = nullcontext()
+
+
+class Timings:
+    """Per-request stage timings. Unsampled instances hand out a shared no-op span and record nothing."""
+    def __init__(self, endpoint: str, sampled: bool):
+        self.endpoint = endpoint
+        self.sampled = sampled
+        self.stages: Dict[str, float] = {}
+        self._t0 = time.perf_counter()
+        REQUESTS_TOTAL.inc((endpoint,))
+
+    def span(self, stage: str):
+        return _Span(self, stage) if self.sampled else _NOOP_SPAN
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        STAGE_SECONDS.observe((self.endpoint, stage), seconds)
+
+    def phase_marker(self, prefix: str) -> Optional[Callable[[str], None]]:
+        """on_phase callback for fx_engine.allocate_budget; None when unsampled."""
+        if not self.sampled:
+            return None
+        last = [time.perf_counter()]
+
+        def mark(name: str) -> None:
+            now = time.perf_counter()
+            self.record(prefix + name, now - last[0])
+            last[0] = now
+
+        return mark
+
+    def finish(self) -> Optional[Dict[str, float]]:
+        """Closes the request; returns {stage: ms} when sampled."""
+        if not self.sampled:
+            return None
+        total = time.perf_counter() - self._t0
+        REQUEST_SECONDS.observe((self.endpoint,), total)
+        out = {k: round(v * 1000.0, 3) for k, v in self.stages.items()}
+        out["total"] = round(total * 1000.0, 3)
+        return out
+
+
+def start_timings(endpoint: str, force: bool = False) -> Timings:
+    sampled = force or METRICS_SAMPLE_RATE >= 1.0 or (METRICS_SAMPLE_RATE > 0.0 and _sampler.random() < METRICS_SAMPLE_RATE)
+    return Timings(endpoint, sampled)
+
+
+def count_units(units_in: int, gated_out: int, eligible: int) -> None:
+    UNITS_TOTAL.inc(("in",), units_in)
+    UNITS_TOTAL.inc(("gated_out",), gated_out)
+    UNITS_TOTAL.inc(("eligible",), eligible)
@@ -0,0 +1,192 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+import time
+
+from fx_engine import stability_clip
+from keys import unit_identity
+
+# moment.type values emitted by the live-moments agent (packages/schemas/events.ts)
+MOMENT_TYPES = ("team_success", "team_failure", "turning_point", "player_success", "player_failure")
+
+
+@dataclass
+class MomentPlan:
+    """Ready-to-serve allocation for one (operator, moment type), solved without a stability clip."""
+    operator_id: str
+    moment_type: str
+    total_budget: float
+    keys: List[str]
+    channels: List[str]
+    campaigns: List[str]
+    amounts: List[float]
+    channel_spend: Dict[str, float]
+    campaign_spend: Dict[str, float]
+    debug: Dict[str, Dict[str, float]]
+    records: List[dict]
+    skipped_by_eligibility: int
+    built_at_unix: float = field(default_factory=time.time)
+
+
+@dataclass
+class _Template:
+    request: Any
+    moment_types: List[str]
+    stale: bool = True
+    # bumped by mark_stale; refresh only clears `stale` if no mark landed while it was rebuilding
+    generation: int = 0
+
+
+class MomentPlanStore:
+    """Per-operator moment-response plans, rebuilt in the background as policy and predictions move.
+
+    `build_fn(request, moment_type)` must return a MomentPlan (or None when nothing passes gating);
+    it is only ever called from `refresh()`, never on the lookup path.
+    """
+    def __init__(self, build_fn: Callable[[Any, str], Optional[MomentPlan]], max_age_sec: float = 60.0):
+        self.build_fn = build_fn
+        self.max_age_sec = max_age_sec
+        self.templates: Dict[str, _Template] = {}
+        self.plans: Dict[Tuple[str, str], MomentPlan] = {}
+        self.last_served: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, operator_id: str, request: Any, moment_types: Optional[List[str]] = None) -> None:
+        types = list(moment_types or MOMENT_TYPES)
+        with self._lock:
+            self.templates[operator_id] = _Template(request=request, moment_types=types)
+            for k in [k for k in self.plans if k[0] == operator_id and k[1] not in types]:
+                del self.plans[k]
+
+    def mark_stale(self, operator_id: Optional[str] = None) -> None:
+        with self._lock:
+            for op, t in self.templates.items():
+                if operator_id is None or op == operator_id:
+                    t.stale = True
+                    t.generation += 1
+
+    def refresh(self, force: bool = False) -> int:
+        """Rebuilds plans that are stale or older than max_age_sec. Returns the number rebuilt.
+
+        A template stays stale until every one of its plans rebuilt without error, so a failed solve is retried on
+        the next refresh instead of leaving the old plan marked fresh."""
+        now = time.time()
+        with self._lock:
+            todo = []
+            generations = {}
+            for op, t in self.templates.items():
+                for mt in t.moment_types:
+                    plan = self.plans.get((op, mt))
+                    if force or t.stale or plan is None or now - plan.built_at_unix > self.max_age_sec:
+                        todo.append((op, t, mt))
+                generations[op] = (t, t.generation)
+
+        built = 0
+        failed = set()
+        for op, t, mt in todo:
+            try:
+                plan = self.build_fn(t.request, mt)
+            except Exception as e:  # keep serving the last good plan for this type
+                print(f"moment plan build failed operator={op} moment_type={mt}:", e)
+                failed.add(op)
+                continue
+            with self._lock:
+                if self.templates.get(op) is not t:
+                    continue  # template replaced while solving
+                if plan is None:
+                    self.plans.pop((op, mt), None)
+                else:
+                    self.plans[(op, mt)] = plan
+                    built += 1
+        with self._lock:
+            for op, (t, gen) in generations.items():
+                if op not in failed and self.templates.get(op) is t and t.generation == gen:
+                    t.stale = False
+        return built
+
+    def start(self, interval_sec: float = 5.0) -> None:
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:  # keep serving the last good plans
+                    print("moment plan refresh failed:", e)
+                time.sleep(interval_sec)
+
+        self._thread = threading.Thread(target=loop, name="moment-plan-refresher", daemon=True)
+        self._thread.start()
+
+    def get(self, operator_id: str, moment_type: str) -> Optional[MomentPlan]:
+        return self.plans.get((operator_id, moment_type))
+
+    def is_stale(self, operator_id: str) -> bool:
+        t = self.templates.get(operator_id)
+        return bool(t and t.stale)
+
+    def note_served(self, operator_id: str, allocations: Dict[str, float]) -> None:
+        """Records the operator's live allocation so the next plan lookup can clip against it."""
+        with self._lock:
+            self.last_served[operator_id] = allocations
+
+    def serve(self, plan: MomentPlan, previous_allocations: Optional[Dict[str, float]], max_realloc_ratio: float) -> dict:
+        """Plan lookup result clipped against the current allocation (request-supplied or last served).
+
+        The live allocation usually comes from /optimize or another moment type, so its keys carry a different
+        moment segment. The clip therefore compares units by unit_identity(). With no unit in common there is
+        nothing to stay close to, and the plan is served as solved."""
+        if previous_allocations:
+            prev = previous_allocations
+        else:
+            with self._lock:
+                prev = self.last_served.get(plan.operator_id, {})
+        alloc = dict(zip(plan.keys, plan.amounts))
+        channel_spend, campaign_spend = plan.channel_spend, plan.campaign_spend
+
+        prev_by_unit: Dict[str, float] = {}
+        for k, amt in prev.items():
+            u = unit_identity(k)
+            prev_by_unit[u] = prev_by_unit.get(u, 0.0) + amt
+        units = {k: unit_identity(k) for k in plan.keys}
+        by_unit = {units[k]: amt for k, amt in alloc.items()}
+        clipped = (
+            not prev_by_unit.keys().isdisjoint(by_unit)
+            and stability_clip(by_unit, prev_by_unit, plan.total_budget, max_realloc_ratio)
+        )
+        if clipped:
+            alloc = {k: by_unit[units[k]] for k in plan.keys}
+            channel_spend, campaign_spend = {}, {}
+            for k, ch, cp in zip(plan.keys, plan.channels, plan.campaigns):
+                amt = alloc[k]
+                if amt <= 0:
+                    continue
+                channel_spend[ch] = channel_spend.get(ch, 0.0) + amt
+                campaign_spend[cp] = campaign_spend.get(cp, 0.0) + amt
+
+        self.note_served(plan.operator_id, alloc)
+        return {
+            "allocations": alloc,
+            "channel_spend": dict(channel_spend),
+            "campaign_spend": dict(campaign_spend),
+            "clipped": clipped,
+        }
+
+    def summary(self) -> List[dict]:
+        now = time.time()
+        with self._lock:
+            plans = list(self.plans.values())
+        return [
+            {
+                "operator_id": p.operator_id,
+                "moment_type": p.moment_type,
+                "units": len(p.keys),
+                "total_allocated": float(sum(p.amounts)),
+                "age_sec": round(now - p.built_at_unix, 3),
+                "stale": self.is_stale(p.operator_id),
+            }
+            for p in plans
+        ]
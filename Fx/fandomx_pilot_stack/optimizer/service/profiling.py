@@ -0,0 +1,217 @@
+from __future__ import annotations
+from collections import deque
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Set
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+_NOOP = nullcontext()
+# keep the profiler's own snapshot bookkeeping out of the allocation report
+_SNAPSHOT_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+# tracemalloc traces the whole process, so a request's before/after diff also holds whatever ran alongside it
+_ALLOCATION_NOTES = {
+    "process_wide": "allocation diffs are process-wide: each tracked request's diff also counts allocations by "
+                    "concurrent requests and background threads",
+    "serialized": "tracked requests ran one at a time, so their diffs don't overlap each other; untracked requests "
+                  "and background threads are still counted",
+}
+
+
+@dataclass
+class ProfileSession:
+    """One armed profiling window: ends after `max_requests` tracked requests or `deadline`, whichever first."""
+    profile_id: str
+    endpoints: Set[str]
+    max_requests: Optional[int]
+    deadline: Optional[float]
+    interval_sec: float
+    top_n: int
+    serialize: bool = False
+    started_at: float = field(default_factory=time.time)
+    ended_at: Optional[float] = None
+    requests: int = 0
+    samples: int = 0
+    stacks: Dict[str, int] = field(default_factory=dict)
+    alloc_sites: Dict[str, List[int]] = field(default_factory=dict)  # site -> [size_diff, count_diff, requests]
+    top_allocations: List[dict] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        return {
+            "profile_id": self.profile_id,
+            "endpoints": sorted(self.endpoints),
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "active": self.ended_at is None,
+            "requests": self.requests,
+            "max_requests": self.max_requests,
+            "samples": self.samples,
+            "interval_ms": self.interval_sec * 1000.0,
+            "allocation_scope": self.allocation_scope,
+            "allocation_note": _ALLOCATION_NOTES[self.allocation_scope],
+        }
+
+    @property
+    def allocation_scope(self) -> str:
+        return "serialized" if self.serialize else "process_wide"
+
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed-stack format: `root;...;leaf count` per line."""
+        stacks = dict(self.stacks)
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(stacks.items(), key=lambda kv: kv[1], reverse=True))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class Profiler:
+    """Sampling CPU profiler + tracemalloc diffs for selected requests.
+
+    Disabled by default; `track()` returns a shared no-op context until a session is armed. A session armed with
+    `serialize` runs its tracked requests one at a time, which keeps their allocation diffs apart at the cost of
+    queueing them.
+    """
+    def __init__(self, keep: int = 10):
+        self.session: Optional[ProfileSession] = None
+        self.history: Deque[ProfileSession] = deque(maxlen=keep)
+        self._threads: Set[int] = set()
+        self._lock = threading.Lock()
+        # held by a tracked request for its whole window when the session serializes
+        self._serial = threading.Lock()
+        self._owns_tracemalloc = False
+
+    @property
+    def active(self) -> bool:
+        return self.session is not None
+
+    def arm(
+        self, endpoints: List[str], max_requests: Optional[int], seconds: Optional[float], interval_ms: float = 5.0,
+        top_n: int = 50, serialize: bool = False,
+    ) -> ProfileSession:
+        with self._lock:
+            if self.session is not None:
+                raise RuntimeError("profiling session already active")
+            s = ProfileSession(
+                profile_id=uuid.uuid4().hex[:12],
+                endpoints=set(endpoints),
+                max_requests=max_requests,
+                deadline=time.time() + seconds if seconds else None,
+                interval_sec=max(0.001, interval_ms / 1000.0),
+                top_n=top_n,
+                serialize=serialize,
+            )
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(1)
+                self._owns_tracemalloc = True
+            self.session = s
+            self.history.appendleft(s)
+        threading.Thread(target=self._sample_loop, args=(s,), name="profiler-sampler", daemon=True).start()
+        return s
+
+    def stop(self) -> Optional[ProfileSession]:
+        with self._lock:
+            s = self.session
+            if s is None:
+                return None
+            self.session = None
+            s.ended_at = time.time()
+            s.top_allocations = [
+                {"site": site, "size_diff_kb": v[0] / 1024.0, "count_diff": v[1], "requests": v[2]}
+                for site, v in sorted(s.alloc_sites.items(), key=lambda kv: kv[1][0], reverse=True)[: s.top_n]
+            ]
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+                self._owns_tracemalloc = False
+        return s
+
+    def get(self, profile_id: str) -> Optional[ProfileSession]:
+        for s in self.history:
+            if s.profile_id == profile_id:
+                return s
+        return None
+
+    def track(self, endpoint: str):
+        s = self.session
+        if s is None or endpoint not in s.endpoints:
+            return _NOOP
+        return _TrackedRequest(self, s)
+
+    def _sample_loop(self, s: ProfileSession) -> None:
+        me = threading.get_ident()
+        while self.session is s:
+            if s.deadline is not None and time.time() >= s.deadline:
+                self.stop()
+                return
+            frames = sys._current_frames()
+            with self._lock:
+                tids = list(self._threads)
+            for tid in tids:
+                frame = frames.get(tid)
+                if frame is None or tid == me:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack = ";".join(reversed(labels))
+                s.stacks[stack] = s.stacks.get(stack, 0) + 1
+                s.samples += 1
+            time.sleep(s.interval_sec)
+
+
+class _TrackedRequest:
+    __slots__ = ("profiler", "session", "before", "tid")
+
+    def __init__(self, profiler: Profiler, session: ProfileSession):
+        self.profiler = profiler
+        self.session = session
+
+    def __enter__(self):
+        if self.session.serialize:
+            self.profiler._serial.acquire()
+        # snapshots happen outside the sampled window so they don't show up in the CPU profile
+        try:
+            self.before = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS) if tracemalloc.is_tracing() else None
+        except BaseException:
+            if self.session.serialize:
+                self.profiler._serial.release()
+            raise
+        self.tid = threading.get_ident()
+        with self.profiler._lock:
+            self.profiler._threads.add(self.tid)
+        return self
+
+    def __exit__(self, *exc):
+        s, p = self.session, self.profiler
+        with p._lock:
+            p._threads.discard(self.tid)
+        diff = None
+        try:
+            if self.before is not None and tracemalloc.is_tracing():
+                diff = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS).compare_to(self.before, "lineno")
+        finally:
+            if s.serialize:
+                p._serial.release()
+        if diff is not None:
+            with p._lock:
+                for stat in diff:
+                    if stat.size_diff <= 0:
+                        continue
+                    fr = stat.traceback[0]
+                    site = f"{fr.filename}:{fr.lineno}"
+                    v = s.alloc_sites.setdefault(site, [0, 0, 0])
+                    v[0] += stat.size_diff
+                    v[1] += stat.count_diff
+                    v[2] += 1
+        with p._lock:
+            s.requests += 1
+            done = s.max_requests is not None and s.requests >= s.max_requests
+        if done and p.session is s:
+            p.stop()
+        return False
@@ -0,0 +1,144 @@
+from __future__ import annotations
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import threading
+import time
+
+# operator type assumed for operators without tenants.metadata->>'type' (matches the settlement SQL)
+DEFAULT_OPERATOR_TYPE = "club"
+DEFAULT_INVENTORY_TYPE = "owned"
+
+
+@dataclass(frozen=True)
+class RevenueRule:
+    rule_id: str
+    operator_fee_pct: float
+    inventory_owner_pct: float
+    platform_fee_pct: float
+    effective_from: datetime
+    effective_to: Optional[datetime]
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    version: str
+    # (operator_type, inventory_type) -> rules and their effective_from, both ascending by effective_from
+    rules: Dict[Tuple[str, str], List[RevenueRule]]
+    starts: Dict[Tuple[str, str], List[datetime]]
+    operator_types: Dict[str, str]
+
+
+def split(gross: float, same_party: bool, rule: Optional[RevenueRule]) -> Tuple[float, float, float]:
+    """(operator_share, owner_share, platform_share) of gross; owned inventory keeps everything."""
+    if same_party:
+        return gross, 0.0, 0.0
+    if rule is None:
+        return 0.0, gross, 0.0
+    return gross * rule.operator_fee_pct, gross * rule.inventory_owner_pct, gross * rule.platform_fee_pct
+
+
+class RevenueRuleIndex:
+    """revenue_rules held in memory per (operator_type, inventory_type), sorted by effective_from.
+
+    Resolution matches the settlement SQL: on day d, the rule with the latest effective_from that starts by the end of
+    d (inclusive) and does not end before d starts. `load_fn` returns (version, rule rows, operator types) and
+    `version_fn` the current version; the index re-checks the version at most every `refresh_sec` and reloads only when
+    it changed. Readers always see one consistent snapshot.
+    """
+    def __init__(
+        self,
+        load_fn: Callable[[], Tuple[str, List[tuple], Dict[str, str]]],
+        version_fn: Callable[[], str],
+        refresh_sec: float = 30.0,
+    ):
+        self.load_fn = load_fn
+        self.version_fn = version_fn
+        self.refresh_sec = refresh_sec
+        self._snap: Optional[_Snapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        self.refresh(force=True)
+
+    def invalidate(self) -> None:
+        """Forces a version check on the next lookup (call after writing rules or tenants in this process)."""
+        self._checked_at = 0.0
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reloads if the stored version changed. Returns True when it reloaded."""
+        if not force and self._snap is not None and time.time() - self._checked_at < self.refresh_sec:
+            return False
+        with self._lock:
+            if not force and self._snap is not None:
+                if time.time() - self._checked_at < self.refresh_sec:
+                    return False  # another thread just checked
+                self._checked_at = time.time()
+                if self.version_fn() == self._snap.version:
+                    return False
+            self._snap = self._build(*self.load_fn())
+            self._checked_at = time.time()
+        return True
+
+    @staticmethod
+    def _build(version: str, rows: List[tuple], operator_types: Dict[str, str]) -> _Snapshot:
+        rules: Dict[Tuple[str, str], List[RevenueRule]] = {}
+        for rule_id, op_type, inv_type, op_pct, owner_pct, platform_pct, eff_from, eff_to in rows:
+            rules.setdefault((op_type, inv_type), []).append(
+                RevenueRule(rule_id, float(op_pct), float(owner_pct), float(platform_pct), eff_from, eff_to)
+            )
+        for lst in rules.values():
+            lst.sort(key=lambda r: (r.effective_from, r.rule_id))
+        starts = {k: [r.effective_from for r in lst] for k, lst in rules.items()}
+        return _Snapshot(version, rules, starts, dict(operator_types))
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._snap.version if self._snap else None
+
+    def operator_type(self, operator_id: Optional[str]) -> str:
+        return self._snapshot().operator_types.get(operator_id or "", DEFAULT_OPERATOR_TYPE)
+
+    def resolve(self, operator_type: str, inventory_type: str, day: date) -> Optional[RevenueRule]:
+        return self._resolve(self._snapshot(), (operator_type, inventory_type), datetime.combine(day, dtime()))
+
+    @staticmethod
+    def _resolve(snap: _Snapshot, pair: Tuple[str, str], day_start: datetime) -> Optional[RevenueRule]:
+        starts = snap.starts.get(pair)
+        if not starts:
+            return None
+        lst = snap.rules[pair]
+        i = bisect_right(starts, day_start + timedelta(days=1)) - 1
+        while i >= 0:
+            r = lst[i]
+            if r.effective_to is None or r.effective_to >= day_start:
+                return r
+            i -= 1
+        return None
+
+    def price(self, rows: Iterable[tuple], day: date) -> List[Tuple[float, float, float, Optional[str]]]:
+        """Shares for (operator_id, inventory_owner_id, inventory_type, gross) rows on `day`, as
+        (operator_share, owner_share, platform_share, rule_id), with the settlement SQL's defaults for missing ids.
+        Each distinct (operator_type, inventory_type) is resolved once per call; the rest is a dict lookup and three
+        multiplications per row."""
+        snap = self._snapshot()
+        day_start = datetime.combine(day, dtime())
+        resolved: Dict[Tuple[str, str], Optional[RevenueRule]] = {}
+        out = []
+        for operator_id, owner_id, inventory_type, gross in rows:
+            if owner_id is None:
+                owner_id = operator_id if operator_id is not None else "unknown_owner"
+            if operator_id is None:
+                operator_id = "unknown_operator"
+            pair = (snap.operator_types.get(operator_id, DEFAULT_OPERATOR_TYPE), DEFAULT_INVENTORY_TYPE if inventory_type is None else inventory_type)
+            if pair not in resolved:
+                resolved[pair] = self._resolve(snap, pair, day_start)
+            rule = resolved[pair]
+            out.append((*split(float(gross), operator_id == owner_id, rule), rule.rule_id if rule else None))
+        return out
+
+    def _snapshot(self) -> _Snapshot:
+        self.refresh()
+        return self._snap
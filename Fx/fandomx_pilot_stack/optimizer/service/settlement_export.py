@@ -0,0 +1,99 @@
+"""Streaming encoders for the settlement export: CSV, Parquet and Arrow IPC.
+
+Each encoder takes the row chunks from db.iter_settlement_rows and yields bytes as every chunk is encoded, so
+response memory is bounded by one chunk regardless of how many ledger rows a day has. pyarrow is imported only
+when a Parquet or Arrow export is requested.
+"""
+from __future__ import annotations
+import csv
+import io
+from typing import Iterable, Iterator, List, Sequence
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+class _Sink(io.RawIOBase):
+    """Write-only stream that hands out what was written since the last drain(). tell() keeps counting the
+    total, which the Parquet writer uses for the offsets in its footer."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+def _csv(columns: Sequence[str], chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(columns)
+    yield buf.getvalue().encode()
+    for rows in chunks:
+        buf.seek(0)
+        buf.truncate()
+        w.writerows(rows)
+        yield buf.getvalue().encode()
+
+
+def _schema(columns: Sequence[str]):
+    import pyarrow as pa
+
+    types = {
+        "settlement_date": pa.date32(),
+        "gross_spend": pa.float64(),
+        "impressions": pa.int64(),
+        "conversions": pa.int64(),
+        "operator_share": pa.float64(),
+        "owner_share": pa.float64(),
+        "platform_share": pa.float64(),
+    }
+    return pa.schema([(c, types.get(c, pa.string())) for c in columns])
+
+
+def _batch(schema, rows: List[tuple]):
+    import pyarrow as pa
+
+    cols = list(zip(*rows))
+    return pa.RecordBatch.from_arrays([pa.array(col, type=f.type) for col, f in zip(cols, schema)], schema=schema)
+
+
+def _arrow(columns: Sequence[str], chunks: Iterable[List[tuple]], parquet: bool) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _schema(columns)
+    sink = _Sink()
+    # one Parquet row group / IPC record batch per chunk
+    writer = pq.ParquetWriter(sink, schema) if parquet else pa.ipc.new_stream(sink, schema)
+    try:
+        for rows in chunks:
+            writer.write_batch(_batch(schema, rows))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def encode(fmt: str, columns: Sequence[str], chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    if fmt == "csv":
+        return _csv(columns, chunks)
+    return _arrow(columns, chunks, parquet=(fmt == "parquet"))
@@ -9,6 +9,51 @@ CREATE TABLE IF NOT EXISTS policy_state (
     beta DOUBLE PRECISION NOT NULL DEFAULT 1.0,
     updated_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
+-- (updated_at, key) serves the idle-arm scan and the /admin/policy_state keyset; text_pattern_ops lets key-prefix
+-- filters range-scan whatever the database collation
+DROP INDEX IF EXISTS idx_policy_state_updated;
+CREATE INDEX IF NOT EXISTS idx_policy_state_updated_key ON policy_state(updated_at, key);
+CREATE INDEX IF NOT EXISTS idx_policy_state_key_pattern ON policy_state(key text_pattern_ops);
+
+-- Arms idle past POLICY_IDLE_DAYS (jobs/policy_compaction.py); moved back into policy_state on next lookup
+CREATE TABLE IF NOT EXISTS policy_state_archive (
+    key TEXT PRIMARY KEY,
+    alpha DOUBLE PRECISION NOT NULL,
+    beta DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP NOT NULL,
+    archived_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_policy_archive_archived ON policy_state_archive(archived_at);
+
+-- Evidence of archived arms past POLICY_ARCHIVE_DAYS, folded per channel|campaign|segment|moment;
+-- seeds the Beta prior of arms with no row of their own
+CREATE TABLE IF NOT EXISTS policy_priors (
+    parent_key TEXT PRIMARY KEY,
+    successes DOUBLE PRECISION NOT NULL DEFAULT 0,
+    failures DOUBLE PRECISION NOT NULL DEFAULT 0,
+    arms BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- allocations_log / outcomes_log are range-partitioned by day; partitions are created ahead and dropped
+-- past retention by db.ensure_log_partitions / db.drop_expired_log_partitions (jobs/log_partitions.py).
+-- A pre-partitioning table of the same name is renamed to <name>_legacy here and attached further down as
+-- the partition holding everything before its last day, so upgrades keep their history without a copy.
+DO $$
+DECLARE
+  t text;
+BEGIN
+  FOREACH t IN ARRAY ARRAY['allocations_log', 'outcomes_log'] LOOP
+    IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass(t) AND relkind = 'r') THEN
+      EXECUTE format('ALTER TABLE %I RENAME TO %I', t, t || '_legacy');
+      -- the partitioned parent's primary key (which adds the partition column) replaces it on attach
+      EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', t || '_legacy', t || '_pkey');
+    END IF;
+  END LOOP;
+  IF EXISTS (SELECT 1 FROM pg_index WHERE indexrelid = to_regclass('idx_outcomes_key') AND indrelid = to_regclass('outcomes_log_legacy')) THEN
+    ALTER INDEX idx_outcomes_key RENAME TO idx_outcomes_legacy_key;
+  END IF;
+END $$;
 
 -- Allocation audit log
 CREATE TABLE IF NOT EXISTS allocations_log (
@@ -27,12 +72,17 @@ CREATE TABLE IF NOT EXISTS allocations_log (
     score DOUBLE PRECISION,
     base_ev DOUBLE PRECISION,
     moment_multiplier DOUBLE PRECISION,
-    PRIMARY KEY (run_id, key)
-);
+    PRIMARY KEY (run_id, key, timestamp)
+) PARTITION BY RANGE (timestamp);
+CREATE TABLE IF NOT EXISTS allocations_log_default PARTITION OF allocations_log DEFAULT;
+CREATE INDEX IF NOT EXISTS idx_allocations_ts ON allocations_log(timestamp);
+-- /admin/allocations/{run_id} pages by budget; the PK already covers sort=key
+CREATE INDEX IF NOT EXISTS idx_allocations_run_budget ON allocations_log(run_id, allocated_budget, key);
 
--- Outcomes log (learning signal)
+-- Outcomes log (learning signal); ids come from one sequence across partitions (training watermark)
+CREATE SEQUENCE IF NOT EXISTS outcomes_log_id_seq;
 CREATE TABLE IF NOT EXISTS outcomes_log (
-    id BIGSERIAL PRIMARY KEY,
+    id BIGINT NOT NULL DEFAULT nextval('outcomes_log_id_seq'),
     run_id UUID,
     key TEXT NOT NULL,
     operator_id TEXT,
@@ -48,9 +98,59 @@ CREATE TABLE IF NOT EXISTS outcomes_log (
     conversions BIGINT NOT NULL DEFAULT 0,
     realized_profit DOUBLE PRECISION NOT NULL,
     predicted_ev DOUBLE PRECISION NOT NULL,
-    created_at TIMESTAMP NOT NULL DEFAULT NOW()
-);
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+-- owned by the parent so dropping an old partition never takes the sequence with it
+ALTER SEQUENCE outcomes_log_id_seq OWNED BY outcomes_log.id;
+CREATE TABLE IF NOT EXISTS outcomes_log_default PARTITION OF outcomes_log DEFAULT;
 CREATE INDEX IF NOT EXISTS idx_outcomes_key ON outcomes_log(key);
+CREATE INDEX IF NOT EXISTS idx_outcomes_created_brin ON outcomes_log USING brin (created_at);
+
+DO $$
+DECLARE
+  t record;
+  hi date;
+BEGIN
+  FOR t IN SELECT * FROM (VALUES ('allocations_log', 'timestamp'), ('outcomes_log', 'created_at')) v(tbl, col) LOOP
+    IF to_regclass(t.tbl || '_legacy') IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(t.tbl || '_legacy')) THEN
+      EXECUTE format('SELECT COALESCE(MAX(%I)::date + 1, CURRENT_DATE) FROM %I', t.col, t.tbl || '_legacy') INTO hi;
+      EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (MINVALUE) TO (%L)', t.tbl, t.tbl || '_legacy', hi);
+    END IF;
+  END LOOP;
+END $$;
+
+-- One header row per /optimize or moment-plan run; /admin/runs pages this instead of aggregating allocations_log
+CREATE TABLE IF NOT EXISTS runs (
+  run_id UUID PRIMARY KEY,
+  created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  source TEXT NOT NULL DEFAULT 'optimize',  -- optimize | moment
+  operator_id TEXT,
+  moment_type TEXT,
+  total_budget DOUBLE PRECISION,
+  allocated DOUBLE PRECISION NOT NULL DEFAULT 0,
+  units INTEGER NOT NULL DEFAULT 0,           -- units in the request (or plan)
+  eligible_units INTEGER,
+  allocated_units INTEGER NOT NULL DEFAULT 0, -- units with a non-zero allocation
+  skipped_units INTEGER,
+  solve_ms DOUBLE PRECISION,
+  latency_ms DOUBLE PRECISION                 -- handler time up to logging the run
+);
+CREATE INDEX IF NOT EXISTS idx_runs_created ON runs(created_at DESC, run_id DESC);
+CREATE INDEX IF NOT EXISTS idx_runs_operator_created ON runs(operator_id, created_at DESC, run_id DESC);
+
+-- one-time backfill of headers for runs logged before the table existed
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM runs) THEN
+    INSERT INTO runs (run_id, created_at, operator_id, allocated, units, allocated_units)
+    SELECT run_id, MIN(timestamp), MIN(operator_id), SUM(allocated_budget), COUNT(*), COUNT(*) FILTER (WHERE allocated_budget > 0)
+    FROM allocations_log
+    GROUP BY run_id
+    ON CONFLICT (run_id) DO NOTHING;
+  END IF;
+END $$;
 
 -- 5-min aggregates (streaming)
 CREATE TABLE IF NOT EXISTS outcomes_agg_5m (
@@ -86,7 +186,27 @@ CREATE TABLE IF NOT EXISTS model_predictions (
   incrementality DOUBLE PRECISION NOT NULL DEFAULT 1.0,
   PRIMARY KEY (key, as_of)
 );
-CREATE INDEX IF NOT EXISTS idx_model_pred_key ON model_predictions(key);
+-- (key, as_of) PK already serves per-key lookups; a second key index only slows bulk publishing
+DROP INDEX IF EXISTS idx_model_pred_key;
+
+-- Incremental training state (nightly_train.py, TRAIN_MODE=incremental)
+CREATE TABLE IF NOT EXISTS training_watermarks (
+  model_name TEXT PRIMARY KEY,
+  last_outcome_id BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Per-key sufficient statistics, exponentially decayed from updated_at at read/merge time
+CREATE TABLE IF NOT EXISTS training_key_stats (
+  model_name TEXT NOT NULL,
+  key TEXT NOT NULL,
+  successes DOUBLE PRECISION NOT NULL DEFAULT 0,
+  trials DOUBLE PRECISION NOT NULL DEFAULT 0,
+  profit_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+  spend_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (model_name, key)
+);
 
 
 
@@ -145,11 +265,21 @@ CREATE TABLE IF NOT EXISTS integrations (
   PRIMARY KEY (tenant_id, kind)
 );
 
-CREATE INDEX IF NOT EXISTS idx_campaigns_tenant ON campaigns(tenant_id);
-CREATE INDEX IF NOT EXISTS idx_segments_tenant ON segments(tenant_id);
-CREATE INDEX IF NOT EXISTS idx_creatives_tenant ON creatives(tenant_id);
-CREATE INDEX IF NOT EXISTS idx_offers_tenant ON offers(tenant_id);
-CREATE INDEX IF NOT EXISTS idx_integrations_tenant ON integrations(tenant_id);
+-- Admin list keysets: (filter, sort column, id) so each page is one index range scan in either direction
+DROP INDEX IF EXISTS idx_campaigns_tenant;
+DROP INDEX IF EXISTS idx_segments_tenant;
+DROP INDEX IF EXISTS idx_creatives_tenant;
+DROP INDEX IF EXISTS idx_offers_tenant;
+-- (tenant_id, kind) PK already serves per-tenant lookups
+DROP INDEX IF EXISTS idx_integrations_tenant;
+CREATE INDEX IF NOT EXISTS idx_tenants_created ON tenants(created_at, tenant_id);
+CREATE INDEX IF NOT EXISTS idx_tenants_type_created ON tenants((metadata->>'type'), created_at, tenant_id);
+CREATE INDEX IF NOT EXISTS idx_campaigns_created ON campaigns(created_at, campaign_id);
+CREATE INDEX IF NOT EXISTS idx_campaigns_tenant_created ON campaigns(tenant_id, created_at, campaign_id);
+CREATE INDEX IF NOT EXISTS idx_campaigns_channel_created ON campaigns(channel, created_at, campaign_id);
+CREATE INDEX IF NOT EXISTS idx_segments_tenant_created ON segments(tenant_id, created_at, segment_id);
+CREATE INDEX IF NOT EXISTS idx_creatives_tenant_created ON creatives(tenant_id, created_at, creative_id);
+CREATE INDEX IF NOT EXISTS idx_offers_tenant_created ON offers(tenant_id, created_at, offer_id);
 
 -- Rights-aware inventory access
 CREATE TABLE IF NOT EXISTS inventory_access (
@@ -167,8 +297,12 @@ CREATE TABLE IF NOT EXISTS inventory_access (
   updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
   PRIMARY KEY (operator_id, inventory_id)
 );
-CREATE INDEX IF NOT EXISTS idx_inventory_access_operator ON inventory_access(operator_id);
-CREATE INDEX IF NOT EXISTS idx_inventory_access_owner ON inventory_access(inventory_owner_id);
+DROP INDEX IF EXISTS idx_inventory_access_operator;
+DROP INDEX IF EXISTS idx_inventory_access_owner;
+CREATE INDEX IF NOT EXISTS idx_inventory_access_updated ON inventory_access(updated_at, operator_id, inventory_id);
+CREATE INDEX IF NOT EXISTS idx_inventory_access_operator_updated ON inventory_access(operator_id, updated_at, inventory_id);
+CREATE INDEX IF NOT EXISTS idx_inventory_access_owner_updated ON inventory_access(inventory_owner_id, updated_at, operator_id, inventory_id);
+CREATE INDEX IF NOT EXISTS idx_inventory_access_channels ON inventory_access USING gin (allowed_channels);
 
 -- Revenue rules for shadow settlement
 CREATE TABLE IF NOT EXISTS revenue_rules (
@@ -184,6 +318,7 @@ CREATE TABLE IF NOT EXISTS revenue_rules (
   created_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 CREATE INDEX IF NOT EXISTS idx_revenue_rules_lookup ON revenue_rules(operator_type, inventory_type, effective_from);
+CREATE INDEX IF NOT EXISTS idx_revenue_rules_created ON revenue_rules(created_at, rule_id);
 
 -- Shadow settlement daily ledger
 CREATE TABLE IF NOT EXISTS settlement_ledger_daily (
@@ -203,3 +338,31 @@ CREATE TABLE IF NOT EXISTS settlement_ledger_daily (
   PRIMARY KEY (settlement_date, operator_id, inventory_owner_id, inventory_id, channel)
 );
 CREATE INDEX IF NOT EXISTS idx_settlement_date ON settlement_ledger_daily(settlement_date);
+-- accrued intraday by the outcome ingestion path; inventory_type lets the finalize step re-price a row without outcomes_log
+ALTER TABLE settlement_ledger_daily ADD COLUMN IF NOT EXISTS inventory_type TEXT NOT NULL DEFAULT 'owned';
+ALTER TABLE settlement_ledger_daily ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT NOW();
+
+-- per-batch ledger totals appended by outcome ingestion; the optimizer folds them into settlement_ledger_daily
+-- off the request path, and a recompute or finalize of the day consumes whatever is still pending
+CREATE TABLE IF NOT EXISTS settlement_ledger_deltas (
+  id BIGSERIAL PRIMARY KEY,
+  settlement_date DATE NOT NULL,
+  operator_id TEXT NOT NULL,
+  inventory_owner_id TEXT NOT NULL,
+  inventory_id TEXT NOT NULL,
+  channel TEXT NOT NULL,
+  inventory_type TEXT NOT NULL,
+  gross_spend DOUBLE PRECISION NOT NULL,
+  impressions BIGINT NOT NULL,
+  conversions BIGINT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_settlement_deltas_date ON settlement_ledger_deltas(settlement_date);
+
+-- days closed by the finalize step; a day without a row is still open (intraday)
+CREATE TABLE IF NOT EXISTS settlement_days (
+  settlement_date DATE PRIMARY KEY,
+  finalized_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  mode TEXT NOT NULL,  -- repriced | recomputed
+  gross_spend DOUBLE PRECISION NOT NULL DEFAULT 0,
+  outcomes BIGINT NOT NULL DEFAULT 0
+);
@@ -1,3 +1,4 @@
+import { Readable } from "node:stream";
 import express from "express";
 import { v4 as uuid } from "uuid";
 
@@ -46,6 +47,19 @@ async function adminGet(path, query = "") {
   return r.json();
 }
 
+// Follows next_cursor through an admin list endpoint for callers that need every row.
+async function adminGetAll(path, params = {}) {
+  const items = [];
+  let cursor = null;
+  do {
+    const qs = new URLSearchParams({ ...params, limit: "500", ...(cursor ? { cursor } : {}) });
+    const out = await adminGet(path, `?${qs}`);
+    items.push(...(out?.items || []));
+    cursor = out?.next_cursor || null;
+  } while (cursor);
+  return { items };
+}
+
 async function adminPost(path, body) {
   const r = await fetch(`${OPTIMIZER_ADMIN_URL}${path}`, {
     method: "POST",
@@ -63,8 +77,8 @@ app.post("/invites/brand", async (req, res) => {
     const club_tenant_id = (req.body?.club_tenant_id || "").trim();
     if (!club_tenant_id) return res.status(400).json({ error: "missing_club_tenant_id" });
 
-    const tenants = await adminGet("/tenants");
-    const club = (tenants?.items || []).find((x) => x.tenant_id === club_tenant_id);
+    const tenants = await adminGet("/tenants", `?tenant_id=${encodeURIComponent(club_tenant_id)}`);
+    const club = (tenants?.items || [])[0];
     if (!club || club.metadata?.type !== "club") {
       return res.status(400).json({ error: "invalid_club_tenant_id" });
     }
@@ -128,8 +142,8 @@ app.post("/tenants/brand/register", async (req, res) => {
     if (!invite || invite.status !== "active") return res.status(400).json({ error: "invalid_invite" });
 
     const club_tenant_id = invite.club_tenant_id;
-    const tenants = await adminGet("/tenants");
-    const club = (tenants?.items || []).find((x) => x.tenant_id === club_tenant_id);
+    const tenants = await adminGet("/tenants", `?tenant_id=${encodeURIComponent(club_tenant_id)}`);
+    const club = (tenants?.items || [])[0];
     if (!club || (club.metadata?.type !== "club")) {
       return res.status(400).json({ error: "invalid_club_tenant_id" });
     }
@@ -150,12 +164,12 @@ app.post("/tenants/brand/register", async (req, res) => {
 
 app.get("/tenants", async (_req, res) => {
   try {
-    const out = await adminGet("/tenants");
+    const out = await adminGetAll("/tenants");
     const items = out?.items || [];
     const integrationsByTenant = {};
     await Promise.all(items.map(async (t) => {
       try {
-        const x = await adminGet("/integrations", `?tenant_id=${encodeURIComponent(t.tenant_id)}`);
+        const x = await adminGetAll("/integrations", { tenant_id: t.tenant_id });
         integrationsByTenant[t.tenant_id] = (x?.items || []).reduce((m, r) => {
           m[r.kind] = r.config || {};
           return m;
@@ -180,10 +194,10 @@ app.get("/tenants/:tenant_id/config", async (req, res) => {
   try {
     const scope = requireTenantScope(req, req.params.tenant_id);
     if (!scope.ok) return res.status(scope.code).json({ error: scope.error });
-    const tenants = await adminGet("/tenants");
-    const found = (tenants?.items || []).find((x) => x.tenant_id === req.params.tenant_id);
+    const tenants = await adminGet("/tenants", `?tenant_id=${encodeURIComponent(req.params.tenant_id)}`);
+    const found = (tenants?.items || [])[0];
     if (!found) return res.status(404).json({ error: "tenant_not_found" });
-    const ints = await adminGet("/integrations", `?tenant_id=${encodeURIComponent(req.params.tenant_id)}`);
+    const ints = await adminGetAll("/integrations", { tenant_id: req.params.tenant_id });
     res.json({ ...found, type: found.metadata?.type || "unknown", integrations: ints?.items || [] });
   } catch (e) {
     res.status(500).json({ error: String(e.message || e) });
@@ -207,7 +221,7 @@ app.get("/tenants/:tenant_id/integrations", async (req, res) => {
   try {
     const scope = requireTenantScope(req, req.params.tenant_id);
     if (!scope.ok) return res.status(scope.code).json({ error: scope.error });
-    const out = await adminGet("/integrations", `?tenant_id=${encodeURIComponent(req.params.tenant_id)}`);
+    const out = await adminGetAll("/integrations", { tenant_id: req.params.tenant_id });
     const obj = (out?.items || []).reduce((m, r) => {
       m[r.kind] = r.config || {};
       return m;
@@ -242,7 +256,7 @@ app.get("/tenants/:tenant_id/campaigns", async (req, res) => {
   try {
     const scope = requireTenantScope(req, req.params.tenant_id);
     if (!scope.ok) return res.status(scope.code).json({ error: scope.error });
-    const out = await adminGet("/campaigns", `?tenant_id=${encodeURIComponent(req.params.tenant_id)}`);
+    const out = await adminGetAll("/campaigns", { tenant_id: req.params.tenant_id });
     res.json(out?.items || []);
   } catch (e) {
     res.status(500).json({ error: String(e.message || e) });
@@ -270,7 +284,7 @@ app.get("/tenants/:tenant_id/segments", async (req, res) => {
   try {
     const scope = requireTenantScope(req, req.params.tenant_id);
     if (!scope.ok) return res.status(scope.code).json({ error: scope.error });
-    const out = await adminGet("/segments", `?tenant_id=${encodeURIComponent(req.params.tenant_id)}`);
+    const out = await adminGetAll("/segments", { tenant_id: req.params.tenant_id });
     res.json((out?.items || []).map((x) => ({ ...x, rule: x.definition?.rule || "" })));
   } catch (e) {
     res.status(500).json({ error: String(e.message || e) });
@@ -298,7 +312,7 @@ app.get("/tenants/:tenant_id/creatives", async (req, res) => {
   try {
     const scope = requireTenantScope(req, req.params.tenant_id);
     if (!scope.ok) return res.status(scope.code).json({ error: scope.error });
-    const out = await adminGet("/creatives", `?tenant_id=${encodeURIComponent(req.params.tenant_id)}`);
+    const out = await adminGetAll("/creatives", { tenant_id: req.params.tenant_id });
     res.json((out?.items || []).map((x) => ({ ...x, ...(x.metadata || {}) })));
   } catch (e) {
     res.status(500).json({ error: String(e.message || e) });
@@ -326,7 +340,7 @@ app.get("/tenants/:tenant_id/offers", async (req, res) => {
   try {
     const scope = requireTenantScope(req, req.params.tenant_id);
     if (!scope.ok) return res.status(scope.code).json({ error: scope.error });
-    const out = await adminGet("/offers", `?tenant_id=${encodeURIComponent(req.params.tenant_id)}`);
+    const out = await adminGetAll("/offers", { tenant_id: req.params.tenant_id });
     res.json((out?.items || []).map((x) => ({ ...x, ...(x.metadata || {}) })));
   } catch (e) {
     res.status(500).json({ error: String(e.message || e) });
@@ -335,19 +349,20 @@ app.get("/tenants/:tenant_id/offers", async (req, res) => {
 
 app.get("/marketplace/inventory", async (req, res) => {
   try {
+    const { actorType, actorTenantId, actorClubTenantId } = actorScope(req);
+    if (actorType === "brand" && !actorClubTenantId) {
+      return res.status(400).json({ error: "missing_x_club_tenant_id" });
+    }
+    const owner = actorType === "club" ? actorTenantId : actorType === "brand" ? actorClubTenantId : null;
     const [out, rights] = await Promise.all([
-      adminGet("/tenants"),
-      adminGet("/inventory-access"),
+      adminGetAll("/tenants"),
+      adminGetAll("/inventory-access", owner ? { inventory_owner_id: owner } : {}),
     ]);
     const tenants = out?.items || [];
     const tenantById = tenants.reduce((m, t) => {
       m[t.tenant_id] = t;
       return m;
     }, {});
-    const { actorType, actorTenantId, actorClubTenantId } = actorScope(req);
-    if (actorType === "brand" && !actorClubTenantId) {
-      return res.status(400).json({ error: "missing_x_club_tenant_id" });
-    }
 
     const scopedRights = (rights?.items || []).filter((r) => {
       if (actorType === "platform" || actorType === "operator" || actorType === "anonymous") return true;
@@ -387,8 +402,7 @@ app.post("/rights/inventory-access", async (req, res) => {
 
 app.get("/rights/inventory-access", async (req, res) => {
   try {
-    const query = req.query?.operator_id ? `?operator_id=${encodeURIComponent(req.query.operator_id)}` : "";
-    const out = await adminGet("/inventory-access", query);
+    const out = await adminGetAll("/inventory-access", req.query?.operator_id ? { operator_id: req.query.operator_id } : {});
     res.json(out?.items || []);
   } catch (e) {
     res.status(500).json({ error: String(e.message || e) });
@@ -406,7 +420,7 @@ app.post("/finance/revenue-rules", async (req, res) => {
 
 app.get("/finance/revenue-rules", async (_req, res) => {
   try {
-    const out = await adminGet("/revenue-rules");
+    const out = await adminGetAll("/revenue-rules");
     res.json(out?.items || []);
   } catch (e) {
     res.status(500).json({ error: String(e.message || e) });
@@ -431,6 +445,24 @@ app.post("/finance/settlement/run", async (req, res) => {
   }
 });
 
+app.post("/finance/settlement/finalize", async (req, res) => {
+  try {
+    const { actorType } = actorScope(req);
+    if (!(actorType === "platform" || actorType === "operator" || actorType === "club")) {
+      return res.status(403).json({ error: "settlement_scope_forbidden" });
+    }
+    const date = req.body?.settlement_date;
+    const query = date ? `?settlement_date=${encodeURIComponent(date)}` : "";
+    const r = await fetch(`${OPTIMIZER_ADMIN_URL}/settlement/finalize${query}`, {
+      method: "POST",
+      headers: adminHeaders(),
+    });
+    res.status(r.status).json(await r.json());
+  } catch (e) {
+    res.status(500).json({ error: String(e.message || e) });
+  }
+});
+
 app.get("/finance/settlement/summary", async (req, res) => {
   try {
     const { actorType, actorTenantId } = actorScope(req);
@@ -452,13 +484,21 @@ app.get("/finance/settlement/export", async (req, res) => {
     if (!(actorType === "platform" || actorType === "operator" || actorType === "club")) {
       return res.status(403).json({ error: "settlement_scope_forbidden" });
     }
-    const date = req.query?.settlement_date;
-    const query = date ? `?settlement_date=${encodeURIComponent(date)}` : "";
-    const r = await fetch(`${OPTIMIZER_ADMIN_URL}/settlement/export${query}`, { headers: adminHeaders() });
-    const csv = await r.text();
-    if (!r.ok) throw new Error(csv || `settlement_export_failed:${r.status}`);
-    res.setHeader("content-type", "text/csv");
-    res.send(csv);
+    const params = new URLSearchParams();
+    if (req.query?.settlement_date) params.set("settlement_date", req.query.settlement_date);
+    if (req.query?.format) params.set("format", req.query.format);
+    const query = params.toString() ? `?${params}` : "";
+    const headers = adminHeaders();
+    for (const h of ["if-none-match", "if-modified-since"]) {
+      if (req.headers[h]) headers[h] = req.headers[h];
+    }
+    const r = await fetch(`${OPTIMIZER_ADMIN_URL}/settlement/export${query}`, { headers });
+    if (!r.ok && r.status !== 304) throw new Error((await r.text()) || `settlement_export_failed:${r.status}`);
+    for (const h of ["content-type", "content-disposition", "etag", "last-modified", "cache-control"]) {
+      if (r.headers.get(h)) res.setHeader(h, r.headers.get(h));
+    }
+    if (r.status === 304) return res.status(304).end();
+    Readable.fromWeb(r.body).pipe(res);
   } catch (e) {
     res.status(500).json({ error: String(e.message || e) });
   }
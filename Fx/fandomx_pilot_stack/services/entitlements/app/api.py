@@ -1,14 +1,31 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import os
+
+from .rule_index import RuleIndex
 
 app = FastAPI(title="Fx Entitlements")
 
+ENTITLEMENTS_BATCH_MAX_FANS = int(os.getenv("ENTITLEMENTS_BATCH_MAX_FANS", "20000"))
+ENTITLEMENTS_MAX_RULE_INDEXES = int(os.getenv("ENTITLEMENTS_MAX_RULE_INDEXES", "256"))
+
 class CheckReq(BaseModel):
     tenant_id: str
     fan_id: str
     wallet_address: str
     xp_tier: str = "BRONZE"
 
+class BatchFan(BaseModel):
+    fan_id: str
+    wallet_address: str
+    xp_tier: str = "BRONZE"
+
+class BatchCheckReq(BaseModel):
+    tenant_id: str
+    fans: List[BatchFan]
+
 TIER_RANK = {"BRONZE":1,"SILVER":2,"GOLD":3,"VIP":4}
 def tier_ok(user: str, req: str) -> bool:
     return TIER_RANK.get(user,0) >= TIER_RANK.get(req,0)
@@ -16,6 +33,10 @@ def tier_ok(user: str, req: str) -> bool:
 def get_fxp_balance(_wallet: str) -> int:
     return 1200  # stub chain read
 
+def get_fxp_balances(wallets: List[str]) -> Dict[str, int]:
+    """One read per distinct wallet (a multicall once balances come from chain)."""
+    return {w: get_fxp_balance(w) for w in set(wallets)}
+
 RULES = [
   {"entitlement":"INSIDER_CONTENT","min_fxp":150,"min_tier":"BRONZE"},
   {"entitlement":"GATED_LIVE_CHAT","min_fxp":250,"min_tier":"SILVER"},
@@ -31,3 +52,37 @@ def check(req: CheckReq):
     for r in RULES:
         results.append({**r, "allowed": (bal >= r["min_fxp"]) and tier_ok(req.xp_tier, r["min_tier"])})
     return {"wallet_balance_fxp": bal, "results": results}
+
+# compiled lazily per rule set, not per tenant, so tenant ids from requests can't grow it; every tenant uses RULES
+# today. Keyed by id() with the list held alongside, so the id can't be reused while cached; LRU-capped in case
+# rules_for starts building lists per tenant.
+_indexes: "OrderedDict[int, Tuple[List[dict], RuleIndex]]" = OrderedDict()
+
+def rules_for(_tenant_id: str) -> List[dict]:
+    return RULES
+
+def rule_index(tenant_id: str) -> RuleIndex:
+    rules = rules_for(tenant_id)
+    hit = _indexes.get(id(rules))
+    if hit is not None and hit[0] is rules:
+        _indexes.move_to_end(id(rules))
+        return hit[1]
+    index = RuleIndex(rules, TIER_RANK)
+    _indexes[id(rules)] = (rules, index)
+    if len(_indexes) > ENTITLEMENTS_MAX_RULE_INDEXES:
+        _indexes.popitem(last=False)
+    return index
+
+@app.post("/entitlements/check/batch")
+def check_batch(req: BatchCheckReq):
+    """Allowed entitlements for many fans of one tenant. `mask` bit i is `entitlements[i]`."""
+    if len(req.fans) > ENTITLEMENTS_BATCH_MAX_FANS:
+        raise HTTPException(413, f"at most {ENTITLEMENTS_BATCH_MAX_FANS} fans per batch")
+    index = rule_index(req.tenant_id)
+    balances = get_fxp_balances([f.wallet_address for f in req.fans])
+    results = []
+    for f in req.fans:
+        bal = balances[f.wallet_address]
+        mask = index.mask(bal, f.xp_tier)
+        results.append({"fan_id": f.fan_id, "wallet_balance_fxp": bal, "mask": mask, "allowed": index.names(mask)})
+    return {"entitlements": list(index.entitlements), "results": results}
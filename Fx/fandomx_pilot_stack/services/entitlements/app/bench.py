@@ -0,0 +1,70 @@
+"""Throughput of per-fan /entitlements/check against /entitlements/check/batch.
+
+    python -m app.bench --fans 5000 --batch 1000     # from services/entitlements
+
+`eval` times rule evaluation alone on random balances and tiers: the per-rule loop of /entitlements/check
+against RuleIndex.mask. It also checks that both agree. `http` times the endpoints in-process with FastAPI's
+TestClient, so no network is involved: one call per fan against one call per `--batch` fans.
+"""
+from __future__ import annotations
+import argparse
+import random
+import time
+from typing import List, Optional
+
+from .api import RULES, TIER_RANK, app, rule_index, tier_ok
+
+
+def bench_eval(fans: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    tiers = [*TIER_RANK, "UNKNOWN"]
+    cases = [(rng.randint(0, 3000), rng.choice(tiers)) for _ in range(fans)]
+    index = rule_index("bench")
+
+    t0 = time.perf_counter()
+    loop = [[(bal >= r["min_fxp"]) and tier_ok(tier, r["min_tier"]) for r in RULES] for bal, tier in cases]
+    t1 = time.perf_counter()
+    masks = [index.mask(bal, tier) for bal, tier in cases]
+    t2 = time.perf_counter()
+
+    for allowed, mask in zip(loop, masks):
+        if allowed != [bool(mask >> i & 1) for i in range(len(RULES))]:
+            raise SystemExit("RuleIndex disagrees with the rule loop")
+    return {"rule_loop_per_s": fans / (t1 - t0), "index_per_s": fans / (t2 - t1)}
+
+
+def bench_http(fans: int, batch: int) -> dict:
+    from fastapi.testclient import TestClient
+
+    client = TestClient(app)
+    body = [{"fan_id": f"fan{i}", "wallet_address": f"0xW{i}", "xp_tier": "GOLD"} for i in range(fans)]
+
+    t0 = time.perf_counter()
+    for f in body:
+        client.post("/entitlements/check", json={"tenant_id": "bench", **f}).raise_for_status()
+    t1 = time.perf_counter()
+    for i in range(0, fans, batch):
+        client.post("/entitlements/check/batch", json={"tenant_id": "bench", "fans": body[i:i + batch]}).raise_for_status()
+    t2 = time.perf_counter()
+    return {"single_per_s": fans / (t1 - t0), "batch_per_s": fans / (t2 - t1)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.bench", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--fans", type=int, default=5000)
+    ap.add_argument("--batch", type=int, default=1000)
+    ap.add_argument("--eval-fans", type=int, default=200_000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args(argv)
+
+    e = bench_eval(args.eval_fans, args.seed)
+    print(f"eval  rule loop {e['rule_loop_per_s']:>12,.0f} fans/s   index {e['index_per_s']:>12,.0f} fans/s   "
+          f"x{e['index_per_s'] / e['rule_loop_per_s']:.1f}")
+    h = bench_http(args.fans, args.batch)
+    print(f"http  single    {h['single_per_s']:>12,.0f} fans/s   batch {h['batch_per_s']:>12,.0f} fans/s   "
+          f"x{h['batch_per_s'] / h['single_per_s']:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,34 @@
+"""Entitlement rules compiled into per-tier threshold tables.
+
+For every tier rank, the rules that tier satisfies are sorted by `min_fxp` and turned into a running bitmask, so a
+fan's allowed entitlements are one bisect on their balance. Bit i is `entitlements[i]`, in rule order. The result
+matches evaluating each rule as `balance >= min_fxp and tier_ok(tier, min_tier)`, unknown tiers ranking 0.
+"""
+from __future__ import annotations
+from bisect import bisect_right
+from typing import Dict, List, Sequence, Tuple
+
+
+class RuleIndex:
+    def __init__(self, rules: Sequence[dict], tier_rank: Dict[str, int]):
+        self.entitlements: Tuple[str, ...] = tuple(r["entitlement"] for r in rules)
+        self._rank = dict(tier_rank)
+        # rank -> (min_fxp ascending, mask of the rules met at or above each threshold)
+        self._tables: Dict[int, Tuple[List[int], List[int]]] = {}
+        for rank in {0, *tier_rank.values()}:
+            met = sorted((r["min_fxp"], i) for i, r in enumerate(rules) if tier_rank.get(r["min_tier"], 0) <= rank)
+            masks = [0]
+            for _, i in met:
+                masks.append(masks[-1] | 1 << i)
+            self._tables[rank] = ([m for m, _ in met], masks)
+        self._names: Dict[int, List[str]] = {}
+
+    def mask(self, balance: int, tier: str) -> int:
+        thresholds, masks = self._tables[self._rank.get(tier, 0)]
+        return masks[bisect_right(thresholds, balance)]
+
+    def names(self, mask: int) -> List[str]:
+        names = self._names.get(mask)
+        if names is None:
+            names = self._names[mask] = [e for i, e in enumerate(self.entitlements) if mask >> i & 1]
+        return names
@@ -0,0 +1,78 @@
+export const MOMENT_TYPES = ["team_success", "team_failure", "turning_point", "player_success", "player_failure"];
+
+// Demo generator (replace with warehouse/CDP + creative library)
+export function demoOptimizeInput(momentPayload) {
+  const units = [];
+  const signals = {};
+  const campaigns = ["camp_1"];
+  const channels = ["meta", "dsp", "inapp"];
+  const segments = ["seg_hardcore", "seg_casual"];
+  const momentName = momentPayload?.moment?.type || "team_success";
+
+  for (const ch of channels) {
+    for (const seg of segments) {
+      for (const cr of ["cr_upbeat", "cr_consoling"]) {
+        const inventoryId = ch === "inapp" ? "inv_owned_app" : "inv_gam_home";
+        const inventoryType = ch === "inapp" ? "owned" : "gam";
+        const rightsType = ch === "inapp" ? "owned" : "licensed";
+        const u = {
+          channel: ch,
+          campaign_id: campaigns[0],
+          segment_id: seg,
+          moment: momentName,
+          creative_id: cr,
+          offer_id: "off_merch",
+          inventory_id: inventoryId,
+          inventory_type: inventoryType,
+          operator_id: "broadcaster_demo",
+          inventory_owner_id: "club_demo",
+          rights_type: rightsType,
+          placement_ref: ch === "inapp" ? "slot_home_hero" : "gam_home_1",
+          format_compatible: true,
+          category_allowed: true,
+        };
+        units.push(u);
+        const key = `${u.channel}|${u.campaign_id}|${u.segment_id}|${u.moment}|${u.creative_id}|${u.offer_id}|${u.inventory_id}`;
+
+        const p_action = seg === "seg_hardcore" ? 0.08 : 0.04;
+        const expected_cost_per_action = ch === "inapp" ? 20.0 : ch === "meta" ? 45.0 : 55.0;
+        signals[key] = {
+          p_action,
+          ltv_uplift: seg === "seg_hardcore" ? 2200.0 : 1200.0,
+          margin_rate: 0.35,
+          expected_cost_per_action,
+          max_spend: 30000,
+          fatigue_score: cr === "cr_upbeat" ? 0.2 : 0.1,
+          freq_cap_ok: true,
+          brand_safe: true,
+          eligible: true,
+          incrementality: 1.0,
+        };
+      }
+    }
+  }
+
+  const moment_multipliers = { [momentName]: momentName === "team_success" ? 1.6 : 1.2 };
+
+  return {
+    total_budget: 100000,
+    exploration_ratio: 0.08,
+    units,
+    signals,
+    operator_id: "broadcaster_demo",
+    channel_min: { inapp: 10000 },
+    channel_max: { dsp: 45000 },
+    campaign_min: {},
+    campaign_max: {},
+    moment_multipliers,
+    previous_allocations: {},
+    moment_spike_active: ["team_success", "turning_point"].includes(momentName),
+  };
+}
+
+// POST /moment-plans body: the demo input with a multiplier for every moment type the optimizer should precompute
+export function momentPlanTemplate() {
+  const moment_multipliers = {};
+  MOMENT_TYPES.forEach((m) => (moment_multipliers[m] = m === "team_success" ? 1.6 : 1.2));
+  return { ...demoOptimizeInput({}), moment_multipliers, moment_types: MOMENT_TYPES };
+}
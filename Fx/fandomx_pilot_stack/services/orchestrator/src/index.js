@@ -1,7 +1,9 @@
 import express from "express";
 import { v4 as uuid } from "uuid";
+import { demoOptimizeInput, momentPlanTemplate } from "./demo.js";
 
 const OPTIMIZER_URL = process.env.OPTIMIZER_URL || "http://optimizer:8000/optimize";
+const OPTIMIZER_BASE_URL = OPTIMIZER_URL.replace(/\/optimize$/, "");
 
 const app = express();
 app.use(express.json());
@@ -41,6 +43,42 @@ async function callOptimizer(payload) {
   return r.json();
 }
 
+// Precomputed plan lookup; returns null when the optimizer has no plan so the caller can fall back to /optimize.
+async function callMomentPlan(optimizeInput, momentType) {
+  const r = await fetch(`${OPTIMIZER_BASE_URL}/moments/detected`, {
+    method: "POST",
+    headers: { "content-type": "application/json" },
+    body: JSON.stringify({
+      moment_type: momentType,
+      operator_id: optimizeInput.operator_id,
+      moment_spike_active: optimizeInput.moment_spike_active,
+    }),
+  });
+  if (r.status === 404) return null;
+  if (!r.ok) throw new Error(`Optimizer moment plan error: ${r.status} ${await r.text()}`);
+  return r.json();
+}
+
+async function registerMomentPlans() {
+  const r = await fetch(`${OPTIMIZER_BASE_URL}/moment-plans`, {
+    method: "POST",
+    headers: { "content-type": "application/json" },
+    body: JSON.stringify(momentPlanTemplate()),
+  });
+  if (!r.ok) throw new Error(`Optimizer moment plan registration error: ${r.status} ${await r.text()}`);
+  return r.json();
+}
+
+// The optimizer may still be starting; misses fall back to /optimize until this lands.
+function registerMomentPlansWithRetry(delayMs = 1000) {
+  registerMomentPlans()
+    .then((out) => console.log("Registered moment plans:", (out.items || []).length))
+    .catch((e) => {
+      console.error(`moment plan registration failed, retrying in ${delayMs} ms:`, e.message);
+      setTimeout(() => registerMomentPlansWithRetry(Math.min(delayMs * 2, 60000)), delayMs);
+    });
+}
+
 function toArrayAllocations(optOut) {
   const rows = [];
   const alloc = optOut?.allocations || {};
@@ -65,80 +103,15 @@ function toArrayAllocations(optOut) {
   return rows;
 }
 
-// Demo generator (replace with warehouse/CDP + creative library)
-function demoOptimizeInput(momentPayload) {
-  const units = [];
-  const signals = {};
-  const campaigns = ["camp_1"];
-  const channels = ["meta", "dsp", "inapp"];
-  const segments = ["seg_hardcore", "seg_casual"];
-  const momentName = momentPayload?.moment?.type || "team_success";
-
-  for (const ch of channels) {
-    for (const seg of segments) {
-      for (const cr of ["cr_upbeat", "cr_consoling"]) {
-        const inventoryId = ch === "inapp" ? "inv_owned_app" : "inv_gam_home";
-        const inventoryType = ch === "inapp" ? "owned" : "gam";
-        const rightsType = ch === "inapp" ? "owned" : "licensed";
-        const u = {
-          channel: ch,
-          campaign_id: campaigns[0],
-          segment_id: seg,
-          moment: momentName,
-          creative_id: cr,
-          offer_id: "off_merch",
-          inventory_id: inventoryId,
-          inventory_type: inventoryType,
-          operator_id: "broadcaster_demo",
-          inventory_owner_id: "club_demo",
-          rights_type: rightsType,
-          placement_ref: ch === "inapp" ? "slot_home_hero" : "gam_home_1",
-          format_compatible: true,
-          category_allowed: true,
-        };
-        units.push(u);
-        const key = `${u.channel}|${u.campaign_id}|${u.segment_id}|${u.moment}|${u.creative_id}|${u.offer_id}|${u.inventory_id}`;
-
-        const p_action = seg === "seg_hardcore" ? 0.08 : 0.04;
-        const expected_cost_per_action = ch === "inapp" ? 20.0 : ch === "meta" ? 45.0 : 55.0;
-        signals[key] = {
-          p_action,
-          ltv_uplift: seg === "seg_hardcore" ? 2200.0 : 1200.0,
-          margin_rate: 0.35,
-          expected_cost_per_action,
-          max_spend: 30000,
-          fatigue_score: cr === "cr_upbeat" ? 0.2 : 0.1,
-          freq_cap_ok: true,
-          brand_safe: true,
-          eligible: true,
-          incrementality: 1.0,
-        };
-      }
-    }
-  }
-
-  const moment_multipliers = { [momentName]: momentName === "team_success" ? 1.6 : 1.2 };
-
-  return {
-    total_budget: 100000,
-    exploration_ratio: 0.08,
-    units,
-    signals,
-    operator_id: "broadcaster_demo",
-    channel_min: { inapp: 10000 },
-    channel_max: { dsp: 45000 },
-    campaign_min: {},
-    campaign_max: {},
-    moment_multipliers,
-    previous_allocations: {},
-    moment_spike_active: ["team_success", "turning_point"].includes(momentName),
-  };
-}
-
 subscribe("moment.detected", async (evt) => {
   try {
     const optimizeInput = demoOptimizeInput(evt.payload);
-    const out = await callOptimizer(optimizeInput);
+    const momentType = evt.payload?.moment?.type || "team_success";
+    const planned = await callMomentPlan(optimizeInput, momentType).catch((e) => {
+      console.error("moment plan lookup failed:", e);
+      return null;
+    });
+    const out = planned || (await callOptimizer(optimizeInput));
 
     const allocations = toArrayAllocations(out);
     const allocEvt = {
@@ -183,4 +156,7 @@ let lastBids = null;
 app.get("/latest/allocation", (_req, res) => res.json(lastAlloc || {}));
 app.get("/latest/bids", (_req, res) => res.json(lastBids || {}));
 
-app.listen(8090, () => console.log("orchestrator on :8090"));
+app.listen(8090, () => {
+  console.log("orchestrator on :8090");
+  registerMomentPlansWithRetry();
+});
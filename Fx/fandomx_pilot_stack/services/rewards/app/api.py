@@ -1,14 +1,42 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, List
+import os
+import time
+
+from .daily_caps import DailyCaps
+from .idempotency import IdempotencyStore
+from .metrics import ACTIVITY_REJECTED_TOTAL, render_prometheus
+from .mint_queue import MintQueue, SettlementScheduler
+from .store import open_store
 
 app = FastAPI(title="Fx Rewards")
 
-# In-memory (replace with DB + chain settlement worker)
-seen = set()
-daily = {}
-queue = []
+# memory | sqlite:///path.db | postgresql://...; the SQLite file is shared by workers on one host
+REWARDS_DB_URL = os.getenv("REWARDS_DB_URL", "sqlite:///rewards.db")
+# Postgres connections per worker; SQLite uses one
+REWARDS_DB_POOL_SIZE = int(os.getenv("REWARDS_DB_POOL_SIZE", "4"))
+# an idempotency_key replayed within this window is ignored
+REWARDS_IDEMPOTENCY_TTL_SEC = float(os.getenv("REWARDS_IDEMPOTENCY_TTL_SEC", str(7 * 86400)))
+# most recently claimed keys answered from memory; older ones go to the durable store
+REWARDS_IDEMPOTENCY_MEMORY_KEYS = int(os.getenv("REWARDS_IDEMPOTENCY_MEMORY_KEYS", "100000"))
+REWARDS_BATCH_MAX_EVENTS = int(os.getenv("REWARDS_BATCH_MAX_EVENTS", "10000"))
+# background settlement tick; 0 leaves settlement to POST /rewards/settle
+REWARDS_SETTLE_INTERVAL_SEC = float(os.getenv("REWARDS_SETTLE_INTERVAL_SEC", "1"))
+REWARDS_SETTLE_MIN_BATCH = int(os.getenv("REWARDS_SETTLE_MIN_BATCH", "50"))
+REWARDS_SETTLE_MAX_BATCH = int(os.getenv("REWARDS_SETTLE_MAX_BATCH", "5000"))
+# batch size aims to clear the current backlog in this many ticks
+REWARDS_SETTLE_DRAIN_TICKS = int(os.getenv("REWARDS_SETTLE_DRAIN_TICKS", "10"))
+REWARDS_SETTLE_LEASE_SEC = float(os.getenv("REWARDS_SETTLE_LEASE_SEC", "60"))
+# activity is refused with 429 while this many mints are unsettled
+REWARDS_MAX_BACKLOG = int(os.getenv("REWARDS_MAX_BACKLOG", "200000"))
+# UTC days of cap counters kept, today included; events dated earlier earn nothing
+REWARDS_CAP_RETENTION_DAYS = int(os.getenv("REWARDS_CAP_RETENTION_DAYS", "3"))
+
+store = open_store(REWARDS_DB_URL, REWARDS_DB_POOL_SIZE)
+seen = IdempotencyStore(store, REWARDS_IDEMPOTENCY_TTL_SEC, REWARDS_IDEMPOTENCY_MEMORY_KEYS)
+caps = DailyCaps(REWARDS_CAP_RETENTION_DAYS)
 
 class ActivityEvent(BaseModel):
     tenant_id: str
@@ -18,6 +46,9 @@ class ActivityEvent(BaseModel):
     metadata: Dict[str, Any]
     idempotency_key: str
 
+class ActivityBatch(BaseModel):
+    events: List[ActivityEvent]
+
 RULES = {
     "watch_minutes":    {"points_per_unit":2,"unit_key":"minutes","cap_per_day":120},
     "content_complete": {"points_per_unit":15,"unit_key":"count","cap_per_day":60},
@@ -29,41 +60,150 @@ RULES = {
     "event_attendance": {"points_per_unit":150,"unit_key":"count","cap_per_day":150},
 }
 
-def daykey():
-    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+def submit_mint(wallet: str, points: int, event_ids: List[str]) -> str:
+    """Simulated chain submission: one mint per wallet per settlement batch."""
+    return f"0xSIM_{event_ids[0]}" if len(event_ids) == 1 else f"0xSIM_{event_ids[0]}+{len(event_ids) - 1}"
+
+mints = SettlementScheduler(
+    MintQueue(store),
+    submit_mint,
+    min_batch=REWARDS_SETTLE_MIN_BATCH,
+    max_batch=REWARDS_SETTLE_MAX_BATCH,
+    drain_ticks=REWARDS_SETTLE_DRAIN_TICKS,
+    lease_sec=REWARDS_SETTLE_LEASE_SEC,
+)
+
+@app.on_event("startup")
+def startup_idempotency_purge():
+    seen.start()
+
+@app.on_event("startup")
+def startup_settlement():
+    if REWARDS_SETTLE_INTERVAL_SEC > 0:
+        mints.start(interval_sec=REWARDS_SETTLE_INTERVAL_SEC)
+
+def check_backlog():
+    backlog = mints.backlog()
+    if backlog["pending"] + backlog["inflight"] >= REWARDS_MAX_BACKLOG:
+        ACTIVITY_REJECTED_TOTAL.inc(("backlog",))
+        raise HTTPException(429, "mint backlog is full; retry later", headers={"Retry-After": "5"})
 
 def get_wallet(tenant_id: str, fan_id: str) -> str:
     return f"0xCUSTODIAL_{tenant_id}_{fan_id}"
 
-@app.post("/rewards/activity")
-def activity(evt: ActivityEvent):
-    if evt.idempotency_key in seen:
-        return {"status":"duplicate_ignored"}
-    seen.add(evt.idempotency_key)
+def event_time(evt: ActivityEvent) -> datetime:
+    ts = datetime.fromisoformat(evt.timestamp_utc)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
 
+def event_day(ts: datetime) -> int:
+    """The UTC day an event counts toward, as a date ordinal."""
+    return ts.astimezone(timezone.utc).date().toordinal()
+
+def raw_points(evt: ActivityEvent):
+    """Uncapped points for the event, or None when no rule covers its activity type."""
     r = RULES.get(evt.activity_type)
     if not r:
-        return {"status":"no_award","reason":"no_rule"}
-
+        return None
     units = int(evt.metadata.get(r["unit_key"], 0) or evt.metadata.get("count", 1) or 1)
-    raw = int(r["points_per_unit"] * units)
+    return int(r["points_per_unit"] * units)
 
-    dk = (evt.tenant_id, evt.fan_id, daykey())
-    earned = daily.get(dk, 0)
-    remaining = max(0, int(r["cap_per_day"]) - earned)
-    pts = max(0, min(raw, remaining))
+def award(evt: ActivityEvent, raw, day: int, minted: list) -> Dict[str, Any]:
+    """Applies the fan's daily cap for `day` to an event whose idempotency key was just claimed."""
+    if raw is None:
+        return {"status":"no_award","reason":"no_rule"}
+    r = RULES[evt.activity_type]
 
+    pts = caps.take(evt.tenant_id, evt.fan_id, day, raw, int(r["cap_per_day"]))
+    if pts is None:
+        return {"status":"no_award","reason":"outside_cap_window"}
     if pts <= 0:
         return {"status":"no_award","reason":"cap_reached_or_zero"}
 
-    daily[dk] = earned + pts
     wallet = get_wallet(evt.tenant_id, evt.fan_id)
-    queue.append({"wallet": wallet, "points": pts, "id": evt.idempotency_key})
+    minted.append((wallet, pts, evt.idempotency_key))
     return {"status":"queued_for_mint","points": pts, "wallet_address": wallet}
 
+def ingest(events: List[ActivityEvent], raws: list, days: List[int]) -> List[Dict[str, Any]]:
+    """Claims, awards and enqueues events in the given order. Claims and mints commit in one transaction, so an
+    event is either fully recorded or can be retried as new; caps taken by a rolled-back batch are given back."""
+    now = time.time()
+    keys = [evt.idempotency_key for evt in events]
+    minted = []
+    taken = []
+    results: List[Dict[str, Any]] = []
+    try:
+        with store.transaction() as cur:
+            fresh = seen.claim_in(cur, keys, now)
+            for evt, raw, day, ok in zip(events, raws, days, fresh):
+                if not ok:
+                    results.append({"status":"duplicate_ignored"})
+                    continue
+                result = award(evt, raw, day, minted)
+                if "points" in result:
+                    taken.append((evt.tenant_id, evt.fan_id, day, result["points"]))
+                results.append(result)
+            mints.queue.append(cur, minted, now)
+    except BaseException:
+        for t in taken:
+            caps.give_back(*t)
+        raise
+    seen.remember([k for k, ok in zip(keys, fresh) if ok], now)
+    mints.enqueued(len(minted))
+    return results
+
+@app.post("/rewards/activity")
+def activity(evt: ActivityEvent):
+    check_backlog()
+    try:
+        day = event_day(event_time(evt))
+    except ValueError:
+        raise HTTPException(422, "timestamp_utc is not an ISO-8601 timestamp")
+    try:
+        raw = raw_points(evt)
+    except (TypeError, ValueError):
+        raise HTTPException(422, "metadata has a non-numeric unit value")
+    return ingest([evt], [raw], [day])[0]
+
+@app.post("/rewards/activity/batch")
+def activity_batch(batch: ActivityBatch):
+    """Results are in request order and match posting the events one by one in timestamp order (ties keep request
+    order): the earliest copy of a repeated idempotency_key wins, and daily caps fill in that order."""
+    events = batch.events
+    if len(events) > REWARDS_BATCH_MAX_EVENTS:
+        raise HTTPException(413, f"at most {REWARDS_BATCH_MAX_EVENTS} events per batch")
+    # everything that can reject an event runs before any key is claimed or cap is spent
+    times, raws = [], []
+    for i, evt in enumerate(events):
+        try:
+            times.append(event_time(evt))
+        except ValueError:
+            raise HTTPException(422, f"events[{i}].timestamp_utc is not an ISO-8601 timestamp")
+        try:
+            raws.append(raw_points(evt))
+        except (TypeError, ValueError):
+            raise HTTPException(422, f"events[{i}].metadata has a non-numeric unit value")
+    check_backlog()
+    order = sorted(range(len(events)), key=times.__getitem__)
+    ordered = ingest([events[i] for i in order], [raws[i] for i in order], [event_day(times[i]) for i in order])
+
+    results: List[Dict[str, Any]] = [None] * len(events)
+    for i, result in zip(order, ordered):
+        results[i] = result
+    queued = [r for r in ordered if r["status"] == "queued_for_mint"]
+    return {"count": len(results), "queued": len(queued), "points": sum(r["points"] for r in queued), "results": results}
+
 @app.post("/rewards/settle")
 def settle(max_batch: int = 50):
-    batch = queue[:max_batch]
-    del queue[:max_batch]
-    receipts = [{"tx_hash": f"0xSIM_{b['id']}", **b} for b in batch]
-    return {"status":"submitted","count": len(receipts), "receipts": receipts}
+    """Settles one batch now, alongside the background scheduler. Receipts are per wallet."""
+    r = mints.settle_once(max_batch=max(1, max_batch))
+    return {"status":"submitted","count": r["count"], "receipts": r["receipts"]}
+
+@app.get("/rewards/queue")
+def queue_status():
+    backlog = mints.backlog(refresh=True)
+    return {**backlog, "batch_size": mints.batch_size(backlog["pending"]), "max_backlog": REWARDS_MAX_BACKLOG}
+
+@app.get("/metrics")
+def metrics():
+    mints.backlog()
+    return Response(content=render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,119 @@
+"""Points earned per fan per UTC day, for the daily caps.
+
+Fan ids are interned to small integers per tenant, and each (tenant, day) keeps one int32 array indexed by them.
+Only days in the window [today - retention_days + 1, today + 1] are kept; `today` is the server's UTC day, and the
+extra day absorbs client clocks running a little ahead. When the server day rolls over, days that left the window
+are dropped, and fans with no activity in the window give their index back for reuse. Memory therefore follows the
+fans active in the window, not everyone ever seen.
+"""
+from __future__ import annotations
+import threading
+import time
+from array import array
+from datetime import date
+from typing import Dict, List, Optional
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def utc_today() -> int:
+    """Today's UTC date as a proleptic ordinal (`date.toordinal()`)."""
+    return _EPOCH_ORDINAL + int(time.time() // 86400)
+
+
+def _zeros(n: int) -> array:
+    return array("i", bytes(4 * n))
+
+
+class _Tenant:
+    __slots__ = ("ids", "names", "last_day", "free", "days")
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[Optional[str]] = []
+        # latest day each index earned on; decides when it can be released
+        self.last_day = array("i")
+        self.free: List[int] = []
+        self.days: Dict[int, array] = {}
+
+    def intern(self, fan_id: str, day: int) -> int:
+        i = self.ids.get(fan_id)
+        if i is None:
+            if self.free:
+                i = self.free.pop()
+                self.names[i] = fan_id
+                self.last_day[i] = day
+            else:
+                i = len(self.names)
+                self.names.append(fan_id)
+                self.last_day.append(day)
+            self.ids[fan_id] = i
+        elif self.last_day[i] < day:
+            self.last_day[i] = day
+        return i
+
+    def roll(self, first_day: int) -> None:
+        for d in [d for d in self.days if d < first_day]:
+            del self.days[d]
+        # a released index has earned nothing on any kept day, so its slots are already zero for the next owner
+        for i, name in enumerate(self.names):
+            if name is not None and self.last_day[i] < first_day:
+                del self.ids[name]
+                self.names[i] = None
+                self.free.append(i)
+
+
+class DailyCaps:
+    def __init__(self, retention_days: int = 3):
+        self.retention_days = max(1, retention_days)
+        self._tenants: Dict[str, _Tenant] = {}
+        self._today = 0
+        self._lock = threading.Lock()
+
+    def take(self, tenant_id: str, fan_id: str, day: int, points: int, cap: int, today: Optional[int] = None) -> Optional[int]:
+        """Grants up to `points` toward the fan's `cap` for `day` and records them. Returns the points granted, or
+        None when `day` is outside the kept window."""
+        today = utc_today() if today is None else today
+        with self._lock:
+            if today != self._today:
+                self._roll(today)
+            if not today - self.retention_days < day <= today + 1:
+                return None
+            t = self._tenants.get(tenant_id)
+            if t is None:
+                t = self._tenants[tenant_id] = _Tenant()
+            i = t.intern(fan_id, day)
+            earned = t.days.get(day)
+            if earned is None:
+                earned = t.days[day] = _zeros(len(t.names))
+            elif i >= len(earned):
+                earned.extend(_zeros(len(t.names) - len(earned)))
+            granted = max(0, min(points, cap - earned[i]))
+            earned[i] += granted
+            return granted
+
+    def give_back(self, tenant_id: str, fan_id: str, day: int, points: int) -> None:
+        """Undoes a take() whose event did not commit."""
+        with self._lock:
+            t = self._tenants.get(tenant_id)
+            i = t.ids.get(fan_id) if t else None
+            earned = t.days.get(day) if t else None
+            if i is not None and earned is not None and i < len(earned):
+                earned[i] = max(0, earned[i] - points)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "tenants": len(self._tenants),
+                "fans": sum(len(t.ids) for t in self._tenants.values()),
+                "days": sum(len(t.days) for t in self._tenants.values()),
+            }
+
+    def _roll(self, today: int) -> None:
+        first_day = today - self.retention_days + 1
+        for tenant_id in list(self._tenants):
+            t = self._tenants[tenant_id]
+            t.roll(first_day)
+            if not t.ids:
+                del self._tenants[tenant_id]
+        self._today = today
@@ -0,0 +1,134 @@
+"""Idempotency keys for reward events: a bounded in-memory tier in front of the durable store.
+
+A key is claimed the first time it is seen within the TTL window; a repeat is a duplicate.
+Recently claimed keys are kept in memory, grouped into claim-time buckets, so retry bursts are answered without I/O. Every first sighting is an
+atomic upsert in the store, which is what makes dedupe survive restarts and hold across workers sharing it.
+`claim_in()` runs inside a caller's transaction, so the claim commits together with whatever the event produced.
+Memory is capped at `memory_keys`. Past that, the oldest bucket is dropped early and its keys are still caught by the
+store, so memory stays flat however long the season runs.
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+_DDL = {
+    "sqlite": [
+        "CREATE TABLE IF NOT EXISTS idempotency_keys (key TEXT PRIMARY KEY, seen_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_idempotency_seen ON idempotency_keys(seen_at)",
+    ],
+    "postgres": [
+        "CREATE TABLE IF NOT EXISTS rewards_idempotency_keys (key TEXT PRIMARY KEY, seen_at DOUBLE PRECISION NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_rewards_idempotency_seen ON rewards_idempotency_keys(seen_at)",
+    ],
+}
+
+
+class IdempotencyStore:
+    def __init__(
+        self,
+        store,
+        ttl_sec: float,
+        memory_keys: int = 100_000,
+        bucket_sec: float = 60.0,
+        purge_batch: int = 5000,
+    ):
+        self.store = store
+        self.ttl_sec = ttl_sec
+        self.memory_keys = memory_keys
+        self.bucket_sec = min(bucket_sec, ttl_sec)
+        self.purge_batch = purge_batch
+        self._at: Dict[str, float] = {}
+        # keys by claim-time bucket, oldest first; eviction drops whole buckets
+        self._buckets: Deque[Tuple[float, List[str]]] = deque()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        t = store.table("idempotency_keys")
+        # inserts a new key, re-claims one whose window expired, and leaves a live one alone (0 rows changed)
+        self._claim_sql = store.sql(
+            f"""INSERT INTO {t} (key, seen_at) VALUES (?, ?)
+                ON CONFLICT (key) DO UPDATE SET seen_at = EXCLUDED.seen_at WHERE {t}.seen_at < ?"""
+        )
+        self._purge_sql = store.sql(f"DELETE FROM {t} WHERE key IN (SELECT key FROM {t} WHERE seen_at < ? LIMIT ?)")
+        with store.transaction() as cur:
+            for ddl in _DDL[store.dialect]:
+                cur.execute(ddl)
+
+    def claim_in(self, cur: Any, keys: List[str], now: float) -> List[bool]:
+        """Claims each key in order inside the caller's transaction; a key repeated in `keys` is claimed only the
+        first time. Call remember() with the claimed keys once the transaction has committed."""
+        out: List[bool] = []
+        with self._lock:
+            self._evict(now)
+            live = [k in self._at and self._at[k] >= now - self.ttl_sec for k in keys]
+        for k, hit in zip(keys, live):
+            if hit:
+                out.append(False)
+            else:
+                cur.execute(self._claim_sql, (k, now, now - self.ttl_sec))
+                out.append(cur.rowcount == 1)
+        return out
+
+    def remember(self, keys: List[str], now: float) -> None:
+        with self._lock:
+            for k in keys:
+                self._remember(k, now)
+
+    def claim_many(self, keys: List[str], now: Optional[float] = None) -> List[bool]:
+        """claim_in() in a transaction of its own."""
+        now = time.time() if now is None else now
+        with self.store.transaction() as cur:
+            out = self.claim_in(cur, keys, now)
+        self.remember([k for k, ok in zip(keys, out) if ok], now)
+        return out
+
+    def claim(self, key: str, now: Optional[float] = None) -> bool:
+        return self.claim_many([key], now)[0]
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Deletes expired keys from the store in batches, so claims interleave with a large backlog."""
+        cutoff = (time.time() if now is None else now) - self.ttl_sec
+        total = 0
+        while True:
+            with self.store.transaction() as cur:
+                cur.execute(self._purge_sql, (cutoff, self.purge_batch))
+                n = cur.rowcount
+            total += n
+            if n < self.purge_batch:
+                return total
+
+    def start(self, interval_sec: float = 60.0) -> None:
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.purge_expired()
+                except Exception as e:  # dedupe is unaffected; the next pass catches up
+                    print("idempotency purge failed:", e)
+                time.sleep(interval_sec)
+
+        self._thread = threading.Thread(target=loop, name="idempotency-purger", daemon=True)
+        self._thread.start()
+
+    def memory_size(self) -> int:
+        return len(self._at)
+
+    def _evict(self, now: float) -> None:
+        cutoff = now - self.ttl_sec
+        while self._buckets and (self._buckets[0][0] + self.bucket_sec < cutoff or len(self._at) > self.memory_keys):
+            start, keys = self._buckets.popleft()
+            for k in keys:
+                # a key re-claimed later lives on in a newer bucket
+                if self._at.get(k, float("inf")) < start + self.bucket_sec:
+                    del self._at[k]
+
+    def _remember(self, key: str, now: float) -> None:
+        start = now - now % self.bucket_sec
+        if not self._buckets or self._buckets[-1][0] < start:
+            self._buckets.append((start, []))
+        self._buckets[-1][1].append(key)
+        self._at[key] = now
@@ -0,0 +1,69 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple
+import threading
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...] = (), value: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, v in sorted(values.items()):
+            out.append(f"{self.name}{_labels(self.label_names, labels)} {v:g}")
+        return out
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, labels: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+MINTS_ENQUEUED_TOTAL = Counter("fx_rewards_mints_enqueued_total", "Mints appended to the durable queue.")
+MINTS_SETTLED_TOTAL = Counter("fx_rewards_mints_settled_total", "Mints acknowledged by settlement.")
+POINTS_SETTLED_TOTAL = Counter("fx_rewards_points_settled_total", "Points in acknowledged mints.")
+SETTLE_TX_TOTAL = Counter("fx_rewards_settle_tx_total", "Per-wallet settlement submissions, by result.", ("result",))
+SETTLE_BATCHES_TOTAL = Counter("fx_rewards_settle_batches_total", "Settlement batches leased.")
+SETTLE_SECONDS_TOTAL = Counter("fx_rewards_settle_seconds_total", "Wall time spent settling batches.")
+MINT_BACKLOG = Gauge("fx_rewards_mint_backlog", "Unsettled mints at the last backlog check, by state.", ("state",))
+SETTLE_BATCH_SIZE = Gauge("fx_rewards_settle_batch_size", "Batch size chosen from the backlog at the last tick.")
+ACTIVITY_REJECTED_TOTAL = Counter("fx_rewards_activity_rejected_total", "Activity requests refused, by reason.", ("reason",))
+
+REGISTRY = [
+    MINTS_ENQUEUED_TOTAL,
+    MINTS_SETTLED_TOTAL,
+    POINTS_SETTLED_TOTAL,
+    SETTLE_TX_TOTAL,
+    SETTLE_BATCHES_TOTAL,
+    SETTLE_SECONDS_TOTAL,
+    MINT_BACKLOG,
+    SETTLE_BATCH_SIZE,
+    ACTIVITY_REJECTED_TOTAL,
+]
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,282 @@
+"""Durable mint queue for rewards and the scheduler that settles it.
+
+Awarded mints are appended to a queue table in the rewards store, in the same transaction that claimed the event's
+idempotency key. The settlement scheduler leases the oldest open rows, submits one mint per wallet and acks each
+wallet's rows as soon as its submit returns, so each row moves pending -> inflight -> acked. Concurrent workers never
+lease the same row twice, and a lease is renewed while its batch is being worked through.
+
+Delivery is at-least-once. A lease that is not renewed or acked within `lease_sec` (worker crash, a submit that hangs)
+puts its rows back on the queue, and they are submitted again. `submit` receives the rows' event ids, which are
+stable across attempts, and must treat an event id it has already minted as done.
+"""
+from __future__ import annotations
+import math
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .metrics import (
+    MINT_BACKLOG,
+    MINTS_ENQUEUED_TOTAL,
+    MINTS_SETTLED_TOTAL,
+    POINTS_SETTLED_TOTAL,
+    SETTLE_BATCH_SIZE,
+    SETTLE_BATCHES_TOTAL,
+    SETTLE_SECONDS_TOTAL,
+    SETTLE_TX_TOTAL,
+)
+
+# (wallet, points, event_id)
+Mint = Tuple[str, int, str]
+# (id, wallet, points, event_id)
+Leased = Tuple[int, str, int, str]
+
+_DDL = {
+    "sqlite": [
+        """CREATE TABLE IF NOT EXISTS mint_queue (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               wallet TEXT NOT NULL,
+               points INTEGER NOT NULL,
+               event_id TEXT NOT NULL,
+               state TEXT NOT NULL DEFAULT 'pending',
+               available_at REAL NOT NULL,
+               lease_id TEXT,
+               attempts INTEGER NOT NULL DEFAULT 0,
+               tx_hash TEXT,
+               created_at REAL NOT NULL,
+               acked_at REAL)""",
+        # open rows in queue order; acked rows drop out of it
+        "CREATE INDEX IF NOT EXISTS idx_mint_queue_open ON mint_queue(id, available_at) WHERE state <> 'acked'",
+        "CREATE INDEX IF NOT EXISTS idx_mint_queue_lease ON mint_queue(lease_id) WHERE state = 'inflight'",
+        "CREATE INDEX IF NOT EXISTS idx_mint_queue_acked ON mint_queue(acked_at) WHERE state = 'acked'",
+    ],
+    "postgres": [
+        """CREATE TABLE IF NOT EXISTS rewards_mint_queue (
+               id BIGSERIAL PRIMARY KEY,
+               wallet TEXT NOT NULL,
+               points BIGINT NOT NULL,
+               event_id TEXT NOT NULL,
+               state TEXT NOT NULL DEFAULT 'pending',
+               available_at DOUBLE PRECISION NOT NULL,
+               lease_id TEXT,
+               attempts INT NOT NULL DEFAULT 0,
+               tx_hash TEXT,
+               created_at DOUBLE PRECISION NOT NULL,
+               acked_at DOUBLE PRECISION)""",
+        "CREATE INDEX IF NOT EXISTS idx_rewards_mint_queue_open ON rewards_mint_queue(id, available_at) WHERE state <> 'acked'",
+        "CREATE INDEX IF NOT EXISTS idx_rewards_mint_queue_lease ON rewards_mint_queue(lease_id) WHERE state = 'inflight'",
+        "CREATE INDEX IF NOT EXISTS idx_rewards_mint_queue_acked ON rewards_mint_queue(acked_at) WHERE state = 'acked'",
+    ],
+}
+
+
+class MintQueue:
+    """The queue table. Every method but append() runs its own transaction."""
+
+    def __init__(self, store):
+        self.store = store
+        self.t = store.table("mint_queue")
+        with store.transaction() as cur:
+            for ddl in _DDL[store.dialect]:
+                cur.execute(ddl)
+
+    def append(self, cur: Any, mints: List[Mint], now: float) -> None:
+        """Appends inside the caller's transaction."""
+        if mints:
+            cur.executemany(
+                self.store.sql(f"INSERT INTO {self.t} (wallet, points, event_id, available_at, created_at) VALUES (?, ?, ?, ?, ?)"),
+                [(w, p, e, now, now) for w, p, e in mints],
+            )
+
+    def lease(self, limit: int, now: float, lease_sec: float) -> Tuple[str, List[Leased]]:
+        lease_id = uuid.uuid4().hex
+        # SQLite serializes writers, so only Postgres needs SKIP LOCKED to keep workers off each other's rows
+        lock = " FOR UPDATE SKIP LOCKED" if self.store.dialect == "postgres" else ""
+        with self.store.transaction() as cur:
+            cur.execute(
+                self.store.sql(
+                    f"""UPDATE {self.t} SET state = 'inflight', lease_id = ?, available_at = ?, attempts = attempts + 1
+                        WHERE id IN (SELECT id FROM {self.t} WHERE state <> 'acked' AND available_at <= ?
+                                     ORDER BY id LIMIT ?{lock})
+                        RETURNING id, wallet, points, event_id"""
+                ),
+                (lease_id, now + lease_sec, now, limit),
+            )
+            rows = cur.fetchall()
+        return lease_id, sorted(tuple(r) for r in rows)
+
+    def renew(self, lease_id: str, until: float) -> set:
+        """Extends the lease on its rows that are still in flight. Returns the ids still held."""
+        with self.store.transaction() as cur:
+            cur.execute(
+                self.store.sql(f"UPDATE {self.t} SET available_at = ? WHERE lease_id = ? AND state = 'inflight' RETURNING id"),
+                (until, lease_id),
+            )
+            return {r[0] for r in cur.fetchall()}
+
+    def ack(self, lease_id: str, ids: List[int], tx_hash: str, now: float) -> List[Tuple[int, int, str]]:
+        """Marks rows acked. A row whose lease expired and was taken over by another worker is no longer ours to ack.
+        Returns (id, points, event_id) for the rows acked."""
+        where, params = self.store.in_list("id", ids)
+        with self.store.transaction() as cur:
+            cur.execute(
+                self.store.sql(
+                    f"""UPDATE {self.t} SET state = 'acked', tx_hash = ?, acked_at = ?
+                        WHERE lease_id = ? AND state = 'inflight' AND {where}
+                        RETURNING id, points, event_id"""
+                ),
+                (tx_hash, now, lease_id, *params),
+            )
+            return [tuple(r) for r in cur.fetchall()]
+
+    def release(self, lease_id: str, ids: List[int], available_at: float) -> None:
+        where, params = self.store.in_list("id", ids)
+        with self.store.transaction() as cur:
+            cur.execute(
+                self.store.sql(f"UPDATE {self.t} SET state = 'pending', available_at = ? WHERE lease_id = ? AND state = 'inflight' AND {where}"),
+                (available_at, lease_id, *params),
+            )
+
+    def backlog(self) -> Dict[str, int]:
+        with self.store.transaction() as cur:
+            cur.execute(f"SELECT state, COUNT(*) FROM {self.t} WHERE state <> 'acked' GROUP BY state")
+            rows = cur.fetchall()
+        return {"pending": 0, "inflight": 0, **{s: n for s, n in rows}}
+
+    def purge_acked(self, cutoff: float, batch: int) -> int:
+        with self.store.transaction() as cur:
+            cur.execute(
+                self.store.sql(f"DELETE FROM {self.t} WHERE id IN (SELECT id FROM {self.t} WHERE state = 'acked' AND acked_at < ? LIMIT ?)"),
+                (cutoff, batch),
+            )
+            return cur.rowcount
+
+
+class SettlementScheduler:
+    """Drains a MintQueue in per-wallet batches.
+
+    Each tick leases ceil(pending / drain_ticks) rows, clamped to [min_batch, max_batch], so a growing backlog is
+    worked off in about `drain_ticks` ticks. A full batch is followed straight away by the next one; otherwise the
+    loop sleeps `interval_sec`. `submit(wallet, points, event_ids)` returns a transaction hash. When it raises,
+    that wallet's rows go back on the queue after `retry_sec`. The lease is renewed whenever a third of
+    `lease_sec` has passed since it was taken or last renewed, and rows it no longer holds are not submitted.
+    """
+
+    def __init__(
+        self,
+        queue: MintQueue,
+        submit: Callable[[str, int, List[str]], str],
+        min_batch: int = 50,
+        max_batch: int = 5000,
+        drain_ticks: int = 10,
+        lease_sec: float = 60.0,
+        retry_sec: float = 5.0,
+        backlog_check_sec: float = 1.0,
+        ack_retention_sec: float = 7 * 86400,
+    ):
+        self.queue = queue
+        self.submit = submit
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.drain_ticks = drain_ticks
+        self.lease_sec = lease_sec
+        self.retry_sec = retry_sec
+        self.backlog_check_sec = backlog_check_sec
+        self.ack_retention_sec = ack_retention_sec
+        self._backlog: Dict[str, int] = {"pending": 0, "inflight": 0}
+        self._checked_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def enqueue(self, mints: List[Mint]) -> None:
+        """Appends in a transaction of its own; ingestion appends through MintQueue.append() and calls enqueued()."""
+        if not mints:
+            return
+        with self.queue.store.transaction() as cur:
+            self.queue.append(cur, mints, time.time())
+        self.enqueued(len(mints))
+
+    def enqueued(self, n: int) -> None:
+        if n:
+            MINTS_ENQUEUED_TOTAL.inc(value=n)
+            self._backlog = {**self._backlog, "pending": self._backlog["pending"] + n}
+
+    def backlog(self, refresh: bool = False) -> Dict[str, int]:
+        """Open mints by state, re-counted at most every `backlog_check_sec` (other workers share the queue)."""
+        if refresh or time.time() - self._checked_at >= self.backlog_check_sec:
+            self._backlog = self.queue.backlog()
+            self._checked_at = time.time()
+            for state, n in self._backlog.items():
+                MINT_BACKLOG.set((state,), n)
+        return self._backlog
+
+    def batch_size(self, pending: int) -> int:
+        return max(self.min_batch, min(self.max_batch, math.ceil(pending / self.drain_ticks)))
+
+    def settle_once(self, max_batch: Optional[int] = None) -> dict:
+        t0 = time.perf_counter()
+        size = self.batch_size(self.backlog(refresh=True)["pending"])
+        if max_batch is not None:
+            size = min(size, max_batch)
+        SETTLE_BATCH_SIZE.set((), size)
+        lease_id, rows = self.queue.lease(size, time.time(), self.lease_sec)
+        if not rows:
+            return {"count": 0, "batch_size": size, "receipts": []}
+        SETTLE_BATCHES_TOTAL.inc()
+        renewed_at = time.time()
+        held = {r[0] for r in rows}
+
+        by_wallet: Dict[str, List[Leased]] = {}
+        for row in rows:
+            by_wallet.setdefault(row[1], []).append(row)
+        acked = 0
+        receipts = []
+        for wallet, group in by_wallet.items():
+            if time.time() - renewed_at >= self.lease_sec / 3:
+                held = self.queue.renew(lease_id, time.time() + self.lease_sec)
+                renewed_at = time.time()
+            group = [r for r in group if r[0] in held]
+            if not group:
+                continue  # lease lost; the rows belong to whichever worker re-leased them
+            ids = [r[0] for r in group]
+            try:
+                tx = self.submit(wallet, sum(r[2] for r in group), [r[3] for r in group])
+            except Exception as e:
+                SETTLE_TX_TOTAL.inc(("failed",))
+                print(f"mint submit failed wallet={wallet} mints={len(group)}:", e)
+                self.queue.release(lease_id, ids, time.time() + self.retry_sec)
+                continue
+            SETTLE_TX_TOTAL.inc(("ok",))
+            done = self.queue.ack(lease_id, ids, tx, time.time())
+            if done:
+                acked += len(done)
+                points = sum(p for _, p, _ in done)
+                POINTS_SETTLED_TOTAL.inc(value=points)
+                receipts.append({"tx_hash": tx, "wallet": wallet, "points": points, "ids": [e for _, _, e in done]})
+
+        MINTS_SETTLED_TOTAL.inc(value=acked)
+        SETTLE_SECONDS_TOTAL.inc(value=time.perf_counter() - t0)
+        self.backlog(refresh=True)
+        return {"count": acked, "batch_size": size, "receipts": receipts}
+
+    def start(self, interval_sec: float = 1.0, purge_every_sec: float = 60.0) -> None:
+        if self._thread is not None:
+            return
+
+        def loop():
+            purged_at = 0.0
+            while True:
+                full = False
+                try:
+                    r = self.settle_once()
+                    full = r["count"] > 0 and r["count"] >= r["batch_size"]
+                    if time.time() - purged_at >= purge_every_sec:
+                        purged_at = time.time()
+                        self.queue.purge_acked(purged_at - self.ack_retention_sec, 5000)
+                except Exception as e:  # rows stay leased until lease_sec, then the next tick retries them
+                    print("mint settlement failed:", e)
+                if not full:
+                    time.sleep(interval_sec)
+
+        self._thread = threading.Thread(target=loop, name="mint-settlement", daemon=True)
+        self._thread.start()
@@ -0,0 +1,115 @@
+"""The rewards service's durable store: one SQLite file or Postgres database, chosen by REWARDS_DB_URL.
+
+Idempotency keys and the mint queue live in the same store, so an event's claim and its mint commit in one
+transaction. Components write SQL with `?` placeholders and go through `sql()`, `table()` and `in_list()` for the
+few places where the two dialects differ.
+"""
+from __future__ import annotations
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Sequence, Tuple
+
+
+class SqliteStore:
+    """One local file, shared by every worker process on the host (WAL mode). `:memory:` keeps it in-process."""
+
+    dialect = "sqlite"
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # an app crash loses nothing; a power loss can drop the last few commits
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> str:
+        return name
+
+    def sql(self, q: str) -> str:
+        return q
+
+    def in_list(self, column: str, values: Sequence) -> Tuple[str, List]:
+        return f"{column} IN ({','.join('?' * len(values))})", list(values)
+
+    @contextmanager
+    def transaction(self) -> Iterator[Any]:
+        """A cursor inside one write transaction; commits on exit, rolls back on error."""
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                yield cur
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+            cur.execute("COMMIT")
+
+
+class PostgresStore:
+    """Shared across hosts; psycopg is only needed when this store is configured. Tables get a `rewards_` prefix.
+
+    Up to `pool_size` connections are opened on demand and reused. A connection that breaks (server restart, network
+    drop) is discarded, and the next transaction opens a fresh one. A transaction that hit the break fails, and its
+    caller's retry goes through.
+    """
+
+    dialect = "postgres"
+
+    def __init__(self, url: str, pool_size: int = 4, connect_timeout: int = 5):
+        import psycopg
+
+        self._psycopg = psycopg
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self._idle: List[Any] = []
+        self._slots = threading.BoundedSemaphore(max(1, pool_size))
+        self._lock = threading.Lock()
+        # fail at startup, not on the first request, when the URL is wrong
+        self._idle.append(self._connect())
+
+    def _connect(self):
+        return self._psycopg.connect(self.url, autocommit=True, connect_timeout=self.connect_timeout)
+
+    def table(self, name: str) -> str:
+        return "rewards_" + name
+
+    def sql(self, q: str) -> str:
+        return q.replace("?", "%s")
+
+    def in_list(self, column: str, values: Sequence) -> Tuple[str, List]:
+        return f"{column} = ANY(%s)", [list(values)]
+
+    @contextmanager
+    def transaction(self) -> Iterator[Any]:
+        with self._slots:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None or conn.closed:
+                conn = self._connect()
+            try:
+                with conn.transaction(), conn.cursor() as cur:
+                    yield cur
+            except BaseException:
+                if conn.broken or conn.closed:
+                    conn.close()
+                else:
+                    self._put(conn)
+                raise
+            self._put(conn)
+
+    def _put(self, conn) -> None:
+        with self._lock:
+            self._idle.append(conn)
+
+
+def open_store(url: str, pool_size: int = 4):
+    """`memory`, `sqlite:///relative.db`, `sqlite:////absolute.db` or a `postgresql://` URL."""
+    if url == "memory":
+        return SqliteStore(":memory:")
+    if url.startswith("sqlite:///"):
+        return SqliteStore(url[len("sqlite:///"):])
+    if url.startswith(("postgresql://", "postgres://")):
+        return PostgresStore(url, pool_size)
+    raise ValueError(f"unsupported REWARDS_DB_URL: {url}")